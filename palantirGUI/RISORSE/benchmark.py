@@ -0,0 +1,401 @@
+"""Benchmark dei formati di backup di chat.py.
+
+Uso: python RISORSE/benchmark.py [--chats N] [--messages N] [--db-rows N] [--only formati|schema|paginazione|importazione|cache|memoria|colonne|esportazione|compressione|incrementale|deduplicazione]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from chat import Chat, ColumnarMessages, Message, BackupManager, ChatDatabase, COMPRESSION_CODECS, np
+
+
+def build_chats(chat_count: int, messages_per_chat: int):
+    start = datetime(2025, 1, 1)
+    chats = []
+    for i in range(chat_count):
+        chat = Chat(f"chat_{i}", ["Utente1", "Utente2"])
+        for j in range(messages_per_chat):
+            chat.add_message(Message(
+                random.choice(chat.participants),
+                f"Messaggio {j} della chat {i}",
+                start + timedelta(seconds=i * messages_per_chat + j)
+            ))
+        chats.append(chat)
+    return chats
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_formats(backup_mgr: BackupManager, chats):
+    target = chats[len(chats) // 2].chat_id
+
+    print(f"{'formato':<10}{'export (s)':>12}{'import (s)':>12}{'1 chat (s)':>12}{'MB':>10}")
+    for name, export, load_all, load_one in [
+        ("json", backup_mgr.export_json, backup_mgr.import_json,
+         lambda path: next(c for c in backup_mgr.import_json(path) if c.chat_id == target)),
+        ("pickle", backup_mgr.export_pickle, backup_mgr.import_pickle,
+         lambda path: next(c for c in backup_mgr.import_pickle(path) if c.chat_id == target)),
+        ("binario", backup_mgr.export_binary, backup_mgr.import_binary,
+         lambda path: _open_one(backup_mgr, path, target)),
+    ]:
+        path, export_time = timed(export, chats)
+        _, import_time = timed(load_all, path)
+        _, one_time = timed(load_one, path)
+        size = os.path.getsize(path) / (1024 * 1024)
+        print(f"{name:<10}{export_time:>12.3f}{import_time:>12.3f}{one_time:>12.4f}{size:>10.1f}")
+
+
+def _open_one(backup_mgr: BackupManager, path: str, chat_id: str) -> Chat:
+    with backup_mgr.open_binary(path) as snapshot:
+        return snapshot.load_chat(chat_id)
+
+
+def build_legacy_db(path: str, rows: int, chat_count: int = 1000):
+    """Crea un database con lo schema originale (v1, timestamp in testo, nessun indice)"""
+    start = datetime(2025, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE chats (chat_id TEXT PRIMARY KEY, participants TEXT, "
+                 "created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id TEXT, "
+                 "sender TEXT, content TEXT, timestamp TIMESTAMP)")
+    conn.executemany("INSERT INTO chats (chat_id, participants) VALUES (?, ?)",
+                     [(f"chat_{i}", '["Utente1", "Utente2"]') for i in range(chat_count)])
+    conn.executemany(
+        "INSERT INTO messages (chat_id, sender, content, timestamp) VALUES (?, ?, ?, ?)",
+        ((f"chat_{i % chat_count}", f"Utente{i % 2 + 1}", f"Messaggio {i}",
+          (start + timedelta(seconds=i)).isoformat()) for i in range(rows))
+    )
+    conn.commit()
+    conn.close()
+
+
+def bench_schema(rows: int, repeat: int = 5):
+    """Latenza di apertura di una chat prima e dopo la migrazione allo schema v2"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "chats.db")
+        _, build_time = timed(build_legacy_db, path, rows)
+        print(f"database v1 con {rows} messaggi creato in {build_time:.1f} s")
+
+        conn = sqlite3.connect(path)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute("SELECT sender, content, timestamp FROM messages "
+                         "WHERE chat_id = ? ORDER BY timestamp", ("chat_500",)).fetchall()
+        before = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute("SELECT c.chat_id, COUNT(m.id), MAX(m.timestamp) FROM chats c "
+                         "LEFT JOIN messages m ON m.chat_id = c.chat_id "
+                         "GROUP BY c.chat_id ORDER BY MAX(m.timestamp) DESC").fetchall()
+        list_before = (time.perf_counter() - start) / repeat
+        conn.close()
+
+        # Senza cache: si misura la query, non la copia in memoria
+        db, migrate_time = timed(lambda: ChatDatabase(path, cache_messages=0))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            db.load_chat("chat_500")
+        after = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for i in range(repeat):
+            db.search(f"{123456 + i}", limit=20)
+        search = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            db.get_chat_summaries()
+        list_after = (time.perf_counter() - start) / repeat
+        db.close()
+
+        print(f"apertura chat v1: {before * 1000:.1f} ms")
+        print(f"migrazione a v{ChatDatabase.SCHEMA_VERSION}: {migrate_time:.1f} s")
+        print(f"apertura chat v{ChatDatabase.SCHEMA_VERSION}: {after * 1000:.1f} ms")
+        print(f"ricerca full-text: {search * 1000:.1f} ms")
+        print(f"lista chat per attività, v1 (GROUP BY): {list_before * 1000:.1f} ms")
+        print(f"lista chat per attività, chat_summary: {list_after * 1000:.1f} ms")
+
+
+def bench_pagination(rows: int, page_size: int = 200, repeat: int = 5):
+    """Tempo per mostrare una chat molto lunga: cronologia completa contro prima pagina"""
+    with tempfile.TemporaryDirectory() as folder:
+        db = ChatDatabase(os.path.join(folder, "chats.db"), cache_messages=0)
+        _, build_time = timed(db.save_chat, build_chats(1, rows)[0])
+        print(f"chat con {rows} messaggi salvata in {build_time:.1f} s")
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            db.load_chat("chat_0")
+        full = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            chat = db.open_chat("chat_0", page_size)
+        first = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            db.load_older(chat, page_size)
+        older = (time.perf_counter() - start) / repeat
+        db.close()
+
+        print(f"cronologia completa: {full * 1000:.1f} ms")
+        print(f"prima pagina ({page_size} messaggi): {first * 1000:.1f} ms")
+        print(f"pagina precedente: {older * 1000:.1f} ms")
+
+
+def bench_import(chats):
+    """Ripristino di un backup JSON: save_chat per ogni chat contro bulk_import in streaming"""
+    with tempfile.TemporaryDirectory() as folder:
+        backup_mgr = BackupManager(folder)
+        path = backup_mgr.export_json(chats)
+
+        def one_by_one():
+            db = ChatDatabase(os.path.join(folder, "save_chat.db"))
+            for chat in backup_mgr.import_json(path):
+                db.save_chat(chat)
+            db.close()
+
+        def bulk():
+            db = ChatDatabase(os.path.join(folder, "bulk.db"))
+            db.bulk_import(backup_mgr.iter_json(path))
+            db.close()
+
+        _, slow = timed(one_by_one)
+        _, fast = timed(bulk)
+        print(f"save_chat per chat: {slow:.2f} s")
+        print(f"bulk_import: {fast:.2f} s")
+
+
+def bench_export(chats):
+    """Esportazione JSON dal database: get_all_chats + export_json contro stream_json da iter_export"""
+    with tempfile.TemporaryDirectory() as folder:
+        backup_mgr = BackupManager(folder)
+        db = ChatDatabase(os.path.join(folder, "chats.db"), cache_messages=0)
+        db.bulk_import(chats)
+        del chats[:]
+
+        for label, export in [
+            ("get_all_chats + export_json", lambda: backup_mgr.export_json(db.get_all_chats(), "lista.json")),
+            ("iter_export + stream_json", lambda: backup_mgr.stream_json(db.iter_export(), "stream.json")),
+        ]:
+            tracemalloc.start()
+            path, elapsed = timed(export)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{label}: {elapsed:.2f} s, picco {peak / 1048576:.1f} MB, file {os.path.getsize(path) / 1048576:.1f} MB")
+        db.close()
+
+
+def bench_compression(chats, level=None):
+    """Backup JSON compressi: dimensione e velocità per codec, con un processo e con tutti i core"""
+    records = [(chat.chat_id, chat.participants, chat.messages) for chat in chats]
+    with tempfile.TemporaryDirectory() as folder:
+        backup_mgr = BackupManager(folder)
+        path, elapsed = timed(backup_mgr.stream_json, records, "plain.json")
+        plain = os.path.getsize(path)
+        print(f"non compresso: {plain / 1048576:.1f} MB, {plain / 1048576 / elapsed:.0f} MB/s")
+
+        cores = os.cpu_count() or 1
+        for codec in COMPRESSION_CODECS:
+            for workers in sorted({1, cores}):
+                path, elapsed = timed(lambda: backup_mgr.stream_json(
+                    records, f"{codec}_{workers}.json", codec=codec, level=level, workers=workers))
+                size = os.path.getsize(path)
+                print(f"{codec}, {workers} processi: {size / 1048576:.1f} MB ({plain / size:.1f}x), "
+                      f"scrittura {plain / 1048576 / elapsed:.0f} MB/s")
+
+            _, elapsed = timed(lambda: sum(1 for _ in backup_mgr.iter_json(path)))
+            print(f"{codec}, lettura con iter_json: {plain / 1048576 / elapsed:.0f} MB/s")
+
+
+def bench_incremental(chats):
+    """Backup notturno dopo tre messaggi nuovi: backup completo contro incrementale della catena"""
+    with tempfile.TemporaryDirectory() as folder:
+        backup_mgr = BackupManager(os.path.join(folder, "backups"))
+        db = ChatDatabase(os.path.join(folder, "chats.db"), cache_messages=0)
+        db.bulk_import(chats)
+
+        path, elapsed = timed(backup_mgr.export_delta, db)
+        print(f"base completa: {elapsed:.2f} s, {os.path.getsize(path) / 1024:.0f} KB")
+
+        db.append_messages(chats[0].chat_id, [Message("Utente1", f"Nuovo {i}") for i in range(3)])
+        path, elapsed = timed(backup_mgr.export_delta, db)
+        print(f"incrementale: {elapsed:.2f} s, {os.path.getsize(path) / 1024:.1f} KB")
+
+        restored = ChatDatabase(os.path.join(folder, "restored.db"), cache_messages=0)
+        count, elapsed = timed(backup_mgr.restore_chain, restored)
+        print(f"ripristino base + {count - 1} incrementali: {elapsed:.2f} s")
+        restored.close()
+        db.close()
+
+
+def bench_dedup(chats, days: int = 30):
+    """Uno snapshot al giorno con pochi messaggi nuovi: backup JSON completi contro repository deduplicato"""
+    with tempfile.TemporaryDirectory() as folder:
+        backup_mgr = BackupManager(os.path.join(folder, "backups"))
+        repository = backup_mgr.repository()
+        db = ChatDatabase(os.path.join(folder, "chats.db"), cache_messages=0)
+        db.bulk_import(chats)
+
+        full_size = 0
+        snapshot_time = 0.0
+        for day in range(days):
+            path = backup_mgr.stream_json(db.iter_export(), f"giorno_{day}.json")
+            full_size += os.path.getsize(path)
+            os.remove(path)
+
+            with db.read_snapshot():
+                _, elapsed = timed(repository.backup, db.iter_export())
+            snapshot_time += elapsed
+
+            chat = chats[day % len(chats)]
+            db.append_messages(chat.chat_id, [Message("Utente1", f"Messaggio del giorno {day}")])
+
+        stats = repository.stats()
+        print(f"{days} backup JSON completi: {full_size / 1048576:.1f} MB")
+        print(f"{stats['snapshots']} snapshot deduplicati: {stats['bytes'] / 1048576:.1f} MB "
+              f"({stats['chunks']} chunk), {snapshot_time / days:.2f} s per snapshot")
+        db.close()
+
+
+def bench_cache(messages: int, switches: int = 20):
+    """Passaggio avanti e indietro fra due chat, senza e con la cache LRU"""
+    with tempfile.TemporaryDirectory() as folder:
+        for label, cache_messages in [("senza cache", 0), ("cache LRU", 4 * messages)]:
+            db = ChatDatabase(os.path.join(folder, f"{cache_messages}.db"), cache_messages=cache_messages)
+            db.save_chats(build_chats(2, messages))
+
+            start = time.perf_counter()
+            for i in range(switches):
+                db.load_chat(f"chat_{i % 2}")
+            elapsed = (time.perf_counter() - start) / switches
+            print(f"{label}: {elapsed * 1000:.1f} ms per apertura {db.cache.stats()}")
+            db.close()
+
+
+class LegacyMessage:
+    """Message com'era prima dei __slots__: __dict__ e un datetime per istanza"""
+
+    def __init__(self, sender, content, timestamp):
+        self.sender = sender
+        self.content = content
+        self.timestamp = timestamp
+
+
+def bench_memory(count: int):
+    """Byte per messaggio (contenuto escluso) con il modello vecchio e con quello compatto"""
+    start = datetime(2025, 1, 1)
+    contents = [f"Messaggio {i}" for i in range(count)]
+
+    for label, build in [
+        ("__dict__ + datetime", lambda i: LegacyMessage("Utente" + str(i % 2), contents[i],
+                                                        start + timedelta(seconds=i))),
+        ("__slots__ + epoch", lambda i: Message.from_micros("Utente" + str(i % 2), contents[i],
+                                                           1735689600000000 + i * 1000000)),
+    ]:
+        tracemalloc.start()
+        messages = [build(i) for i in range(count)]
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{label}: {size / count:.0f} byte per messaggio")
+        del messages
+
+
+def bench_columns(count: int, repeat: int = 20):
+    """Finestra di un giorno + filtro per sender: lista di Message contro ColumnarMessages"""
+    start = datetime(2025, 1, 1)
+    messages = [Message.from_micros("Utente" + str(i % 4), f"Messaggio {i}", 1735689600000000 + i * 1000000)
+                for i in range(count)]
+    columns = ColumnarMessages(messages)
+    window_start, window_end = start + timedelta(days=3), start + timedelta(days=4)
+
+    def scan_list():
+        for _ in range(repeat):
+            result = [message for message in messages
+                      if window_start <= message.timestamp < window_end and message.sender == "Utente1"]
+        return result
+
+    def scan_columns():
+        for _ in range(repeat):
+            result = columns.between(window_start, window_end).by_sender("Utente1")
+        return result
+
+    print(f"{count} messaggi, NumPy {'presente' if np is not None else 'assente'}")
+    for label, scan in [("lista di Message", scan_list), ("colonne", scan_columns)]:
+        result, elapsed = timed(scan)
+        print(f"{label}: {elapsed / repeat * 1000:.2f} ms per query ({len(result)} messaggi)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--db-rows", type=int, default=1_000_000)
+    parser.add_argument("--chat-messages", type=int, default=500_000)
+    parser.add_argument("--only", choices=["formati", "schema", "paginazione", "importazione", "cache", "memoria", "colonne", "esportazione", "compressione", "incrementale", "deduplicazione"])
+    args = parser.parse_args()
+
+    if args.only in (None, "formati", "importazione", "esportazione", "compressione",
+                     "incrementale", "deduplicazione"):
+        chats = build_chats(args.chats, args.messages)
+        print(f"{args.chats} chat x {args.messages} messaggi\n")
+
+    if args.only in (None, "formati"):
+        with tempfile.TemporaryDirectory() as folder:
+            bench_formats(BackupManager(folder), chats)
+        print()
+
+    if args.only in (None, "importazione"):
+        bench_import(chats)
+        print()
+
+    if args.only in (None, "compressione"):
+        bench_compression(chats)
+        print()
+
+    if args.only in (None, "deduplicazione"):
+        bench_dedup(chats)
+        print()
+
+    if args.only in (None, "incrementale"):
+        bench_incremental(chats)
+        print()
+
+    if args.only in (None, "esportazione"):
+        # Ultimo uso di chats: bench_export le svuota per misurare solo l'esportazione
+        bench_export(chats)
+        print()
+
+    if args.only in (None, "schema"):
+        bench_schema(args.db_rows)
+        print()
+
+    if args.only in (None, "paginazione"):
+        bench_pagination(args.chat_messages)
+        print()
+
+    if args.only in (None, "cache"):
+        bench_cache(args.messages * 100)
+        print()
+
+    if args.only in (None, "memoria"):
+        bench_memory(args.messages * 2000)
+        print()
+
+    if args.only in (None, "colonne"):
+        bench_columns(args.messages * 2000)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,105 @@
+import bisect
+import bz2
+import gzip
+import hashlib
+import heapq
+import io
 import json
+import itertools
+import lzma
 import pickle
 import sqlite3
 import os
+import mmap
+import multiprocessing
+import queue
+import struct
+import sys
 import threading
 import time
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+import zlib
+from array import array
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Callable
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 
+try:
+    from ui.chat.jsonstream import JsonStream
+except ImportError:
+    # Avviato come script da RISORSE/: la radice del progetto non è nel path
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from ui.chat.jsonstream import JsonStream
+
+try:
+    import numpy as np
+except ImportError:  # NumPy è opzionale: senza, ColumnarMessages usa array + bisect
+    np = None
+
 # ==================== CLASSI CORE ====================
 
+EPOCH = datetime(1970, 1, 1)
+
+def _to_micros(timestamp: datetime) -> int:
+    """Converte un datetime in microsecondi dall'epoch (un datetime con fuso passa all'ora locale)"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+def _from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+def _local_micros_sql(value: str) -> str:
+    """Espressione SQL che converte un istante UTC di SQLite in microsecondi locali (come _to_micros)"""
+    return f"CAST((julianday({value}, 'localtime') - 2440587.5) * 86400000000 AS INTEGER)"
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
 class Message:
+    """Messaggio compatto: niente __dict__, sender internato (una sola copia per
+    nome) e timestamp in microsecondi dall'epoch, convertito in datetime solo
+    quando viene letto"""
+    
+    __slots__ = ('sender', 'content', 'micros')
+    
     def __init__(self, sender: str, content: str, timestamp: datetime = None):
-        self.sender = sender
+        self.sender = _intern(sender)
         self.content = content
-        self.timestamp = timestamp or datetime.now()
+        self.micros = _to_micros(timestamp or datetime.now())
+    
+    @classmethod
+    def from_micros(cls, sender: str, content: str, micros: int) -> 'Message':
+        """Costruisce un messaggio da un timestamp già in microsecondi (database, file binario)"""
+        message = cls.__new__(cls)
+        message.sender = _intern(sender)
+        message.content = content
+        message.micros = micros
+        return message
+    
+    @property
+    def timestamp(self) -> datetime:
+        return _from_micros(self.micros)
+    
+    @timestamp.setter
+    def timestamp(self, value: datetime):
+        self.micros = _to_micros(value)
+    
+    def __getstate__(self):
+        return (self.sender, self.content, self.micros)
+    
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # Pickle salvati prima dei __slots__: {'sender', 'content', 'timestamp'}
+            self.sender = _intern(state['sender'])
+            self.content = state['content']
+            self.timestamp = state['timestamp']
+        else:
+            sender, self.content, self.micros = state
+            self.sender = _intern(sender)
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -36,13 +120,55 @@ class Message:
         return f"[{self.timestamp.strftime('%H:%M')}] {self.sender}: {self.content}"
 
 class Chat:
+    # Stato di sincronizzazione col database: una chat "persistita" salva
+    # solo i messaggi aggiunti dopo l'ultimo salvataggio
+    _persisted = False
+    # Cursore (timestamp, id) della pagina più vecchia non ancora caricata;
+    # None se in memoria c'è tutta la cronologia
+    older_cursor: Optional[Tuple[int, int]] = None
+    
     def __init__(self, chat_id: str, participants: List[str]):
         self.chat_id = chat_id
         self.participants = participants
         self.messages: List[Message] = []
+        self._unsaved: List[Message] = []
+        self.older_cursor = None
     
     def add_message(self, message: Message):
         self.messages.append(message)
+        if self._persisted:
+            self._unsaved.append(message)
+    
+    def unsaved_messages(self) -> List[Message]:
+        """Messaggi non ancora scritti nel database (tutti, se la chat non è mai stata salvata)"""
+        return self._unsaved if self._persisted else self.messages
+    
+    def mark_saved(self):
+        """Segna la chat come allineata al database"""
+        self._persisted = True
+        self._unsaved = []
+    
+    def take_unsaved(self) -> List[Message]:
+        """Stacca i messaggi non salvati, da scrivere con ChatDatabase.append_messages"""
+        messages = list(self.unsaved_messages())
+        self.mark_saved()
+        return messages
+    
+    def restore_unsaved(self, messages: List[Message]):
+        """Rimette in coda messaggi il cui salvataggio non è andato a buon fine"""
+        self._unsaved = messages + self._unsaved
+    
+    def __getstate__(self):
+        # Una copia (pickle) non è allineata a nessun database
+        state = self.__dict__.copy()
+        state.pop('_persisted', None)
+        state.pop('_unsaved', None)
+        state.pop('older_cursor', None)
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._unsaved = []
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -56,197 +182,2580 @@ class Chat:
         chat = cls(data['chat_id'], data['participants'])
         chat.messages = [Message.from_dict(msg) for msg in data['messages']]
         return chat
+    
+    def use_columnar(self) -> 'ColumnarMessages':
+        """Passa i messaggi alla memorizzazione per colonne (vedi ColumnarMessages)"""
+        if not isinstance(self.messages, ColumnarMessages):
+            self.messages = ColumnarMessages(self.messages)
+        return self.messages
+
+class ColumnarMessages:
+    """Messaggi di una chat memorizzati per colonne invece che come oggetti Message.
+    
+    Timestamp (microsecondi) e id dei sender stanno in array compatti, i contenuti
+    in un unico buffer UTF-8 delimitato da offset. Si usa come una lista di Message
+    (len, indici, slice, iterazione, append): i Message vengono creati solo quando
+    si leggono. Le query per intervallo di tempo usano la ricerca binaria finché i
+    messaggi sono in ordine cronologico; i filtri usano NumPy, se installato.
+    """
+    
+    def __init__(self, messages: Iterable[Message] = ()):
+        self.senders: List[Optional[str]] = []
+        self._sender_ids: Dict[Optional[str], int] = {}
+        self._timestamps = array('q')
+        self._sender_col = array('i')
+        self._offsets = array('q', [0])
+        self._content = bytearray()
+        self._sorted = True
+        self.extend(messages)
+    
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple]) -> 'ColumnarMessages':
+        """Costruisce le colonne da righe (id, sender, content, timestamp) senza creare Message"""
+        columns = cls()
+        for _, sender, content, micros in rows:
+            columns._append(sender, content, micros)
+        return columns
+    
+    def _sender_id(self, sender: Optional[str]) -> int:
+        sender_id = self._sender_ids.get(sender)
+        if sender_id is None:
+            sender_id = self._sender_ids[sender] = len(self.senders)
+            self.senders.append(_intern(sender))
+        return sender_id
+    
+    def _append(self, sender: Optional[str], content: str, micros: int):
+        if self._timestamps and micros < self._timestamps[-1]:
+            self._sorted = False
+        self._timestamps.append(micros)
+        self._sender_col.append(self._sender_id(sender))
+        self._content += (content or '').encode('utf-8')
+        self._offsets.append(len(self._content))
+    
+    def append(self, message: Message):
+        self._append(message.sender, message.content, message.micros)
+    
+    def extend(self, messages: Iterable[Message]):
+        for message in messages:
+            self.append(message)
+    
+    def _message(self, index: int) -> Message:
+        content = self._content[self._offsets[index]:self._offsets[index + 1]].decode('utf-8')
+        return Message.from_micros(self.senders[self._sender_col[index]], content, self._timestamps[index])
+    
+    def __len__(self) -> int:
+        return len(self._timestamps)
+    
+    def __iter__(self) -> Iterator[Message]:
+        for index in range(len(self)):
+            yield self._message(index)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(range(len(self))[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Indice del messaggio fuori intervallo")
+        return self._message(index)
+    
+    def __setitem__(self, index, value):
+        # Modifiche rare (es. pagine più vecchie inserite in testa): si ricostruiscono le colonne
+        messages = list(self)
+        messages[index] = value
+        self.__init__(messages)
+    
+    def take(self, indices: Iterable[int]) -> 'ColumnarMessages':
+        """Nuova collezione con i messaggi alle posizioni indicate, in ordine crescente"""
+        result = ColumnarMessages()
+        result.senders = list(self.senders)
+        result._sender_ids = dict(self._sender_ids)
+        
+        if isinstance(indices, range) and indices.step == 1:
+            # Intervallo contiguo: copie in blocco delle colonne, offset ribasati
+            start, stop = indices.start, max(indices.start, indices.stop)
+            base = self._offsets[start]
+            result._timestamps = self._timestamps[start:stop]
+            result._sender_col = self._sender_col[start:stop]
+            result._content = self._content[base:self._offsets[stop]]
+            if np is not None:
+                result._offsets = array('q', (self._column(self._offsets)[start:stop + 1] - base).tobytes())
+            else:
+                result._offsets = array('q', (offset - base for offset in self._offsets[start:stop + 1]))
+            result._sorted = self._sorted
+            return result
+        
+        for index in indices:
+            content = self._content[self._offsets[index]:self._offsets[index + 1]]
+            result._timestamps.append(self._timestamps[index])
+            result._sender_col.append(self._sender_col[index])
+            result._content += content
+            result._offsets.append(len(result._content))
+        result._sorted = self._sorted and not (isinstance(indices, range) and indices.step < 0)
+        return result
+    
+    @staticmethod
+    def _column(column: array):
+        """Vista NumPy (senza copia) di una colonna; le viste non vanno conservate,
+        altrimenti l'array non può più crescere"""
+        dtype = np.dtype(f'i{column.itemsize}')
+        if not column:
+            return np.empty(0, dtype=dtype)
+        return np.frombuffer(column, dtype=dtype)
+    
+    def index_at(self, timestamp: datetime) -> int:
+        """Posizione del primo messaggio con timestamp >= timestamp (ricerca binaria)"""
+        if not self._sorted:
+            raise ValueError("I messaggi non sono in ordine cronologico")
+        micros = _to_micros(timestamp)
+        if np is not None:
+            return int(np.searchsorted(self._column(self._timestamps), micros, side='left'))
+        return bisect.bisect_left(self._timestamps, micros)
+    
+    def between(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> 'ColumnarMessages':
+        """Messaggi con start <= timestamp < end (estremi None = illimitati)"""
+        if self._sorted:
+            first = self.index_at(start) if start is not None else 0
+            last = self.index_at(end) if end is not None else len(self)
+            return self.take(range(first, last))
+        
+        low = _to_micros(start) if start is not None else None
+        high = _to_micros(end) if end is not None else None
+        if np is not None:
+            timestamps = self._column(self._timestamps)
+            mask = np.ones(len(timestamps), dtype=bool)
+            if low is not None:
+                mask &= timestamps >= low
+            if high is not None:
+                mask &= timestamps < high
+            return self.take(np.flatnonzero(mask).tolist())
+        return self.take([
+            index for index, micros in enumerate(self._timestamps)
+            if (low is None or micros >= low) and (high is None or micros < high)
+        ])
+    
+    def by_sender(self, *senders: str) -> 'ColumnarMessages':
+        """Messaggi inviati da uno dei sender indicati"""
+        ids = [self._sender_ids[sender] for sender in senders if sender in self._sender_ids]
+        if np is not None:
+            return self.take(np.flatnonzero(np.isin(self._column(self._sender_col), ids)).tolist())
+        ids = set(ids)
+        return self.take([index for index, sender_id in enumerate(self._sender_col) if sender_id in ids])
+    
+    def sender_counts(self) -> Dict[Optional[str], int]:
+        """Numero di messaggi per sender"""
+        if np is not None:
+            counts = np.bincount(self._column(self._sender_col), minlength=len(self.senders)).tolist()
+        else:
+            counter = Counter(self._sender_col)
+            counts = [counter[sender_id] for sender_id in range(len(self.senders))]
+        return {sender: count for sender, count in zip(self.senders, counts) if count}
+
+# ==================== GESTIONE DATABASE ====================
+
+class ConnectionManager:
+    """Connessioni SQLite persistenti, una per thread.
+    
+    In modalità WAL i lettori non bloccano chi scrive; ogni connessione
+    conserva la propria cache di pagine e di statement preparati.
+    """
+    
+    def __init__(self, db_path: str, journal_mode: str = "WAL", synchronous: str = "NORMAL",
+                 cache_size_kb: int = 20000, cached_statements: int = 256,
+                 attach: Optional[Dict[str, str]] = None):
+        self.db_path = db_path
+        # Database aggiuntivi ({nome schema: percorso}) collegati a ogni connessione
+        self.attach = dict(attach or {})
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.cached_statements = cached_statements
+        
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+    
+    def get(self) -> sqlite3.Connection:
+        """Restituisce la connessione del thread corrente, creandola al primo uso"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # check_same_thread=False solo per permettere close_all() all'uscita:
+            # ogni connessione resta usata dal thread che l'ha creata
+            conn = sqlite3.connect(self.db_path, cached_statements=self.cached_statements,
+                                   check_same_thread=False)
+            conn.execute(f'PRAGMA journal_mode={self.journal_mode}')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+            for name, path in self.attach.items():
+                conn.execute(f'ATTACH DATABASE ? AS {name}', (path,))
+            
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        
+        return conn
+    
+    def close_all(self):
+        """Chiude le connessioni di tutti i thread"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+class ChatCache:
+    """Cache LRU delle chat caricate, limitata dal numero totale di messaggi.
+    
+    Conserva le liste di Message già costruite: una hit restituisce una nuova
+    Chat che le condivide, senza rileggere il database né riconvertire i
+    timestamp. Le chiavi sono tuple che iniziano con il chat_id.
+    """
+    
+    def __init__(self, max_messages: int = 100000):
+        self.max_messages = max_messages
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self._entries: OrderedDict = OrderedDict()
+        self._size = 0
+        # Versione di ogni chat: un caricamento iniziato prima di una modifica non entra in cache
+        self._epoch = 0
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _cost(messages: List[Message]) -> int:
+        return max(len(messages), 1)
+    
+    def version(self, chat_id: str) -> Tuple[int, int]:
+        with self._lock:
+            return self._epoch, self._versions.get(chat_id, 0)
+    
+    def get(self, key: tuple) -> Optional[Chat]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        
+        participants, messages, cursor = entry
+        chat = Chat(key[0], list(participants))
+        chat.messages = list(messages)
+        chat.older_cursor = cursor
+        chat.mark_saved()
+        return chat
+    
+    def put(self, key: tuple, chat: Chat, version: Tuple[int, int]):
+        cost = self._cost(chat.messages)
+        if cost > self.max_messages:
+            return
+        
+        with self._lock:
+            if (self._epoch, self._versions.get(key[0], 0)) != version:
+                return
+            
+            self._pop(key)
+            self._entries[key] = (list(chat.participants), list(chat.messages), chat.older_cursor)
+            self._size += cost
+            self._shrink()
+    
+    def extend(self, chat_id: str, messages: List[Message]):
+        """Write-through: accoda i messaggi appena salvati alle copie in cache della chat"""
+        with self._lock:
+            self._versions[chat_id] = self._versions.get(chat_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == chat_id]:
+                participants, cached, cursor = self._entries[key]
+                self._size -= self._cost(cached)
+                cached = cached + list(messages)
+                self._entries[key] = (participants, cached, cursor)
+                self._size += self._cost(cached)
+            self._shrink()
+    
+    def invalidate(self, chat_id: Optional[str] = None):
+        """Scarta le copie in cache di una chat (di tutte, se chat_id è None)"""
+        with self._lock:
+            if chat_id is None:
+                self._epoch += 1
+                self._entries.clear()
+                self._size = 0
+                return
+            
+            self._versions[chat_id] = self._versions.get(chat_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == chat_id]:
+                self._pop(key)
+    
+    def _pop(self, key: tuple):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= self._cost(entry[1])
+    
+    def _shrink(self):
+        while self._size > self.max_messages:
+            _, entry = self._entries.popitem(last=False)
+            self._size -= self._cost(entry[1])
+            self.evictions += 1
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'messages': self._size
+            }
+
+class _ChatRows:
+    """Righe di un cursore ordinato per chat_id (prima colonna), lette una chat alla volta"""
+    
+    def __init__(self, rows: Iterable[tuple]):
+        self.groups = itertools.groupby(rows, key=lambda row: row[0])
+        self.current = next(self.groups, None)
+    
+    def get(self, chat_id: str) -> Iterator[tuple]:
+        """Righe di chat_id senza la prima colonna; le chat vanno chieste in ordine crescente"""
+        while self.current is not None and self.current[0] < chat_id:
+            self.current = next(self.groups, None)
+        if self.current is None or self.current[0] != chat_id:
+            return iter(())
+        return (row[1:] for row in self.current[1])
+
+
+class ChatDatabase:
+    # Versione dello schema prodotta da _init_db (vedi _migrations)
+    SCHEMA_VERSION = 4
+    
+    def __init__(self, db_path: str = "chats.db", synchronous: str = "NORMAL",
+                 cache_size_kb: int = 20000, archive_path: Optional[str] = None,
+                 cache_messages: int = 100000):
+        self.db_path = db_path
+        # Chat già costruite, aggiornate da ogni scrittura fatta attraverso questo oggetto
+        self.cache = ChatCache(cache_messages)
+        # Database separato per i messaggi vecchi (vedi archive_messages), collegato come "archive"
+        self.archive_path = archive_path
+        self.connections = ConnectionManager(db_path, synchronous=synchronous,
+                                             cache_size_kb=cache_size_kb,
+                                             attach={'archive': archive_path} if archive_path else None)
+        self._init_db()
+        if archive_path:
+            self._init_archive()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Connessione persistente del thread corrente (usabile con `with` per le transazioni)"""
+        return self.connections.get()
+    
+    def close(self):
+        self.connections.close_all()
+    
+    def _init_db(self):
+        """Inizializza il database e applica le migrazioni mancanti"""
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+        
+        current = self.schema_version()
+        for version, migration in self._migrations():
+            if version <= current:
+                continue
+            
+            # Ogni migrazione è atomica: o passa per intero o il database resta com'era
+            conn.execute('BEGIN')
+            try:
+                migration(conn)
+                conn.execute('DELETE FROM schema_version')
+                conn.execute('INSERT INTO schema_version (version) VALUES (?)', (version,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+        # Un bulk_import interrotto (processo chiuso a metà) può aver lasciato il database
+        # senza indice e trigger, o chat importate con ancora i vecchi messaggi
+        if self._missing_triggers(conn) or self._import_pending(conn):
+            self._finish_import(conn)
+    
+    def schema_version(self) -> int:
+        """Versione dello schema del database (0 = vuoto, 1 = schema originale senza versione)"""
+        conn = self._connect()
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+        if row[0] is not None:
+            return row[0]
+        
+        legacy = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages'"
+        ).fetchone()
+        return 1 if legacy else 0
+    
+    def _migrations(self):
+        return [
+            (1, self._migrate_v1),
+            (2, self._migrate_v2),
+            (3, self._migrate_v3),
+            (4, self._migrate_v4),
+        ]
+    
+    def _migrate_v1(self, conn: sqlite3.Connection):
+        """Schema originale: timestamp ISO-8601 in testo e sender ripetuto in ogni riga"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS chats (
+                chat_id TEXT PRIMARY KEY,
+                participants TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT,
+                sender TEXT,
+                content TEXT,
+                timestamp TIMESTAMP,
+                FOREIGN KEY (chat_id) REFERENCES chats (chat_id)
+            )
+        ''')
+    
+    def _migrate_v2(self, conn: sqlite3.Connection):
+        """Timestamp interi (microsecondi dall'epoch), tabella dei sender e indice (chat_id, timestamp)"""
+        conn.execute('''
+            CREATE TABLE senders (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE
+            )
+        ''')
+        conn.execute('INSERT INTO senders (name) SELECT DISTINCT sender FROM messages WHERE sender IS NOT NULL')
+        
+        conn.execute('''
+            CREATE TABLE messages_v2 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT,
+                sender_id INTEGER,
+                content TEXT,
+                timestamp INTEGER,
+                FOREIGN KEY (chat_id) REFERENCES chats (chat_id),
+                FOREIGN KEY (sender_id) REFERENCES senders (id)
+            )
+        ''')
+        
+        conn.create_function('iso_to_micros', 1,
+                             lambda value: _to_micros(datetime.fromisoformat(value)) if value else None,
+                             deterministic=True)
+        conn.execute('''
+            INSERT INTO messages_v2 (id, chat_id, sender_id, content, timestamp)
+            SELECT m.id, m.chat_id, s.id, m.content, iso_to_micros(m.timestamp)
+            FROM messages m LEFT JOIN senders s ON s.name = m.sender
+        ''')
+        
+        conn.execute('DROP TABLE messages')
+        conn.execute('ALTER TABLE messages_v2 RENAME TO messages')
+        conn.execute('CREATE INDEX idx_messages_chat_timestamp ON messages (chat_id, timestamp)')
+    
+    def _migrate_v3(self, conn: sqlite3.Connection):
+        """Indice full-text FTS5 sul contenuto dei messaggi, mantenuto dai trigger"""
+        if not self.has_fts():
+            # SQLite senza FTS5: search() ripiega su LIKE
+            return
+        
+        conn.execute('''
+            CREATE VIRTUAL TABLE messages_fts USING fts5(
+                content, content='messages', content_rowid='id'
+            )
+        ''')
+        self._create_fts_triggers(conn)
+        conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+    
+    def _create_fts_triggers(self, conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+                INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        ''')
+    
+    def _migrate_v4(self, conn: sqlite3.Connection):
+        """Riepilogo per chat (conteggi, ultimo messaggio, ultima attività) mantenuto dai trigger"""
+        conn.execute('''
+            CREATE TABLE chat_summary (
+                chat_id TEXT PRIMARY KEY,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                unread_count INTEGER NOT NULL DEFAULT 0,
+                last_message_id INTEGER,
+                last_timestamp INTEGER,
+                last_activity INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.execute('CREATE INDEX idx_chat_summary_activity ON chat_summary (last_activity DESC)')
+        
+        # created_at è in UTC, i timestamp dei messaggi in ora locale
+        conn.execute(f'''
+            INSERT INTO chat_summary (chat_id, last_activity)
+            SELECT chat_id, {_local_micros_sql("COALESCE(created_at, 'now')")} FROM chats
+        ''')
+        self._refresh_summary(conn)
+        self._create_summary_triggers(conn)
+    
+    def _create_summary_triggers(self, conn: sqlite3.Connection):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS chat_summary_chat_insert AFTER INSERT ON chats BEGIN
+                INSERT OR IGNORE INTO chat_summary (chat_id, last_activity)
+                VALUES (new.chat_id, {_local_micros_sql("'now'")});
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS chat_summary_chat_delete AFTER DELETE ON chats BEGIN
+                DELETE FROM chat_summary WHERE chat_id = old.chat_id;
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS chat_summary_message_insert AFTER INSERT ON messages BEGIN
+                INSERT INTO chat_summary (chat_id, message_count, unread_count, last_message_id, last_timestamp, last_activity)
+                VALUES (new.chat_id, 1, 1, new.id, new.timestamp, new.timestamp)
+                ON CONFLICT (chat_id) DO UPDATE SET
+                    message_count = message_count + 1,
+                    unread_count = unread_count + 1,
+                    last_message_id = CASE
+                        WHEN last_timestamp IS NULL OR (new.timestamp, new.id) > (last_timestamp, last_message_id)
+                        THEN new.id ELSE last_message_id END,
+                    last_timestamp = MAX(COALESCE(last_timestamp, new.timestamp), new.timestamp),
+                    last_activity = MAX(last_activity, new.timestamp);
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS chat_summary_message_delete AFTER DELETE ON messages BEGIN
+                UPDATE chat_summary SET
+                    message_count = message_count - 1,
+                    unread_count = MIN(unread_count, message_count - 1)
+                WHERE chat_id = old.chat_id;
+                UPDATE chat_summary SET
+                    (last_message_id, last_timestamp) = (
+                        SELECT id, timestamp FROM messages WHERE chat_id = old.chat_id
+                        ORDER BY timestamp DESC, id DESC LIMIT 1
+                    )
+                WHERE chat_id = old.chat_id AND last_message_id = old.id
+                  AND EXISTS (SELECT 1 FROM messages WHERE chat_id = old.chat_id);
+            END
+        ''')
+    
+    def _refresh_summary(self, conn: sqlite3.Connection, chat_filter: str = '', params: tuple = ()):
+        """Ricalcola da zero il riepilogo delle chat selezionate (dopo riscritture in blocco)"""
+        conn.execute(
+            f'''UPDATE chat_summary SET
+                   message_count = (SELECT COUNT(*) FROM messages m WHERE m.chat_id = chat_summary.chat_id),
+                   unread_count = 0,
+                   (last_message_id, last_timestamp) = (
+                       SELECT id, timestamp FROM messages m WHERE m.chat_id = chat_summary.chat_id
+                       ORDER BY timestamp DESC, id DESC LIMIT 1
+                   ),
+                   last_activity = COALESCE(
+                       (SELECT MAX(timestamp) FROM messages m WHERE m.chat_id = chat_summary.chat_id),
+                       last_activity
+                   )
+               {'WHERE ' + chat_filter if chat_filter else ''}''',
+            params
+        )
+    
+    def _init_archive(self):
+        """Crea le tabelle dell'archivio (il VACUUM incrementale si abilita con enable_incremental_vacuum)"""
+        conn = self._connect()
+        with conn:
+            # Tabelle autonome: il sender è salvato per nome, gli id sono quelli originali
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS archive.messages (
+                    id INTEGER PRIMARY KEY,
+                    chat_id TEXT,
+                    sender TEXT,
+                    content TEXT,
+                    timestamp INTEGER
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS archive.idx_archive_chat_timestamp ON messages (chat_id, timestamp)')
+            
+            # Segmenti compressi: i messaggi di una chat come JSON [[id, sender, content, timestamp], ...] + zlib
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS archive.segments (
+                    chat_id TEXT,
+                    first_id INTEGER,
+                    first_timestamp INTEGER,
+                    last_timestamp INTEGER,
+                    message_count INTEGER,
+                    data BLOB,
+                    last_id INTEGER,
+                    PRIMARY KEY (chat_id, first_id)
+                )
+            ''')
+            
+            # Archivi creati prima di last_id (id massimo del segmento): la colonna resta
+            # NULL finché archive_messages non la ricava dai dati
+            columns = [row[1] for row in conn.execute('PRAGMA archive.table_info(segments)')]
+            if 'last_id' not in columns:
+                conn.execute('ALTER TABLE archive.segments ADD COLUMN last_id INTEGER')
+    
+    def has_fts(self) -> bool:
+        """True se questo SQLite è compilato con FTS5"""
+        row = self._connect().execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')").fetchone()
+        return bool(row[0])
+    
+    def _insert_messages(self, conn: sqlite3.Connection, chat_id: str, messages: List[Message]):
+        conn.executemany(
+            'INSERT OR IGNORE INTO senders (name) VALUES (?)',
+            [(sender,) for sender in {m.sender for m in messages}]
+        )
+        conn.executemany(
+            '''INSERT INTO messages (chat_id, sender_id, content, timestamp)
+               VALUES (?, (SELECT id FROM senders WHERE name = ?), ?, ?)''',
+            [(chat_id, m.sender, m.content, m.micros) for m in messages]
+        )
+    
+    def _save_chat(self, conn: sqlite3.Connection, chat: Chat):
+        if chat._persisted:
+            # Chat già nel database: si aggiungono solo i messaggi nuovi
+            self._insert_messages(conn, chat.chat_id, chat.unsaved_messages())
+            return
+        
+        # Salva la chat
+        conn.execute(
+            'INSERT OR REPLACE INTO chats (chat_id, participants) VALUES (?, ?)',
+            (chat.chat_id, json.dumps(chat.participants))
+        )
+        
+        # Cancella messaggi esistenti e salva nuovi
+        conn.execute('DELETE FROM messages WHERE chat_id = ?', (chat.chat_id,))
+        self._delete_archived(conn, chat.chat_id)
+        self._insert_messages(conn, chat.chat_id, chat.messages)
+        self._refresh_summary(conn, 'chat_id = ?', (chat.chat_id,))
+    
+    def save_chat(self, chat: Chat):
+        """Salva una chat nel database (solo i messaggi nuovi se era già stata salvata o caricata)"""
+        if chat._persisted and not chat.unsaved_messages():
+            return
+        
+        with self._connect() as conn:
+            self._save_chat(conn, chat)
+        self._cache_saved(chat)
+        chat.mark_saved()
+    
+    def _cache_saved(self, chat: Chat):
+        if chat._persisted:
+            self.cache.extend(chat.chat_id, chat.unsaved_messages())
+        else:
+            # Salvataggio completo: la cronologia è stata riscritta
+            self.cache.invalidate(chat.chat_id)
+    
+    def load_chat(self, chat_id: str, include_archive: bool = False, columnar: bool = False) -> Chat:
+        """Carica una chat dal database (con include_archive anche i messaggi archiviati).
+        
+        Con columnar i messaggi arrivano in un ColumnarMessages, costruito
+        direttamente dalle righe; queste letture non passano dalla cache.
+        """
+        key = (chat_id, 'all', include_archive)
+        if not columnar:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        version = self.cache.version(chat_id)
+        
+        with self._connect() as conn:
+            # Carica info chat
+            chat_row = conn.execute(
+                'SELECT chat_id, participants FROM chats WHERE chat_id = ?',
+                (chat_id,)
+            ).fetchone()
+            
+            if not chat_row:
+                raise ValueError(f"Chat {chat_id} non trovata")
+            
+            participants = json.loads(chat_row[1])
+            chat = Chat(chat_row[0], participants)
+            
+            # Carica messaggi
+            messages_rows = conn.execute(
+                '''SELECT m.id, s.name, m.content, m.timestamp 
+                   FROM messages m LEFT JOIN senders s ON s.id = m.sender_id
+                   WHERE m.chat_id = ? 
+                   ORDER BY m.timestamp, m.id''',
+                (chat_id,)
+            ).fetchall()
+            
+            if include_archive:
+                messages_rows = self._merge_rows(messages_rows, self._archived_rows(conn, chat_id))
+            
+            if columnar:
+                chat.messages = ColumnarMessages.from_rows(messages_rows)
+                chat.mark_saved()
+                return chat
+            
+            for _, sender, content, timestamp in messages_rows:
+                chat.add_message(Message.from_micros(sender, content, timestamp))
+            
+            chat.mark_saved()
+            self.cache.put(key, chat, version)
+            return chat
+    
+    def load_chat_page(self, chat_id: str, before: Optional[Tuple[int, int]] = None,
+                       limit: int = 200, include_archive: bool = False
+                       ) -> Tuple[List[Message], Optional[Tuple[int, int]]]:
+        """Carica i `limit` messaggi più recenti prima del cursore `before` (keyset su timestamp, id).
+        
+        Restituisce i messaggi in ordine cronologico e il cursore per la pagina
+        ancora più vecchia (None se non ce ne sono altre). Con include_archive,
+        esaurito il database principale si prosegue nell'archivio.
+        """
+        keyset = 'AND (m.timestamp, m.id) < (?, ?)' if before is not None else ''
+        params = [chat_id] + (list(before) if before is not None else []) + [limit + 1]
+        
+        conn = self._connect()
+        rows = conn.execute(
+            f'''SELECT m.id, s.name, m.content, m.timestamp
+               FROM messages m LEFT JOIN senders s ON s.id = m.sender_id
+               WHERE m.chat_id = ? {keyset}
+               ORDER BY m.timestamp DESC, m.id DESC
+               LIMIT ?''',
+            params
+        ).fetchall()
+        
+        if include_archive and len(rows) <= limit:
+            archived = self._archived_rows(conn, chat_id, before, limit + 1)
+            rows = self._merge_rows(rows, archived, descending=True)[:limit + 1]
+        
+        more = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+        
+        cursor = (rows[0][3], rows[0][0]) if more else None
+        messages = [Message.from_micros(sender, content, timestamp) for _, sender, content, timestamp in rows]
+        return messages, cursor
+    
+    def open_chat(self, chat_id: str, page_size: int = 200, include_archive: bool = False) -> Chat:
+        """Carica una chat con la sola pagina di messaggi più recente"""
+        key = (chat_id, 'page', page_size, include_archive)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        version = self.cache.version(chat_id)
+        
+        chat_row = self._connect().execute(
+            'SELECT chat_id, participants FROM chats WHERE chat_id = ?',
+            (chat_id,)
+        ).fetchone()
+        
+        if not chat_row:
+            raise ValueError(f"Chat {chat_id} non trovata")
+        
+        chat = Chat(chat_row[0], json.loads(chat_row[1]))
+        chat.messages, chat.older_cursor = self.load_chat_page(chat_id, limit=page_size,
+                                                               include_archive=include_archive)
+        chat.mark_saved()
+        self.cache.put(key, chat, version)
+        return chat
+    
+    def load_older(self, chat: Chat, page_size: int = 200, include_archive: bool = False) -> List[Message]:
+        """Aggiunge in testa alla chat la pagina di messaggi precedente e la restituisce"""
+        if chat.older_cursor is None:
+            return []
+        
+        messages, chat.older_cursor = self.load_chat_page(chat.chat_id, chat.older_cursor, page_size,
+                                                          include_archive)
+        chat.messages[:0] = messages
+        return messages
+    
+    def iter_all_chats(self, include_archive: bool = True) -> Iterator[Chat]:
+        """Scorre tutte le chat (ordinate per chat_id), costruendone una alla volta"""
+        for chat_id, participants, messages in self.iter_export(include_archive):
+            chat = Chat(chat_id, participants)
+            chat.messages = list(messages)
+            chat.mark_saved()
+            yield chat
+    
+    def iter_export(self, include_archive: bool = True) -> Iterator[Tuple[str, List[str], Iterator[Message]]]:
+        """Scorre le chat, ordinate per chat_id, come (chat_id, participants, messaggi) per
+        le esportazioni in streaming.
+        
+        Le chat, i messaggi e (con include_archive) l'archivio si leggono ognuno con un
+        solo cursore ordinato per chat_id, uniti man mano: i messaggi di una chat vanno
+        consumati prima di passare alla successiva. Nessuna chat viene caricata per
+        intero in memoria.
+        """
+        conn = self._connect()
+        chats = conn.execute('SELECT chat_id, participants FROM chats ORDER BY chat_id')
+        cursors = [conn.execute(
+            '''SELECT m.chat_id, m.id, s.name, m.content, m.timestamp
+               FROM messages m LEFT JOIN senders s ON s.id = m.sender_id
+               ORDER BY m.chat_id, m.timestamp, m.id'''
+        )]
+        if include_archive and self.archive_path:
+            cursors.append(conn.execute(
+                '''SELECT chat_id, id, sender, content, timestamp FROM archive.messages
+                   ORDER BY chat_id, timestamp, id'''
+            ))
+            cursors.append(conn.execute('SELECT chat_id, data FROM archive.segments ORDER BY chat_id, first_id'))
+        sources = [_ChatRows(cursor) for cursor in cursors]
+        
+        try:
+            for chat_id, participants in chats:
+                rows = [source.get(chat_id) for source in sources[:2]]
+                if len(sources) > 2:
+                    # Ogni segmento è già in ordine: si decomprime solo quando tocca alla sua chat
+                    rows.extend(json.loads(zlib.decompress(data)) for (data,) in sources[2].get(chat_id))
+                yield chat_id, json.loads(participants), self._merge_messages(rows)
+        finally:
+            chats.close()
+            for cursor in cursors:
+                cursor.close()
+    
+    def iter_chat_messages(self, chat_id: str, after_id: int = 0) -> Iterator[Message]:
+        """Messaggi di una chat (archivio compreso) in ordine cronologico, solo quelli con id > after_id"""
+        conn = self._connect()
+        sources = [conn.execute(
+            '''SELECT m.id, s.name, m.content, m.timestamp
+               FROM messages m LEFT JOIN senders s ON s.id = m.sender_id
+               WHERE m.chat_id = ? AND m.id > ?
+               ORDER BY m.timestamp, m.id''',
+            (chat_id, after_id)
+        )]
+        if self.archive_path:
+            sources.append(conn.execute(
+                '''SELECT id, sender, content, timestamp FROM archive.messages
+                   WHERE chat_id = ? AND id > ? ORDER BY timestamp, id''',
+                (chat_id, after_id)
+            ))
+            sources.extend(
+                [row for row in json.loads(zlib.decompress(data)) if row[0] > after_id]
+                for (data,) in conn.execute(
+                    'SELECT data FROM archive.segments WHERE chat_id = ? AND (last_id IS NULL OR last_id > ?)',
+                    (chat_id, after_id)
+                )
+            )
+        
+        try:
+            yield from self._merge_messages(sources)
+        finally:
+            for source in sources:
+                if isinstance(source, sqlite3.Cursor):
+                    source.close()
+    
+    @staticmethod
+    def _merge_messages(sources: List[Iterable[tuple]]) -> Iterator[Message]:
+        """Unisce in ordine cronologico righe (id, sender, content, timestamp) già ordinate"""
+        last_id = None
+        for message_id, sender, content, timestamp in heapq.merge(*sources, key=lambda row: (row[3], row[0])):
+            # Un messaggio rimasto in entrambi (spostamento interrotto) compare una volta sola
+            if message_id != last_id:
+                last_id = message_id
+                yield Message.from_micros(sender, content, timestamp)
+    
+    @contextmanager
+    def read_snapshot(self) -> Iterator[sqlite3.Connection]:
+        """Transazione di lettura sul thread corrente: le letture fatte nel blocco
+        (anche iter_export e backup_state) vedono tutte lo stesso stato del database"""
+        conn = self._connect()
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN')
+        try:
+            yield conn
+        finally:
+            conn.commit()
+    
+    def backup_state(self) -> Dict[str, list]:
+        """Impronta di ogni chat per i backup incrementali: {chat_id: [messaggi, id massimo,
+        ultimo messaggio, ultimo timestamp, data di creazione, partecipanti (JSON)]}"""
+        conn = self._connect()
+        max_ids = dict(conn.execute('SELECT chat_id, MAX(id) FROM messages GROUP BY chat_id'))
+        if self.archive_path:
+            archived = conn.execute(
+                '''SELECT chat_id, MAX(id) FROM archive.messages GROUP BY chat_id
+                   UNION ALL
+                   SELECT chat_id, MAX(last_id) FROM archive.segments WHERE last_id IS NOT NULL GROUP BY chat_id'''
+            ).fetchall()
+            # Segmenti senza last_id (archivi precedenti): l'id massimo si ricava dai dati
+            archived += [
+                (chat_id, self._segment_last_id(conn, chat_id, first_id))
+                for chat_id, first_id in conn.execute(
+                    'SELECT chat_id, first_id FROM archive.segments WHERE last_id IS NULL').fetchall()
+            ]
+            for chat_id, max_id in archived:
+                max_ids[chat_id] = max(max_id, max_ids.get(chat_id) or 0)
+        
+        rows = conn.execute(
+            '''SELECT c.chat_id, COALESCE(cs.message_count, 0), cs.last_message_id, cs.last_timestamp,
+                      c.created_at, c.participants
+               FROM chats c LEFT JOIN chat_summary cs ON cs.chat_id = c.chat_id'''
+        )
+        return {
+            chat_id: [count, max_ids.get(chat_id), last_id, last_timestamp, created_at, participants]
+            for chat_id, count, last_id, last_timestamp, created_at, participants in rows
+        }
+    
+    def get_all_chats(self) -> List[Chat]:
+        """Carica tutte le chat dal database"""
+        return list(self.iter_all_chats())
+    
+    def get_chat_list(self) -> List[str]:
+        """Restituisce la lista degli ID chat"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT chat_id FROM chats ORDER BY created_at').fetchall()
+            return [row[0] for row in rows]
+    
+    def get_chat_infos(self) -> List[Dict[str, Any]]:
+        """Restituisce ID, partecipanti e numero di messaggi di ogni chat"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                '''SELECT c.chat_id, c.participants, COALESCE(cs.message_count, 0)
+                   FROM chats c LEFT JOIN chat_summary cs ON cs.chat_id = c.chat_id
+                   ORDER BY c.created_at'''
+            ).fetchall()
+            return [
+                {'chat_id': chat_id, 'participants': json.loads(participants), 'message_count': count}
+                for chat_id, participants, count in rows
+            ]
+    
+    def get_chat_summaries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Elenco delle chat dalla più recente, con conteggi e ultimo messaggio, da chat_summary"""
+        rows = self._connect().execute(
+            f'''SELECT c.chat_id, c.participants, cs.message_count, cs.unread_count,
+                      cs.last_activity, s.name, m.content
+               FROM chat_summary cs
+               JOIN chats c ON c.chat_id = cs.chat_id
+               LEFT JOIN messages m ON m.id = cs.last_message_id
+               LEFT JOIN senders s ON s.id = m.sender_id
+               ORDER BY cs.last_activity DESC
+               {'LIMIT ?' if limit is not None else ''}''',
+            (limit,) if limit is not None else ()
+        ).fetchall()
+        
+        return [
+            {
+                'chat_id': chat_id,
+                'participants': json.loads(participants),
+                'message_count': message_count,
+                'unread_count': unread_count,
+                'last_activity': _from_micros(last_activity),
+                'last_sender': last_sender,
+                'last_content': last_content
+            }
+            for chat_id, participants, message_count, unread_count, last_activity, last_sender, last_content in rows
+        ]
+    
+    def mark_read(self, chat_id: str):
+        """Azzera i messaggi non letti di una chat"""
+        with self._connect() as conn:
+            conn.execute('UPDATE chat_summary SET unread_count = 0 WHERE chat_id = ?', (chat_id,))
+    
+    def append_messages(self, chat_id: str, messages: List[Message]):
+        """Aggiunge messaggi a una chat esistente senza riscrivere la cronologia"""
+        with self._connect() as conn:
+            self._insert_messages(conn, chat_id, messages)
+        self.cache.extend(chat_id, messages)
+    
+    def save_chats(self, chats: List[Chat]):
+        """Salva molte chat in un'unica transazione"""
+        with self._connect() as conn:
+            for chat in chats:
+                self._save_chat(conn, chat)
+        for chat in chats:
+            self._cache_saved(chat)
+            chat.mark_saved()
+    
+    def bulk_import(self, chats: Iterable[Chat], batch_size: int = 50000,
+                    progress: Optional[Callable[[int, int], None]] = None,
+                    rebuild: Optional[bool] = None) -> int:
+        """Importa molte chat (come save_chat, sostituendo quelle già presenti) a blocchi di
+        circa `batch_size` messaggi, una transazione per blocco.
+        
+        Su un database vuoto, o se le chat in arrivo (quando se ne conosce il numero)
+        portano almeno tanti messaggi quanti ce ne sono già, indice, trigger FTS e
+        trigger di chat_summary vengono tolti durante il caricamento e ricostruiti una
+        sola volta alla fine; altrimenti restano attivi e un'importazione piccola costa
+        solo quanto i suoi messaggi. rebuild forza una delle due strade.
+        progress(chat, messaggi) viene richiamato dopo ogni blocco.
+        Restituisce il numero di chat importate.
+        """
+        conn = self._connect()
+        if rebuild is None:
+            existing = conn.execute('SELECT COALESCE(SUM(message_count), 0) FROM chat_summary').fetchone()[0]
+            incoming = sum(len(chat.messages) for chat in chats) if isinstance(chats, (list, tuple)) else None
+            rebuild = existing == 0 or (incoming is not None and incoming >= existing)
+        
+        # Le chat importate sostituiscono le precedenti: i loro vecchi messaggi (id minore
+        # del primo importato) si eliminano alla fine con un'unica passata. La tabella è
+        # persistente: se il processo si chiude a metà, _init_db completa il lavoro
+        conn.execute('CREATE TABLE IF NOT EXISTS import_chats (chat_id TEXT PRIMARY KEY, first_id INTEGER)')
+        if rebuild:
+            conn.execute('DROP INDEX IF EXISTS idx_messages_chat_timestamp')
+            for name in self._IMPORT_TRIGGERS:
+                conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        conn.commit()
+        
+        next_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM messages').fetchone()[0]
+        sender_ids: Dict[str, int] = {}
+        chat_count = message_count = 0
+        chat_rows, import_rows, message_rows = [], [], []
+        
+        def sender_id(name: str) -> Optional[int]:
+            if name is None:
+                return None
+            if name not in sender_ids:
+                conn.execute('INSERT OR IGNORE INTO senders (name) VALUES (?)', (name,))
+                sender_ids[name] = conn.execute('SELECT id FROM senders WHERE name = ?', (name,)).fetchone()[0]
+            return sender_ids[name]
+        
+        def write_batch():
+            with conn:
+                conn.executemany('INSERT OR REPLACE INTO chats (chat_id, participants) VALUES (?, ?)', chat_rows)
+                # Una chat già importata in questa stessa chiamata tiene il primo first_id
+                conn.executemany('INSERT OR IGNORE INTO import_chats (chat_id, first_id) VALUES (?, ?)', import_rows)
+                conn.executemany(
+                    'INSERT INTO messages (id, chat_id, sender_id, content, timestamp) VALUES (?, ?, ?, ?, ?)',
+                    message_rows
+                )
+            chat_rows.clear()
+            import_rows.clear()
+            message_rows.clear()
+            if progress is not None:
+                progress(chat_count, message_count)
+        
+        try:
+            for chat in chats:
+                chat_rows.append((chat.chat_id, json.dumps(chat.participants)))
+                import_rows.append((chat.chat_id, next_id))
+                for m in chat.messages:
+                    message_rows.append((next_id, chat.chat_id, sender_id(m.sender), m.content, m.micros))
+                    next_id += 1
+                
+                chat_count += 1
+                message_count += len(chat.messages)
+                chat.mark_saved()
+                if len(message_rows) >= batch_size:
+                    write_batch()
+            
+            if chat_rows:
+                write_batch()
+        finally:
+            self._finish_import(conn)
+            self.cache.invalidate()
+        
+        return chat_count
+    
+    # Trigger tolti da bulk_import durante un caricamento grande
+    _IMPORT_TRIGGERS = (
+        'chat_summary_chat_insert', 'chat_summary_chat_delete',
+        'chat_summary_message_insert', 'chat_summary_message_delete',
+        'messages_fts_insert', 'messages_fts_delete', 'messages_fts_update',
+    )
+    
+    def _missing_triggers(self, conn: sqlite3.Connection) -> set:
+        """Indice e trigger che bulk_import toglie e che ora mancano"""
+        if self.schema_version() < 4:
+            return set()
+        
+        expected = {'idx_messages_chat_timestamp'} | {
+            name for name in self._IMPORT_TRIGGERS
+            if self._has_fts_table(conn) or not name.startswith('messages_fts')
+        }
+        present = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger')")}
+        return expected - present
+    
+    @staticmethod
+    def _import_pending(conn: sqlite3.Connection) -> bool:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'import_chats'"
+        ).fetchone()
+        return exists is not None and conn.execute('SELECT 1 FROM import_chats LIMIT 1').fetchone() is not None
+    
+    def _finish_import(self, conn: sqlite3.Connection):
+        """Chiude un bulk_import, anche interrotto: elimina i vecchi messaggi delle chat
+        importate, ricrea indice e trigger mancanti e ricostruisce quello che mantenevano"""
+        missing = self._missing_triggers(conn)
+        fts = self._has_fts_table(conn)
+        pending = self._import_pending(conn)
+        
+        with conn:
+            if pending:
+                conn.execute('''
+                    DELETE FROM messages
+                    WHERE id < (SELECT first_id FROM import_chats i WHERE i.chat_id = messages.chat_id)
+                ''')
+                if self.archive_path and conn.execute(
+                        "SELECT 1 FROM archive.sqlite_master WHERE name = 'segments'").fetchone():
+                    conn.execute('DELETE FROM archive.messages WHERE chat_id IN (SELECT chat_id FROM import_chats)')
+                    conn.execute('DELETE FROM archive.segments WHERE chat_id IN (SELECT chat_id FROM import_chats)')
+            
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_messages_chat_timestamp ON messages (chat_id, timestamp)')
+            
+            if pending:
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO chat_summary (chat_id, last_activity)
+                    SELECT chat_id, {_local_micros_sql("'now'")} FROM import_chats
+                ''')
+                self._refresh_summary(conn, 'chat_id IN (SELECT chat_id FROM import_chats)')
+            self._create_summary_triggers(conn)
+            if pending:
+                conn.execute('DELETE FROM import_chats')
+            
+            if fts:
+                self._create_fts_triggers(conn)
+                if missing & {'messages_fts_insert', 'messages_fts_delete', 'messages_fts_update'}:
+                    conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+    
+    @staticmethod
+    def _has_fts_table(conn: sqlite3.Connection) -> bool:
+        return conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone() is not None
+    
+    def delete_chat(self, chat_id: str):
+        """Elimina una chat e i suoi messaggi"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM chats WHERE chat_id = ?', (chat_id,))
+            conn.execute('DELETE FROM messages WHERE chat_id = ?', (chat_id,))
+            self._delete_archived(conn, chat_id)
+        self.cache.invalidate(chat_id)
+    
+    def archive_messages(self, older_than: timedelta, compress: bool = False) -> int:
+        """Sposta nell'archivio i messaggi più vecchi di older_than e restituisce quanti ne ha spostati.
+        
+        Con compress=True i messaggi di ogni chat finiscono in un unico segmento
+        compresso con zlib invece che in righe singole.
+        """
+        if not self.archive_path:
+            raise RuntimeError("Archivio non configurato: passare archive_path a ChatDatabase")
+        
+        cutoff = _to_micros(datetime.now() - older_than)
+        conn = self._connect()
+        with conn:
+            # Completa una volta sola i segmenti scritti prima della colonna last_id
+            for chat_id, first_id in conn.execute(
+                    'SELECT chat_id, first_id FROM archive.segments WHERE last_id IS NULL').fetchall():
+                conn.execute('UPDATE archive.segments SET last_id = ? WHERE chat_id = ? AND first_id = ?',
+                             (self._segment_last_id(conn, chat_id, first_id), chat_id, first_id))
+            
+            # chat_summary conta anche i messaggi archiviati: i trigger di DELETE li sottraggono
+            moved_per_chat = conn.execute(
+                'SELECT COUNT(*), chat_id FROM main.messages WHERE timestamp < ? GROUP BY chat_id',
+                (cutoff,)
+            ).fetchall()
+            
+            if compress:
+                rows = conn.execute(
+                    '''SELECT m.chat_id, m.id, s.name, m.content, m.timestamp
+                       FROM main.messages m LEFT JOIN main.senders s ON s.id = m.sender_id
+                       WHERE m.timestamp < ?
+                       ORDER BY m.chat_id, m.timestamp, m.id''',
+                    (cutoff,)
+                )
+                for chat_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+                    messages = [row[1:] for row in group]
+                    conn.execute(
+                        '''INSERT OR REPLACE INTO archive.segments
+                           (chat_id, first_id, first_timestamp, last_timestamp, message_count, data, last_id)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                        (chat_id, messages[0][0], messages[0][3], messages[-1][3], len(messages),
+                         zlib.compress(json.dumps(messages, ensure_ascii=False).encode('utf-8')),
+                         max(message[0] for message in messages))
+                    )
+            else:
+                conn.execute(
+                    '''INSERT OR IGNORE INTO archive.messages (id, chat_id, sender, content, timestamp)
+                       SELECT m.id, m.chat_id, s.name, m.content, m.timestamp
+                       FROM main.messages m LEFT JOIN main.senders s ON s.id = m.sender_id
+                       WHERE m.timestamp < ?''',
+                    (cutoff,)
+                )
+            
+            moved = conn.execute('DELETE FROM main.messages WHERE timestamp < ?', (cutoff,)).rowcount
+            conn.executemany(
+                'UPDATE chat_summary SET message_count = message_count + ? WHERE chat_id = ?',
+                moved_per_chat
+            )
+        
+        # Le copie in cache senza archivio conterrebbero ancora i messaggi spostati
+        self.cache.invalidate()
+        return moved
+    
+    def enable_incremental_vacuum(self) -> bool:
+        """Porta il database principale ad auto_vacuum INCREMENTAL; True se ha dovuto convertirlo.
+        
+        Su un database esistente la conversione richiede un VACUUM completo, che
+        riscrive tutto il file: va chiamato fuori dal thread dell'interfaccia.
+        """
+        conn = self._connect()
+        if conn.execute('PRAGMA main.auto_vacuum').fetchone()[0] == 2:
+            return False
+        
+        conn.execute('PRAGMA main.auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM main')
+        return True
+    
+    def vacuum(self, pages: int = 0) -> int:
+        """VACUUM incrementale del database principale: libera fino a `pages` pagine (0 = tutte).
+        
+        Restituisce il numero di pagine restituite al filesystem.
+        """
+        conn = self._connect()
+        before = conn.execute('PRAGMA main.freelist_count').fetchone()[0]
+        # execute() farebbe un solo passo (una pagina): executescript lo porta a termine
+        conn.executescript(f'PRAGMA main.incremental_vacuum({int(pages)});')
+        return before - conn.execute('PRAGMA main.freelist_count').fetchone()[0]
+    
+    def _archived_rows(self, conn: sqlite3.Connection, chat_id: str,
+                       before: Optional[Tuple[int, int]] = None, limit: Optional[int] = None) -> List[tuple]:
+        """Messaggi archiviati di una chat come righe (id, sender, content, timestamp).
+        
+        Con `limit` restituisce almeno i `limit` più recenti prima di `before`.
+        """
+        if not self.archive_path:
+            return []
+        
+        keyset = 'AND (timestamp, id) < (?, ?)' if before is not None else ''
+        params = [chat_id] + (list(before) if before is not None else [])
+        rows = conn.execute(
+            f'''SELECT id, sender, content, timestamp FROM archive.messages
+                WHERE chat_id = ? {keyset}
+                ORDER BY timestamp DESC, id DESC
+                {'LIMIT ?' if limit is not None else ''}''',
+            params + ([limit] if limit is not None else [])
+        ).fetchall()
+        
+        # Timestamp dei `limit` messaggi più recenti trovati finora (min-heap)
+        newest = [row[3] for row in rows]
+        heapq.heapify(newest)
+        
+        keyset = 'AND (first_timestamp, first_id) < (?, ?)' if before is not None else ''
+        segments = conn.execute(
+            f'''SELECT first_id, last_timestamp FROM archive.segments
+                WHERE chat_id = ? {keyset} ORDER BY last_timestamp DESC''',
+            params
+        ).fetchall()
+        for first_id, last_timestamp in segments:
+            # Dal segmento più recente: quando è più vecchio di tutti i `limit`
+            # messaggi già trovati, lui e i successivi non vanno decompressi
+            if limit is not None and len(newest) >= limit and last_timestamp < newest[0]:
+                break
+            
+            for row in self._segment_rows(conn, chat_id, first_id):
+                if before is None or (row[3], row[0]) < before:
+                    rows.append(tuple(row))
+                    if limit is not None:
+                        heapq.heappush(newest, row[3])
+                        if len(newest) > limit:
+                            heapq.heappop(newest)
+
+        return rows
+
+    @classmethod
+    def _segment_last_id(cls, conn: sqlite3.Connection, chat_id: str, first_id: int) -> int:
+        return max(row[0] for row in cls._segment_rows(conn, chat_id, first_id))
+    
+    @staticmethod
+    def _segment_rows(conn: sqlite3.Connection, chat_id: str, first_id: int) -> List[list]:
+        """Decomprime un solo segmento dell'archivio"""
+        (data,) = conn.execute(
+            'SELECT data FROM archive.segments WHERE chat_id = ? AND first_id = ?',
+            (chat_id, first_id)
+        ).fetchone()
+        return json.loads(zlib.decompress(data))
+    
+    @staticmethod
+    def _merge_rows(rows: List[tuple], archived: List[tuple], descending: bool = False) -> List[tuple]:
+        """Unisce righe (id, sender, content, timestamp) del database principale e dell'archivio"""
+        if not archived:
+            return rows
+        
+        merged = {row[0]: row for row in archived}
+        # Un messaggio rimasto in entrambi (spostamento interrotto) compare una volta sola
+        merged.update((row[0], row) for row in rows)
+        return sorted(merged.values(), key=lambda row: (row[3], row[0]), reverse=descending)
+    
+    def _delete_archived(self, conn: sqlite3.Connection, chat_id: str):
+        if self.archive_path:
+            conn.execute('DELETE FROM archive.messages WHERE chat_id = ?', (chat_id,))
+            conn.execute('DELETE FROM archive.segments WHERE chat_id = ?', (chat_id,))
+    
+    @staticmethod
+    def _fts_query(text: str) -> str:
+        """Trasforma il testo digitato in una query FTS5: tutte le parole obbligatorie,
+        l'ultima (quella che si sta ancora scrivendo) cercata come prefisso"""
+        terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+        if terms:
+            terms[-1] += '*'
+        return ' '.join(terms)
+    
+    @staticmethod
+    def _like_pattern(text: str) -> str:
+        return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    
+    def search(self, query: str, chat_id: Optional[str] = None,
+               limit: int = 50, offset: int = 0, include_archive: bool = False) -> List[Dict[str, Any]]:
+        """Cerca nei messaggi; restituisce i risultati ordinati per rilevanza con uno snippet.
+        
+        Con include_archive si cerca anche nell'archivio; quei risultati seguono
+        quelli del database principale e hanno rank None.
+        """
+        if not query.strip():
+            return []
+        
+        if include_archive and self.archive_path:
+            results = self.search(query, chat_id, limit + offset) + self._search_archive(query, chat_id, limit + offset)
+            return results[offset:offset + limit]
+        
+        conn = self._connect()
+        chat_filter = 'AND m.chat_id = ?' if chat_id is not None else ''
+        
+        if self._has_fts_table(conn):
+            params = [self._fts_query(query)] + ([chat_id] if chat_id is not None else []) + [limit, offset]
+            rows = conn.execute(
+                f'''SELECT m.chat_id, s.name, m.timestamp,
+                          snippet(messages_fts, 0, '[', ']', '…', 12), bm25(messages_fts)
+                   FROM messages_fts
+                   JOIN messages m ON m.id = messages_fts.rowid
+                   LEFT JOIN senders s ON s.id = m.sender_id
+                   WHERE messages_fts MATCH ? {chat_filter}
+                   ORDER BY bm25(messages_fts)
+                   LIMIT ? OFFSET ?''',
+                params
+            ).fetchall()
+        else:
+            params = [self._like_pattern(query)] + ([chat_id] if chat_id is not None else []) + [limit, offset]
+            rows = conn.execute(
+                f'''SELECT m.chat_id, s.name, m.timestamp, m.content, 0
+                   FROM messages m LEFT JOIN senders s ON s.id = m.sender_id
+                   WHERE m.content LIKE ? ESCAPE '\\' {chat_filter}
+                   ORDER BY m.timestamp DESC
+                   LIMIT ? OFFSET ?''',
+                params
+            ).fetchall()
+        
+        return [
+            {
+                'chat_id': row_chat_id,
+                'sender': sender,
+                'timestamp': _from_micros(timestamp),
+                'snippet': snippet,
+                'rank': rank
+            }
+            for row_chat_id, sender, timestamp, snippet, rank in rows
+        ]
+    
+    def _search_archive(self, query: str, chat_id: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Ricerca per sottostringa (come il ripiego LIKE) nelle righe e nei segmenti archiviati"""
+        conn = self._connect()
+        chat_filter = 'AND chat_id = ?' if chat_id is not None else ''
+        chat_param = [chat_id] if chat_id is not None else []
+        
+        rows = conn.execute(
+            f'''SELECT chat_id, sender, timestamp, content FROM archive.messages
+                WHERE content LIKE ? ESCAPE '\\' {chat_filter}
+                ORDER BY timestamp DESC
+                LIMIT ?''',
+            [self._like_pattern(query)] + chat_param + [limit]
+        ).fetchall()
+        
+        # Come in _archived_rows: i segmenti più vecchi dei `limit` risultati
+        # più recenti già trovati non vengono decompressi
+        newest = [row[2] for row in rows]
+        heapq.heapify(newest)
+        
+        needle = query.lower()
+        segments = conn.execute(
+            f'''SELECT chat_id, first_id, last_timestamp FROM archive.segments
+                WHERE 1 {chat_filter} ORDER BY last_timestamp DESC''',
+            chat_param
+        ).fetchall()
+        for segment_chat_id, first_id, last_timestamp in segments:
+            if len(newest) >= limit and last_timestamp < newest[0]:
+                break
+            
+            for _, sender, content, timestamp in self._segment_rows(conn, segment_chat_id, first_id):
+                if needle in content.lower():
+                    rows.append((segment_chat_id, sender, timestamp, content))
+                    heapq.heappush(newest, timestamp)
+                    if len(newest) > limit:
+                        heapq.heappop(newest)
+        
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return [
+            {
+                'chat_id': row_chat_id,
+                'sender': sender,
+                'timestamp': _from_micros(timestamp),
+                'snippet': content,
+                'rank': None
+            }
+            for row_chat_id, sender, timestamp, content in rows[:limit]
+        ]
+
+# ==================== WORKER DATABASE ====================
+
+class DatabaseWorker:
+    """Thread dedicato alle operazioni sul database.
+    
+    Le richieste vengono eseguite una alla volta, nell'ordine di arrivo, sulla
+    connessione del worker; submit() restituisce subito un Future.
+    """
+    
+    def __init__(self, db: ChatDatabase, name: str = "chat-db"):
+        self.db = db
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+    
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """Accoda func(*args, **kwargs) e restituisce il Future del suo risultato"""
+        future = Future()
+        self._queue.put((future, func, args, kwargs))
+        return future
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            future, func, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+    
+    def close(self):
+        """Esegue le richieste ancora in coda e ferma il thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+# ==================== FORMATO BINARIO ====================
+
+# Layout del file (little-endian):
+#   header  : magic(4s) versione(H) flags(H) numero_chat(I) offset_indice(Q)
+#   record  : lunghezza(I) + chat_id, partecipanti, messaggi
+#             ogni messaggio: timestamp in microsecondi(q) + sender(H+bytes) + contenuto(I+bytes)
+#   indice  : per ogni chat chat_id(H+bytes) offset(Q) lunghezza(I) numero_messaggi(I)
+BINARY_MAGIC = b'PSCB'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sHHIQ')
+BINARY_INDEX_ENTRY = struct.Struct('<QII')
+def _pack_str(value: str, size: str = 'H') -> bytes:
+    data = value.encode('utf-8')
+    return struct.pack(f'<{size}', len(data)) + data
+
+def _unpack_str(buffer, offset: int, size: str = 'H'):
+    fmt = struct.Struct(f'<{size}')
+    (length,) = fmt.unpack_from(buffer, offset)
+    offset += fmt.size
+    return str(buffer[offset:offset + length], 'utf-8'), offset + length
+
+def encode_chat_record(chat: Chat) -> bytes:
+    """Serializza una chat nel formato record del file binario"""
+    parts = [_pack_str(chat.chat_id), struct.pack('<H', len(chat.participants))]
+    parts.extend(_pack_str(p) for p in chat.participants)
+    parts.append(struct.pack('<I', len(chat.messages)))
+    
+    for message in chat.messages:
+        parts.append(struct.pack('<q', message.micros))
+        parts.append(_pack_str(message.sender))
+        parts.append(_pack_str(message.content, 'I'))
+    
+    return b''.join(parts)
+
+def decode_chat_record(buffer, offset: int = 0) -> Chat:
+    """Ricostruisce una chat a partire da un record del file binario"""
+    chat_id, offset = _unpack_str(buffer, offset)
+    (count,) = struct.unpack_from('<H', buffer, offset)
+    offset += 2
+    
+    participants = []
+    for _ in range(count):
+        participant, offset = _unpack_str(buffer, offset)
+        participants.append(participant)
+    
+    chat = Chat(chat_id, participants)
+    (count,) = struct.unpack_from('<I', buffer, offset)
+    offset += 4
+    
+    for _ in range(count):
+        (micros,) = struct.unpack_from('<q', buffer, offset)
+        sender, offset = _unpack_str(buffer, offset + 8)
+        content, offset = _unpack_str(buffer, offset, 'I')
+        chat.add_message(Message.from_micros(sender, content, micros))
+    
+    return chat
+
+def write_binary_snapshot(chats: Iterable[Chat], filepath: str) -> int:
+    """Scrive le chat nel formato binario una alla volta; restituisce il numero di chat"""
+    index = []
+    
+    with open(filepath, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, 0, 0))
+        
+        for chat in chats:
+            record = encode_chat_record(chat)
+            f.write(struct.pack('<I', len(record)))
+            index.append((chat.chat_id, f.tell(), len(record), len(chat.messages)))
+            f.write(record)
+        
+        index_offset = f.tell()
+        for chat_id, offset, length, count in index:
+            f.write(_pack_str(chat_id))
+            f.write(BINARY_INDEX_ENTRY.pack(offset, length, count))
+        
+        f.seek(0)
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, 0, len(index), index_offset))
+    
+    return len(index)
+
+class BinarySnapshot:
+    """Lettura ad accesso casuale di uno snapshot binario tramite mmap.
+    
+    All'apertura viene letto solo l'indice: aprire una chat tocca soltanto
+    le pagine del suo record.
+    """
+    
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._file = open(filepath, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, _, count, index_offset = BINARY_HEADER.unpack_from(self._map, 0)
+        if magic != BINARY_MAGIC:
+            self.close()
+            raise ValueError(f"{filepath} non è uno snapshot binario")
+        if version > BINARY_VERSION:
+            self.close()
+            raise ValueError(f"Versione dello snapshot non supportata: {version}")
+        
+        self.version = version
+        self.index: Dict[str, tuple] = {}
+        offset = index_offset
+        for _ in range(count):
+            chat_id, offset = _unpack_str(self._map, offset)
+            self.index[chat_id] = BINARY_INDEX_ENTRY.unpack_from(self._map, offset)
+            offset += BINARY_INDEX_ENTRY.size
+    
+    def chat_ids(self) -> List[str]:
+        return list(self.index)
+    
+    def message_count(self, chat_id: str) -> int:
+        return self.index[chat_id][2]
+    
+    def load_chat(self, chat_id: str) -> Chat:
+        if chat_id not in self.index:
+            raise ValueError(f"Chat {chat_id} non trovata")
+        offset, _, _ = self.index[chat_id]
+        return decode_chat_record(self._map, offset)
+    
+    def iter_chats(self) -> Iterator[Chat]:
+        for chat_id in self.index:
+            yield self.load_chat(chat_id)
+    
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+# ==================== GESTIONE BACKUP ====================
+
+class ExportWriter:
+    """File di testo per le esportazioni in streaming: conta chat, messaggi e byte
+    scritti e li segnala a progress(chats, messages, bytes_written). Tiene anche
+    il primo e l'ultimo timestamp (microsecondi) per il catalogo dei backup"""
+    
+    # Ogni quanti messaggi segnalare l'avanzamento (oltre che a fine chat)
+    PROGRESS_EVERY = 10000
+    
+    def __init__(self, f, progress: Optional[Callable[[int, int, int], None]] = None):
+        self.file = f
+        self.progress = progress
+        self.chats = 0
+        self.messages = 0
+        self.bytes_written = 0
+        self.first_micros: Optional[int] = None
+        self.last_micros: Optional[int] = None
+        # In modalità testo su Windows ogni \n diventa \r\n (non nei backup compressi)
+        self._newline_extra = 0 if isinstance(f, CompressedWriter) else len(os.linesep) - 1
+    
+    def write(self, text: str):
+        self.file.write(text)
+        self.bytes_written += len(text.encode('utf-8')) + self._newline_extra * text.count('\n')
+    
+    def message_done(self, message: Message):
+        self.messages += 1
+        if self.first_micros is None or message.micros < self.first_micros:
+            self.first_micros = message.micros
+        if self.last_micros is None or message.micros > self.last_micros:
+            self.last_micros = message.micros
+        if self.progress and self.messages % self.PROGRESS_EVERY == 0:
+            self.progress(self.chats, self.messages, self.bytes_written)
+    
+    def chat_done(self):
+        self.chats += 1
+        if isinstance(self.file, CompressedWriter):
+            self.file.end_frame()
+        self.report()
+    
+    def report(self):
+        if self.progress:
+            self.progress(self.chats, self.messages, self.bytes_written)
+
+def _json_block(value: Any, level: int) -> str:
+    """json.dumps(indent=2) di value, rientrato come se fosse annidato a profondità level"""
+    return json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n' + '  ' * level)
+
+# Codec dei backup compressi: estensione, modulo e livello predefinito
+COMPRESSION_CODECS = {
+    'gzip': ('gz', gzip, 6),
+    'bz2': ('bz2', bz2, 9),
+    'xz': ('xz', lzma, 6),
+}
+# Byte iniziali con cui si riconosce un file compresso in importazione
+COMPRESSION_MAGIC = [
+    (b'\x1f\x8b', gzip),
+    (b'BZh', bz2),
+    (b'\xfd7zXZ\x00', lzma),
+]
+
+def _compress_frame(codec: str, level: int, data: bytes) -> bytes:
+    """Comprime un frame come stream autonomo (eseguita nei processi del pool)"""
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if codec == 'bz2':
+        return bz2.compress(data, level)
+    return lzma.compress(data, preset=level)
+
+def open_backup(filepath: str, mode: str = 'r'):
+    """Apre un backup in lettura, decomprimendolo se è gzip, bz2 o xz (riconosciuti
+    dai primi byte, non dall'estensione); mode è 'r' (testo UTF-8) o 'rb'"""
+    with open(filepath, 'rb') as f:
+        head = f.read(6)
+    
+    for magic, module in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            if mode == 'rb':
+                return module.open(filepath, 'rb')
+            return module.open(filepath, 'rt', encoding='utf-8')
+    
+    if mode == 'rb':
+        return open(filepath, 'rb')
+    return open(filepath, 'r', encoding='utf-8')
+
+class HashingFile(io.RawIOBase):
+    """File binario in scrittura che calcola lo SHA-256 di ciò che scrive: il
+    checksum per il catalogo dei backup è pronto senza rileggere il file"""
+    
+    def __init__(self, filepath: str):
+        super().__init__()
+        self.file = open(filepath, 'wb')
+        self.digest = hashlib.sha256()
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        self.digest.update(data)
+        return self.file.write(data)
+    
+    def flush(self):
+        self.file.flush()
+    
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.file.close()
+    
+    def checksum(self) -> str:
+        return self.digest.hexdigest()
+
+class CompressedWriter:
+    """File di testo compresso a frame indipendenti, compressi in parallelo.
+    
+    Il testo viene diviso in frame a fine chat (end_frame) appena supera
+    FRAME_SIZE; ogni frame è uno stream gzip/bz2/xz completo e i frame vengono
+    compressi da un pool di processi e scritti in ordine, uno di seguito
+    all'altro. Uno stream concatenato è ancora un file valido: gzip.open,
+    bz2.open e lzma.open lo leggono come un unico testo.
+    """
+    
+    FRAME_SIZE = 1 << 20
+    # Una singola chat enorme viene spezzata comunque, per non tenerla tutta in memoria
+    MAX_FRAME_SIZE = 8 << 20
+    
+    def __init__(self, file, codec: str, level: Optional[int] = None, workers: Optional[int] = None):
+        """file è un file binario aperto in scrittura, chiuso da close()"""
+        if codec not in COMPRESSION_CODECS:
+            raise ValueError(f"Codec di compressione sconosciuto: {codec}")
+        
+        self.codec = codec
+        self.level = level if level is not None else COMPRESSION_CODECS[codec][2]
+        self.workers = workers or os.cpu_count() or 1
+        self.bytes_written = 0
+        self.file = file
+        
+        self._pool = None
+        self._pending = deque()
+        self._chunks = []
+        self._size = 0
+        self._frames = 0
+    
+    def write(self, text: str):
+        data = text.encode('utf-8')
+        self._chunks.append(data)
+        self._size += len(data)
+        if self._size >= self.MAX_FRAME_SIZE:
+            self._cut()
+    
+    def end_frame(self):
+        if self._size >= self.FRAME_SIZE:
+            self._cut()
+    
+    def _cut(self, last: bool = False):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        self._frames += 1
+        
+        if self._pool is None:
+            if last or self.workers == 1:
+                # Backup piccolo (un solo frame) o un solo processo: niente pool
+                self._write_frame(_compress_frame(self.codec, self.level, data))
+                return
+            # fork da un thread secondario di Tk può bloccare i processi figli
+            # su lock copiati a metà: si avviano processi nuovi
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        
+        self._pending.append(self._pool.submit(_compress_frame, self.codec, self.level, data))
+        # Al massimo due frame in attesa per processo: la memoria resta limitata
+        while len(self._pending) > 2 * self.workers:
+            self._write_frame(self._pending.popleft().result())
+    
+    def _write_frame(self, frame: bytes):
+        self.file.write(frame)
+        self.bytes_written += len(frame)
+    
+    def close(self):
+        try:
+            if self._size or not self._frames:
+                self._cut(last=True)
+            while self._pending:
+                self._write_frame(self._pending.popleft().result())
+        finally:
+            self._shutdown()
+    
+    def _shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._shutdown()
+
+# Un messaggio come lo scrive json.dump(indent=2) dentro "messages"
+_JSON_MESSAGE = (
+    '{\n          "sender": %s,\n          "content": %s,\n'
+    '          "timestamp": %s\n        }'
+)
+
+def _chat_records(chats: Iterable[Chat]) -> Iterator[Tuple[str, List[str], Iterable[Message]]]:
+    for chat in chats:
+        yield chat.chat_id, chat.participants, chat.messages
+
+def _counted(chats: Iterable[Chat], counter: ExportWriter) -> Iterator[Chat]:
+    """Passa le chat così come sono, contandole in counter (un ExportWriter senza file)"""
+    for chat in chats:
+        for message in chat.messages:
+            counter.message_done(message)
+        counter.chat_done()
+        yield chat
+
+# File di servizio della cartella dei backup, che non sono backup
+CATALOG_NAME = "catalog.db"
+CHAIN_NAME = "chain.json"
+CATALOG_FILES = {CATALOG_NAME, CATALOG_NAME + "-journal", CATALOG_NAME + "-wal", CATALOG_NAME + "-shm", CHAIN_NAME}
+# Formato dei backup dall'estensione (tolta quella dell'eventuale compressione)
+BACKUP_FORMATS = {
+    '.json': 'json',
+    '.pkl': 'pickle',
+    '.txt': 'txt',
+    '.pcb': 'binario',
+    '.jsonl': 'incrementale',
+}
+
+def _backup_format(filename: str) -> Tuple[str, Optional[str]]:
+    """(formato, codec) di un file di backup, dedotti dal nome"""
+    root, extension = os.path.splitext(filename)
+    codec = None
+    for name, (codec_extension, _, _) in COMPRESSION_CODECS.items():
+        if extension == '.' + codec_extension:
+            codec = name
+            root, extension = os.path.splitext(root)
+            break
+    return BACKUP_FORMATS.get(extension, extension.lstrip('.') or 'sconosciuto'), codec
 
-# ==================== GESTIONE DATABASE ====================
+def _file_checksum(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
 
-class ChatDatabase:
-    def __init__(self, db_path: str = "chats.db"):
-        self.db_path = db_path
-        self._init_db()
+class BackupCatalog:
+    """Catalogo SQLite dei backup di una cartella: per ogni file formato, codec,
+    chat, messaggi, intervallo di tempo e checksum SHA-256, registrati da
+    BackupManager a ogni esportazione.
     
-    def _init_db(self):
-        """Inizializza il database e le tabelle"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS chats (
-                    chat_id TEXT PRIMARY KEY,
-                    participants TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    chat_id TEXT,
-                    sender TEXT,
-                    content TEXT,
-                    timestamp TIMESTAMP,
-                    FOREIGN KEY (chat_id) REFERENCES chats (chat_id)
+    list() riallinea prima il catalogo con un solo os.scandir: i file aggiunti
+    o modificati da fuori entrano con i soli dati del file system (conteggi e
+    checksum sconosciuti, vedi verify), quelli spariti vengono tolti.
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.folder = os.path.dirname(path)
+        # Usato sia dal worker (esportazioni) sia dalla GUI (lista): accessi serializzati dal lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS backups (
+                    filename TEXT PRIMARY KEY,
+                    format TEXT,
+                    codec TEXT,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    chats INTEGER,
+                    messages INTEGER,
+                    first_timestamp INTEGER,
+                    last_timestamp INTEGER,
+                    checksum TEXT
                 )
             ''')
     
-    def save_chat(self, chat: Chat):
-        """Salva una chat nel database"""
-        with sqlite3.connect(self.db_path) as conn:
-            # Salva la chat
-            conn.execute(
-                'INSERT OR REPLACE INTO chats (chat_id, participants) VALUES (?, ?)',
-                (chat.chat_id, json.dumps(chat.participants))
+    def record(self, filepath: str, format: Optional[str] = None, codec: Optional[str] = None,
+               chats: Optional[int] = None, messages: Optional[int] = None,
+               first_micros: Optional[int] = None, last_micros: Optional[int] = None,
+               checksum: Optional[str] = None):
+        """Registra (o aggiorna) un backup appena scritto nella cartella del catalogo.
+        Senza checksum (calcolato durante la scrittura, vedi HashingFile) il file viene riletto"""
+        filename = os.path.basename(filepath)
+        guessed_format, guessed_codec = _backup_format(filename)
+        codec = codec or guessed_codec
+        stats = os.stat(filepath)
+        checksum = checksum or _file_checksum(filepath)
+        
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO backups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (filename, format or guessed_format, codec, stats.st_size, stats.st_mtime_ns,
+                 chats, messages, first_micros, last_micros, checksum)
             )
-            
-            # Cancella messaggi esistenti e salva nuovi
-            conn.execute('DELETE FROM messages WHERE chat_id = ?', (chat.chat_id,))
-            
-            for message in chat.messages:
-                conn.execute(
-                    '''INSERT INTO messages (chat_id, sender, content, timestamp)
-                       VALUES (?, ?, ?, ?)''',
-                    (chat.chat_id, message.sender, message.content, message.timestamp.isoformat())
-                )
     
-    def load_chat(self, chat_id: str) -> Chat:
-        """Carica una chat dal database"""
-        with sqlite3.connect(self.db_path) as conn:
-            # Carica info chat
-            chat_row = conn.execute(
-                'SELECT chat_id, participants FROM chats WHERE chat_id = ?',
-                (chat_id,)
-            ).fetchone()
-            
-            if not chat_row:
-                raise ValueError(f"Chat {chat_id} non trovata")
+    def reconcile(self) -> Tuple[int, int]:
+        """Allinea il catalogo alla cartella; restituisce (file aggiunti o aggiornati, file tolti)"""
+        with self._lock, self._conn:
+            known = {
+                filename: (size, mtime_ns)
+                for filename, size, mtime_ns in self._conn.execute('SELECT filename, size, mtime_ns FROM backups')
+            }
             
-            participants = json.loads(chat_row[1])
-            chat = Chat(chat_row[0], participants)
+            changed = []
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.name in CATALOG_FILES or entry.name.endswith('.tmp') or not entry.is_file():
+                        continue
+                    stats = entry.stat()
+                    if known.pop(entry.name, None) != (stats.st_size, stats.st_mtime_ns):
+                        changed.append((entry.name, *_backup_format(entry.name), stats.st_size, stats.st_mtime_ns))
             
-            # Carica messaggi
-            messages_rows = conn.execute(
-                '''SELECT sender, content, timestamp 
-                   FROM messages WHERE chat_id = ? 
-                   ORDER BY timestamp''',
-                (chat_id,)
+            self._conn.executemany(
+                '''INSERT OR REPLACE INTO backups (filename, format, codec, size, mtime_ns)
+                   VALUES (?, ?, ?, ?, ?)''',
+                changed
+            )
+            self._conn.executemany('DELETE FROM backups WHERE filename = ?', [(filename,) for filename in known])
+        
+        return len(changed), len(known)
+    
+    def list(self) -> List[Dict[str, Any]]:
+        """Backup della cartella dal più recente, dal catalogo riallineato"""
+        self.reconcile()
+        with self._lock:
+            rows = self._conn.execute(
+                '''SELECT filename, format, codec, size, mtime_ns, chats, messages,
+                          first_timestamp, last_timestamp, checksum
+                   FROM backups ORDER BY mtime_ns DESC'''
             ).fetchall()
-            
-            for sender, content, timestamp in messages_rows:
-                chat.add_message(Message(sender, content, datetime.fromisoformat(timestamp)))
-            
-            return chat
+        
+        return [
+            {
+                'filename': filename,
+                'path': os.path.join(self.folder, filename),
+                'format': format,
+                'codec': codec,
+                'size': size,
+                'modified': datetime.fromtimestamp(mtime_ns / 1e9),
+                'chats': chats,
+                'messages': messages,
+                'first_timestamp': _from_micros(first) if first is not None else None,
+                'last_timestamp': _from_micros(last) if last is not None else None,
+                'checksum': checksum
+            }
+            for filename, format, codec, size, mtime_ns, chats, messages, first, last, checksum in rows
+        ]
     
-    def get_all_chats(self) -> List[Chat]:
-        """Carica tutte le chat dal database"""
-        with sqlite3.connect(self.db_path) as conn:
-            chat_rows = conn.execute('SELECT chat_id FROM chats').fetchall()
-            chats = []
-            
-            for (chat_id,) in chat_rows:
-                try:
-                    chats.append(self.load_chat(chat_id))
-                except ValueError:
-                    continue
-            
-            return chats
+    def verify(self, filename: str) -> bool:
+        """Ricalcola il checksum di un backup: False se non coincide con quello registrato.
+        Per i file aggiunti da fuori (checksum sconosciuto) lo registra e restituisce True"""
+        checksum = _file_checksum(os.path.join(self.folder, filename))
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT checksum FROM backups WHERE filename = ?', (filename,)).fetchone()
+            if row is None:
+                raise ValueError(f"Backup {filename} non presente nel catalogo")
+            if row[0] is None:
+                self._conn.execute('UPDATE backups SET checksum = ? WHERE filename = ?', (checksum, filename))
+                return True
+            return row[0] == checksum
     
-    def get_chat_list(self) -> List[str]:
-        """Restituisce la lista degli ID chat"""
-        with sqlite3.connect(self.db_path) as conn:
-            rows = conn.execute('SELECT chat_id FROM chats ORDER BY created_at').fetchall()
-            return [row[0] for row in rows]
-
-# ==================== GESTIONE BACKUP ====================
+    def close(self):
+        self._conn.close()
 
 class BackupManager:
     def __init__(self, backup_dir: str = "backups"):
         self.backup_dir = backup_dir
         os.makedirs(backup_dir, exist_ok=True)
+        self.catalog = BackupCatalog(os.path.join(backup_dir, CATALOG_NAME))
+    
+    def _record(self, filepath: str, counter: Optional[ExportWriter] = None, format: Optional[str] = None,
+                codec: Optional[str] = None, checksum: Optional[str] = None):
+        """Registra nel catalogo un backup scritto nella cartella dei backup"""
+        if os.path.dirname(os.path.abspath(filepath)) != os.path.abspath(self.backup_dir):
+            return
+        if counter is None:
+            self.catalog.record(filepath, format, codec, checksum=checksum)
+        else:
+            self.catalog.record(filepath, format, codec, counter.chats, counter.messages,
+                                counter.first_micros, counter.last_micros, checksum)
     
-    def export_json(self, chats: List[Chat], filename: str = None) -> str:
-        """Esporta le chat in formato JSON"""
+    def _backup_path(self, filename: Optional[str], extension: str, codec: Optional[str] = None) -> str:
         if not filename:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"chat_backup_{timestamp}.json"
+            filename = f"chat_backup_{timestamp}.{extension}"
+            if codec:
+                filename += '.' + COMPRESSION_CODECS[codec][0]
+        return os.path.join(self.backup_dir, filename)
+    
+    def _open_export(self, filepath: str, codec: Optional[str], level: Optional[int],
+                     workers: Optional[int]) -> Tuple[Any, HashingFile]:
+        """(file di testo per l'esportazione, file su disco da cui leggere il checksum a fine scrittura)"""
+        hashed = HashingFile(filepath)
+        if codec:
+            return CompressedWriter(hashed, codec, level, workers), hashed
+        return io.TextIOWrapper(io.BufferedWriter(hashed), encoding='utf-8'), hashed
+    
+    def export_json(self, chats: Iterable[Chat], filename: str = None,
+                    codec: Optional[str] = None, level: Optional[int] = None) -> str:
+        """Esporta le chat in formato JSON (compresso con codec: 'gzip', 'bz2' o 'xz')"""
+        return self.stream_json(_chat_records(chats), filename, codec=codec, level=level)
+    
+    def stream_json(self, records: Iterable[Tuple[str, List[str], Iterable[Message]]],
+                    filename: str = None, progress: Optional[Callable[[int, int, int], None]] = None,
+                    codec: Optional[str] = None, level: Optional[int] = None,
+                    workers: Optional[int] = None) -> str:
+        """Esporta in JSON (stesso schema e layout di json.dump con indent=2) scrivendo
+        un messaggio alla volta: records sono (chat_id, participants, messaggi), ad
+        esempio da ChatDatabase.iter_export, e la memoria usata non cresce con i dati.
         
-        filepath = os.path.join(self.backup_dir, filename)
+        Con codec il file viene compresso a frame in parallelo su `workers`
+        processi (vedi CompressedWriter); bytes_written resta quello del JSON.
+        """
+        filepath = self._backup_path(filename, "json", codec)
         
-        data = {
-            'export_date': datetime.now().isoformat(),
-            'version': '1.0',
-            'chats': [chat.to_dict() for chat in chats]
-        }
+        f, hashed = self._open_export(filepath, codec, level, workers)
+        with f:
+            out = ExportWriter(f, progress)
+            out.write('{\n')
+            out.write(f'  "export_date": {json.dumps(datetime.now().isoformat())},\n')
+            out.write('  "version": "1.0",\n')
+            out.write('  "chats": [')
+            
+            for chat_index, (chat_id, participants, messages) in enumerate(records):
+                out.write(',\n    {\n' if chat_index else '\n    {\n')
+                out.write(f'      "chat_id": {_json_block(chat_id, 3)},\n')
+                out.write(f'      "participants": {_json_block(participants, 3)},\n')
+                out.write('      "messages": [')
+                
+                message_index = -1
+                for message_index, message in enumerate(messages):
+                    out.write(',\n        ' if message_index else '\n        ')
+                    out.write(_JSON_MESSAGE % (
+                        json.dumps(message.sender, ensure_ascii=False),
+                        json.dumps(message.content, ensure_ascii=False),
+                        json.dumps(message.timestamp.isoformat())
+                    ))
+                    out.message_done(message)
+                
+                out.write('\n      ]\n    }' if message_index >= 0 else ']\n    }')
+                out.chat_done()
+            
+            out.write('\n  ]\n}' if out.chats else ']\n}')
+            out.report()
+        
+        self._record(filepath, out, codec=codec, checksum=hashed.checksum())
+        return filepath
+    
+    # ---- Catena di backup incrementali ----
+    
+    def _chain_path(self, manifest: Optional[str]) -> str:
+        return manifest or os.path.join(self.backup_dir, CHAIN_NAME)
+    
+    def _read_chain(self, manifest: str) -> Dict[str, Any]:
+        with open(manifest, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _write_chain(self, manifest: str, chain: Dict[str, Any]):
+        tmp_path = f"{manifest}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(chain, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, manifest)
+    
+    def start_chain(self, db: 'ChatDatabase', manifest: str = None, codec: Optional[str] = None,
+                    level: Optional[int] = None, progress: Optional[Callable[[int, int, int], None]] = None) -> str:
+        """Backup completo (JSON) che fa da base di una nuova catena: il manifest viene
+        riscritto con la sola base. Restituisce il percorso del backup"""
+        manifest = self._chain_path(manifest)
+        with db.read_snapshot():
+            state = db.backup_state()
+            filepath = self.stream_json(db.iter_export(), progress=progress, codec=codec, level=level)
+        
+        self._write_chain(manifest, {
+            'version': 1,
+            'backups': [{
+                'file': os.path.relpath(filepath, os.path.dirname(os.path.abspath(manifest))),
+                'type': 'full',
+                'parent': None,
+                'created': datetime.now().isoformat(),
+                'chats': len(state),
+                'messages': sum(chat_state[0] for chat_state in state.values())
+            }],
+            'base_state': state,
+            'last_state': state
+        })
+        return filepath
+    
+    def export_delta(self, db: 'ChatDatabase', manifest: str = None, differential: bool = False,
+                     codec: Optional[str] = None, level: Optional[int] = None,
+                     progress: Optional[Callable[[int, int, int], None]] = None) -> str:
+        """Backup delle sole chat create, modificate o eliminate dal backup precedente della
+        catena (con differential, dalla base); senza una catena ne avvia una con start_chain.
+        
+        Il file è JSON Lines: un'intestazione, poi per ogni chat cambiata una riga
+        {"op": "append"|"replace", "chat_id", "participants"} seguita dai suoi
+        messaggi, e una riga {"op": "delete", "chat_id"} per ogni chat eliminata.
+        Una chat che ha solo nuovi messaggi porta solo quelli; altrimenti viene
+        riscritta per intero. Restituisce il percorso del backup.
+        """
+        manifest = self._chain_path(manifest)
+        if not os.path.exists(manifest):
+            return self.start_chain(db, manifest, codec, level, progress)
+        
+        chain = self._read_chain(manifest)
+        kind = 'differential' if differential else 'incremental'
+        parent = chain['backups'][0] if differential else chain['backups'][-1]
+        previous_state = chain['base_state'] if differential else chain['last_state']
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"chat_{kind}_{timestamp}_{len(chain['backups']):04d}.jsonl"
+        if codec:
+            filename += '.' + COMPRESSION_CODECS[codec][0]
+        folder = os.path.dirname(os.path.abspath(manifest))
+        filepath = os.path.join(folder, filename)
+        
+        f, hashed = self._open_export(filepath, codec, level, None)
+        with f, db.read_snapshot():
+            state = db.backup_state()
+            out = ExportWriter(f, progress)
+            out.write(json.dumps({'type': kind, 'parent': parent['file'],
+                                  'export_date': datetime.now().isoformat()}) + '\n')
+            
+            for chat_id, current in state.items():
+                previous = previous_state.get(chat_id)
+                if current == previous:
+                    continue
+                
+                op, after_id = 'replace', 0
+                # Stessa chat (creazione e partecipanti) e tanti messaggi in più quanti
+                # sono quelli con id oltre il vecchio massimo: è cresciuta e basta
+                if previous is not None and previous[4:] == current[4:]:
+                    added = sum(1 for _ in db.iter_chat_messages(chat_id, previous[1] or 0))
+                    if current[0] - previous[0] == added:
+                        if not added:
+                            continue
+                        op, after_id = 'append', previous[1] or 0
+                
+                out.write(json.dumps({'op': op, 'chat_id': chat_id, 'participants': json.loads(current[5])},
+                                     ensure_ascii=False) + '\n')
+                for message in db.iter_chat_messages(chat_id, after_id):
+                    out.write(json.dumps(message.to_dict(), ensure_ascii=False) + '\n')
+                    out.message_done(message)
+                out.chat_done()
+            
+            for chat_id in previous_state.keys() - state.keys():
+                out.write(json.dumps({'op': 'delete', 'chat_id': chat_id}, ensure_ascii=False) + '\n')
+            out.report()
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        self._record(filepath, out, 'differenziale' if differential else 'incrementale', codec, hashed.checksum())
         
+        chain['backups'].append({
+            'file': filename,
+            'type': kind,
+            'parent': parent['file'],
+            'created': datetime.now().isoformat(),
+            'chats': out.chats,
+            'messages': out.messages
+        })
+        chain['last_state'] = state
+        self._write_chain(manifest, chain)
         return filepath
     
+    def restore_chain(self, db: 'ChatDatabase', manifest: str = None, upto: Optional[str] = None,
+                      progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """Ripristina nel database la base della catena e poi, in ordine, i backup che portano
+        a `upto` (file come nel manifest; di default l'ultimo). Le chat presenti nel
+        backup sostituiscono quelle del database. Restituisce il numero di file applicati"""
+        manifest = self._chain_path(manifest)
+        chain = self._read_chain(manifest)
+        by_file = {entry['file']: entry for entry in chain['backups']}
+        if upto is not None and upto not in by_file:
+            raise ValueError(f"Backup {upto} non presente nella catena")
+        
+        # Dal backup scelto si risale ai genitori fino alla base
+        entries = []
+        entry = by_file[upto] if upto is not None else chain['backups'][-1]
+        while entry is not None:
+            entries.append(entry)
+            entry = by_file[entry['parent']] if entry['parent'] else None
+        entries.reverse()
+        
+        folder = os.path.dirname(os.path.abspath(manifest))
+        db.bulk_import(self.iter_json(os.path.join(folder, entries[0]['file'])), progress=progress)
+        for entry in entries[1:]:
+            self._apply_delta(db, os.path.join(folder, entry['file']))
+        
+        return len(entries)
+    
+    def _apply_delta(self, db: 'ChatDatabase', filepath: str, batch_size: int = 10000):
+        chat_id = None
+        batch: List[Message] = []
+        
+        with open_backup(filepath) as f:
+            f.readline()  # intestazione
+            for line in f:
+                record = json.loads(line)
+                op = record.get('op')
+                if op is None:
+                    batch.append(Message.from_dict(record))
+                    if len(batch) >= batch_size:
+                        db.append_messages(chat_id, batch)
+                        batch = []
+                    continue
+                
+                if batch:
+                    db.append_messages(chat_id, batch)
+                    batch = []
+                
+                chat_id = record['chat_id']
+                if op == 'delete':
+                    db.delete_chat(chat_id)
+                elif op == 'replace':
+                    db.save_chat(Chat(chat_id, record['participants']))
+            
+            if batch:
+                db.append_messages(chat_id, batch)
+    
     def import_json(self, filepath: str) -> List[Chat]:
-        """Importa chat da file JSON"""
-        with open(filepath, 'r', encoding='utf-8') as f:
+        """Importa chat da file JSON (anche compresso)"""
+        with open_backup(filepath) as f:
             data = json.load(f)
         
         return [Chat.from_dict(chat_data) for chat_data in data['chats']]
     
-    def export_pickle(self, chats: List[Chat], filename: str = None) -> str:
-        """Esporta le chat in formato pickle (più efficiente)"""
-        if not filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"chat_backup_{timestamp}.pkl"
+    def iter_json(self, filepath: str) -> Iterator[Chat]:
+        """Legge un backup JSON (anche compresso) in streaming, una chat alla volta"""
+        with open_backup(filepath) as f:
+            for chat_data in JsonStream(f, 1 << 20).iter_array('chats'):
+                yield Chat.from_dict(chat_data)
+    
+    def export_pickle(self, chats: List[Chat], filename: str = None,
+                      codec: Optional[str] = None, level: Optional[int] = None) -> str:
+        """Esporta le chat in formato pickle (più efficiente).
         
-        filepath = os.path.join(self.backup_dir, filename)
+        Il pickle è un'unica lista e non si divide in frame: con codec viene
+        compresso come un solo stream, senza parallelismo.
+        """
+        filepath = self._backup_path(filename, "pkl", codec)
+        hashed = HashingFile(filepath)
         
-        with open(filepath, 'wb') as f:
-            pickle.dump(chats, f)
+        if codec:
+            _, module, default_level = COMPRESSION_CODECS[codec]
+            level = level if level is not None else default_level
+            f = lzma.open(hashed, 'wb', preset=level) if module is lzma else module.open(hashed, 'wb', level)
+        else:
+            f = io.BufferedWriter(hashed)
         
+        counter = ExportWriter(None)
+        # Il file compresso non chiude quello che gli viene passato
+        with hashed, f:
+            pickle.dump(list(_counted(chats, counter)), f)
+        
+        self._record(filepath, counter, codec=codec, checksum=hashed.checksum())
         return filepath
     
     def import_pickle(self, filepath: str) -> List[Chat]:
-        """Importa chat da file pickle"""
-        with open(filepath, 'rb') as f:
+        """Importa chat da file pickle (anche compresso)"""
+        with open_backup(filepath, 'rb') as f:
             chats = pickle.load(f)
         return chats
     
-    def export_txt(self, chats: List[Chat], filename: str = None) -> str:
-        """Esporta le chat in formato testo leggibile"""
+    def iter_pickle(self, filepath: str) -> Iterator[Chat]:
+        """Scorre le chat di un backup pickle.
+        
+        Il formato è un'unica lista, quindi va caricato per intero; le chat
+        vengono però rilasciate man mano che sono state consumate.
+        """
+        chats = self.import_pickle(filepath)
+        chats.reverse()
+        while chats:
+            yield chats.pop()
+    
+    def export_binary(self, chats: Iterable[Chat], filename: str = None) -> str:
+        """Esporta le chat nel formato binario indicizzato (apribile con mmap)"""
         if not filename:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"chat_backup_{timestamp}.txt"
+            filename = f"chat_backup_{timestamp}.pcb"
         
         filepath = os.path.join(self.backup_dir, filename)
+        counter = ExportWriter(None)
+        write_binary_snapshot(_counted(chats, counter), filepath)
+        
+        # L'intestazione si riscrive alla fine: il checksum si ricava rileggendo il file
+        self._record(filepath, counter)
+        return filepath
+    
+    def iter_binary(self, filepath: str) -> Iterator[Chat]:
+        """Scorre le chat di un backup binario senza caricarlo tutto"""
+        with self.open_binary(filepath) as snapshot:
+            yield from snapshot.iter_chats()
+    
+    def import_binary(self, filepath: str) -> List[Chat]:
+        """Importa tutte le chat da un file binario"""
+        with BinarySnapshot(filepath) as snapshot:
+            return list(snapshot.iter_chats())
+    
+    def open_binary(self, filepath: str) -> BinarySnapshot:
+        """Apre un file binario per leggere le chat una alla volta"""
+        return BinarySnapshot(filepath)
+    
+    def export_txt(self, chats: Iterable[Chat], filename: str = None,
+                   codec: Optional[str] = None, level: Optional[int] = None) -> str:
+        """Esporta le chat in formato testo leggibile"""
+        return self.stream_txt(_chat_records(chats), filename, codec=codec, level=level)
+    
+    def stream_txt(self, records: Iterable[Tuple[str, List[str], Iterable[Message]]],
+                   filename: str = None, progress: Optional[Callable[[int, int, int], None]] = None,
+                   codec: Optional[str] = None, level: Optional[int] = None,
+                   workers: Optional[int] = None) -> str:
+        """Esporta in testo leggibile un messaggio alla volta (vedi stream_json)"""
+        filepath = self._backup_path(filename, "txt", codec)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(f"=== BACKUP CHAT - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n\n")
+        f, hashed = self._open_export(filepath, codec, level, workers)
+        with f:
+            out = ExportWriter(f, progress)
+            out.write(f"=== BACKUP CHAT - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ===\n\n")
             
-            for chat in chats:
-                f.write(f"Chat: {chat.chat_id}\n")
-                f.write(f"Partecipanti: {', '.join(chat.participants)}\n")
-                f.write("-" * 50 + "\n")
+            for chat_id, participants, messages in records:
+                out.write(f"Chat: {chat_id}\n")
+                out.write(f"Partecipanti: {', '.join(participants)}\n")
+                out.write("-" * 50 + "\n")
                 
-                for message in chat.messages:
-                    f.write(f"[{message.timestamp.strftime('%Y-%m-%d %H:%M')}] ")
-                    f.write(f"{message.sender}: {message.content}\n")
+                for message in messages:
+                    out.write(f"[{message.timestamp.strftime('%Y-%m-%d %H:%M')}] {message.sender}: {message.content}\n")
+                    out.message_done(message)
                 
-                f.write("\n" + "="*50 + "\n\n")
+                out.write("\n" + "="*50 + "\n\n")
+                out.chat_done()
+            out.report()
         
+        self._record(filepath, out, codec=codec, checksum=hashed.checksum())
         return filepath
     
     def list_backups(self) -> List[Dict[str, Any]]:
-        """Lista tutti i backup disponibili"""
-        backups = []
-        for file in os.listdir(self.backup_dir):
-            filepath = os.path.join(self.backup_dir, file)
-            if os.path.isfile(filepath):
-                stats = os.stat(filepath)
-                backups.append({
-                    'filename': file,
-                    'path': filepath,
-                    'size': stats.st_size,
-                    'modified': datetime.fromtimestamp(stats.st_mtime)
-                })
-        
-        return sorted(backups, key=lambda x: x['modified'], reverse=True)
+        """Lista tutti i backup disponibili, dal catalogo (vedi BackupCatalog.list)"""
+        return self.catalog.list()
+    
+    def repository(self) -> 'BackupRepository':
+        """Repository deduplicato dentro la cartella dei backup"""
+        return BackupRepository(os.path.join(self.backup_dir, "repository"))
+
+class _Chunker:
+    """Raggruppa righe in chunk con confini decisi dal contenuto e li salva nel repository"""
+    
+    def __init__(self, repository: 'BackupRepository'):
+        self.repository = repository
+        self.digests: List[str] = []
+        self.stored = 0
+        self._lines: List[bytes] = []
+        self._size = 0
+    
+    def add(self, line: bytes):
+        self._lines.append(line)
+        self._size += len(line)
+        repository = self.repository
+        if ((len(self._lines) >= repository.CHUNK_MIN and zlib.crc32(line) % repository.CHUNK_AVERAGE == 0)
+                or self._size >= repository.CHUNK_MAX_BYTES):
+            self._cut()
+    
+    def _cut(self):
+        digest, written = self.repository._store_chunk(b''.join(self._lines))
+        self.digests.append(digest)
+        self.stored += written
+        self._lines = []
+        self._size = 0
+    
+    def finish(self) -> List[str]:
+        if self._lines:
+            self._cut()
+        return self.digests
+
+class BackupRepository:
+    """Repository di backup deduplicato (content-addressed).
+    
+    I messaggi di ogni chat vengono divisi in chunk, salvati compressi in
+    chunks/ con il loro SHA-256 come nome: un chunk già presente non viene
+    riscritto. I confini dei chunk dipendono dal contenuto (un chunk si chiude
+    dopo un messaggio il cui crc32 è multiplo di CHUNK_AVERAGE), quindi i
+    messaggi aggiunti a una chat cambiano solo il suo ultimo chunk. Anche
+    l'indice delle chat (id, partecipanti, chunk) è salvato a chunk, e uno
+    snapshot in snapshots/ è solo l'elenco dei chunk dell'indice: tenere molti
+    snapshot di dati quasi uguali costa poco più di uno.
+    """
+    
+    CHUNK_AVERAGE = 256
+    CHUNK_MIN = 32
+    CHUNK_MAX_BYTES = 1 << 20
+    # gc non elimina i chunk scritti o riusati da meno di GC_GRACE secondi:
+    # potrebbero appartenere a un backup ancora in corso
+    GC_GRACE = 3600
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.chunks_dir = os.path.join(path, "chunks")
+        self.snapshots_dir = os.path.join(path, "snapshots")
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+    
+    def _chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+    
+    def _snapshot_path(self, name: str) -> str:
+        return os.path.join(self.snapshots_dir, f"{name}.json")
+    
+    def _store_chunk(self, data: bytes) -> Tuple[str, int]:
+        """Salva un chunk se non c'è già; restituisce l'hash e i byte scritti"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(digest)
+        try:
+            # Già presente: basta aggiornarne la data, così gc non lo tocca
+            os.utime(path)
+            return digest, 0
+        except FileNotFoundError:
+            pass
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zlib.compress(data)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        return digest, len(compressed)
+    
+    def _load_chunk(self, digest: str) -> bytes:
+        with open(self._chunk_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Chunk {digest} danneggiato")
+        return data
+    
+    def backup(self, records: Iterable[Tuple[str, List[str], Iterable[Message]]],
+               progress: Optional[Callable[[int, int, int], None]] = None) -> str:
+        """Salva uno snapshot di records (chat_id, participants, messaggi), ad esempio da
+        ChatDatabase.iter_export. progress(chat, messaggi, byte nuovi) viene richiamato
+        dopo ogni chat. Restituisce il nome dello snapshot"""
+        name = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        index = _Chunker(self)
+        chat_count = message_count = stored = 0
+        
+        for chat_id, participants, messages in records:
+            chunker = _Chunker(self)
+            count = 0
+            for message in messages:
+                chunker.add((json.dumps([message.sender, message.content, message.micros],
+                                        ensure_ascii=False) + '\n').encode('utf-8'))
+                count += 1
+            
+            index.add((json.dumps([chat_id, participants, count, chunker.finish()],
+                                  ensure_ascii=False) + '\n').encode('utf-8'))
+            chat_count += 1
+            message_count += count
+            stored += chunker.stored
+            if progress:
+                progress(chat_count, message_count, stored + index.stored)
+        
+        snapshot = {
+            'created': datetime.now().isoformat(),
+            'chats': chat_count,
+            'messages': message_count,
+            'index': index.finish()
+        }
+        tmp_path = self._snapshot_path(name) + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self._snapshot_path(name))
+        return name
+    
+    def snapshots(self) -> List[str]:
+        """Nomi degli snapshot, dal più vecchio"""
+        return sorted(entry.name[:-len('.json')] for entry in os.scandir(self.snapshots_dir)
+                      if entry.is_file() and entry.name.endswith('.json'))
+    
+    def _read_snapshot(self, name: Optional[str]) -> Dict[str, Any]:
+        if name is None:
+            names = self.snapshots()
+            if not names:
+                raise ValueError("Nessuno snapshot nel repository")
+            name = names[-1]
+        try:
+            with open(self._snapshot_path(name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"Snapshot {name} non trovato") from None
+    
+    def _iter_index(self, snapshot: Dict[str, Any]) -> Iterator[list]:
+        for digest in snapshot['index']:
+            for line in self._load_chunk(digest).splitlines():
+                yield json.loads(line)
+    
+    def iter_chats(self, name: Optional[str] = None) -> Iterator[Chat]:
+        """Scorre le chat di uno snapshot (di default l'ultimo), una alla volta"""
+        for chat_id, participants, _, digests in self._iter_index(self._read_snapshot(name)):
+            chat = Chat(chat_id, participants)
+            chat.messages = [
+                Message.from_micros(*json.loads(line))
+                for digest in digests
+                for line in self._load_chunk(digest).splitlines()
+            ]
+            yield chat
+    
+    def restore(self, db: 'ChatDatabase', name: Optional[str] = None,
+                progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """Ripristina nel database le chat di uno snapshot (di default l'ultimo)"""
+        return db.bulk_import(self.iter_chats(name), progress=progress)
+    
+    def forget(self, name: str):
+        """Elimina uno snapshot; i suoi chunk restano finché gc non li raccoglie"""
+        try:
+            os.remove(self._snapshot_path(name))
+        except FileNotFoundError:
+            raise ValueError(f"Snapshot {name} non trovato") from None
+    
+    def prune(self, keep: int) -> List[str]:
+        """Tiene solo gli ultimi `keep` snapshot; restituisce quelli eliminati"""
+        names = self.snapshots()
+        forgotten = names[:max(len(names) - keep, 0)]
+        for name in forgotten:
+            self.forget(name)
+        return forgotten
+    
+    def gc(self) -> Tuple[int, int]:
+        """Elimina i chunk non citati da nessuno snapshot; restituisce (chunk eliminati, byte liberati)"""
+        started = time.time()
+        referenced = set()
+        for name in self.snapshots():
+            snapshot = self._read_snapshot(name)
+            referenced.update(snapshot['index'])
+            for _, _, _, digests in self._iter_index(snapshot):
+                referenced.update(digests)
+        
+        removed = freed = 0
+        for bucket in os.scandir(self.chunks_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name in referenced:
+                    continue
+                stats = entry.stat()
+                if stats.st_mtime > started - self.GC_GRACE:
+                    continue
+                os.remove(entry.path)
+                removed += 1
+                freed += stats.st_size
+        
+        return removed, freed
+    
+    def stats(self) -> Dict[str, int]:
+        """Snapshot, chunk e byte occupati dai chunk"""
+        chunks = size = 0
+        for bucket in os.scandir(self.chunks_dir):
+            if bucket.is_dir():
+                for entry in os.scandir(bucket.path):
+                    chunks += 1
+                    size += entry.stat().st_size
+        return {'snapshots': len(self.snapshots()), 'chunks': chunks, 'bytes': size}
 
 # ==================== APPLICAZIONE PRINCIPALE ====================
 
+# Messaggi caricati all'apertura di una chat e a ogni scroll verso l'alto
+PAGE_SIZE = 200
+# Intervallo (ms) con cui la GUI raccoglie i risultati del worker: circa 60 fps
+RESULTS_POLL_MS = 16
+# Archiviazione: i messaggi più vecchi di ARCHIVE_AFTER lasciano chats.db
+ARCHIVE_PATH = "chats_archive.db"
+ARCHIVE_AFTER = timedelta(days=365)
+ARCHIVE_COMPRESS = True
+MAINTENANCE_MS = 60 * 60 * 1000
+# Backup compressi: codec ('gzip', 'bz2' o 'xz') e livello
+BACKUP_CODEC = "xz"
+BACKUP_LEVEL = 6
+# Snapshot conservati nel repository deduplicato (uno al giorno per un anno)
+SNAPSHOT_KEEP = 365
+
 class MessagingApp:
     def __init__(self, root):
         self.root = root
@@ -254,10 +2763,19 @@ class MessagingApp:
         self.root.geometry("800x600")
         
         # Inizializza componenti
-        self.db = ChatDatabase()
+        self.db = ChatDatabase(archive_path=ARCHIVE_PATH)
         self.backup_mgr = BackupManager()
         self.current_user = "Utente1"
         self.current_chat = None
+        # chat_id nell'ordine della lista (le righe mostrano anche i non letti)
+        self.chat_ids: List[str] = []
+        
+        # Il database si usa solo dal worker; i risultati tornano al mainloop
+        # attraverso una coda letta con root.after
+        self.db_worker = DatabaseWorker(self.db)
+        self._ui_calls: queue.SimpleQueue = queue.SimpleQueue()
+        self._opening_chat = None
+        self.poll_db_results()
         
         # Crea interfaccia
         self.create_widgets()
@@ -265,6 +2783,10 @@ class MessagingApp:
         
         # Auto-save ogni 30 secondi
         self.auto_save()
+        # Archiviazione e VACUUM incrementale in background
+        self.root.after(MAINTENANCE_MS, self.run_maintenance)
+        
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def create_widgets(self):
         """Crea l'interfaccia grafica"""
@@ -277,6 +2799,16 @@ class MessagingApp:
         left_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(0, 10))
         left_frame.pack_propagate(False)
         
+        # Ricerca nei messaggi (risultati mentre si digita)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add('write', self.on_search_change)
+        self._search_job = None
+        self.search_results = []
+        ttk.Entry(left_frame, textvariable=self.search_var).pack(fill=tk.X, pady=(5, 0))
+        self.search_listbox = tk.Listbox(left_frame, height=6)
+        self.search_listbox.pack(fill=tk.X, pady=5)
+        self.search_listbox.bind('<<ListboxSelect>>', self.on_search_select)
+        
         # Lista chat
         ttk.Label(left_frame, text="Chat", font=('Arial', 12, 'bold')).pack(pady=5)
         self.chat_listbox = tk.Listbox(left_frame)
@@ -306,8 +2838,10 @@ class MessagingApp:
         messages_frame.pack(fill=tk.BOTH, expand=True, pady=5)
         
         self.messages_text = tk.Text(messages_frame, wrap=tk.WORD, state=tk.DISABLED)
-        scrollbar = ttk.Scrollbar(messages_frame, command=self.messages_text.yview)
-        self.messages_text.configure(yscrollcommand=scrollbar.set)
+        self.messages_scrollbar = ttk.Scrollbar(messages_frame, command=self.messages_text.yview)
+        self.messages_text.configure(yscrollcommand=self.on_messages_scroll)
+        self._loading_older = False
+        scrollbar = self.messages_scrollbar
         
         self.messages_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
@@ -330,11 +2864,18 @@ class MessagingApp:
         backup_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Backup", menu=backup_menu)
         backup_menu.add_command(label="Esporta JSON", command=self.export_json)
+        backup_menu.add_command(label="Esporta JSON compresso", command=self.export_json_compressed)
         backup_menu.add_command(label="Esporta Pickle", command=self.export_pickle)
         backup_menu.add_command(label="Esporta TXT", command=self.export_txt)
+        backup_menu.add_command(label="Esporta Binario", command=self.export_binary)
+        backup_menu.add_command(label="Backup incrementale", command=self.export_incremental)
+        backup_menu.add_command(label="Snapshot deduplicato", command=self.export_snapshot)
         backup_menu.add_separator()
         backup_menu.add_command(label="Importa JSON", command=self.import_json)
         backup_menu.add_command(label="Importa Pickle", command=self.import_pickle)
+        backup_menu.add_command(label="Importa Binario", command=self.import_binary)
+        backup_menu.add_command(label="Ripristina catena incrementale", command=self.restore_chain)
+        backup_menu.add_command(label="Ripristina snapshot", command=self.restore_snapshot)
         backup_menu.add_command(label="Lista Backup", command=self.show_backups)
         
         # Status bar
@@ -343,26 +2884,118 @@ class MessagingApp:
         status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN)
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
     
+    def run_db(self, func: Callable, *args, on_done: Callable = None, on_error: Callable = None) -> Future:
+        """Esegue func nel worker; on_done/on_error vengono richiamati nel thread della GUI"""
+        future = self.db_worker.submit(func, *args)
+        future.add_done_callback(lambda done: self.call_in_ui(self._deliver_result, done, on_done, on_error))
+        return future
+    
+    def call_in_ui(self, func: Callable, *args):
+        """Richiama func(*args) nel thread della GUI; si può usare da qualsiasi thread"""
+        self._ui_calls.put((func, args))
+    
+    def _deliver_result(self, future: Future, on_done: Optional[Callable], on_error: Optional[Callable]):
+        error = future.exception()
+        if error is not None:
+            (on_error or self.show_db_error)(error)
+        elif on_done is not None:
+            on_done(future.result())
+    
+    def poll_db_results(self):
+        """Esegue nel mainloop le chiamate accodate dal worker (risultati e avanzamento)"""
+        while True:
+            try:
+                func, args = self._ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            func(*args)
+        
+        self._poll_job = self.root.after(RESULTS_POLL_MS, self.poll_db_results)
+    
+    def show_db_error(self, error: Exception):
+        messagebox.showerror("Errore", f"Operazione sul database non riuscita: {error}")
+    
     def load_chats(self):
-        """Carica la lista delle chat"""
+        """Carica la lista delle chat, dalla più recente"""
+        self.run_db(self.db.get_chat_summaries, on_done=self.show_chat_list)
+    
+    def show_chat_list(self, summaries: List[Dict[str, Any]]):
+        self.chat_ids = [summary['chat_id'] for summary in summaries]
         self.chat_listbox.delete(0, tk.END)
-        chats = self.db.get_chat_list()
-        for chat_id in chats:
-            self.chat_listbox.insert(tk.END, chat_id)
+        for summary in summaries:
+            label = summary['chat_id']
+            if summary['unread_count']:
+                label += f" ({summary['unread_count']} nuovi)"
+            self.chat_listbox.insert(tk.END, label)
+        
+        if self.current_chat and self.current_chat.chat_id in self.chat_ids:
+            self.chat_listbox.selection_set(self.chat_ids.index(self.current_chat.chat_id))
     
     def on_chat_select(self, event):
         """Gestisce la selezione di una chat"""
         selection = self.chat_listbox.curselection()
         if selection:
-            chat_id = self.chat_listbox.get(selection[0])
-            try:
-                self.current_chat = self.db.load_chat(chat_id)
-                self.display_messages()
-                self.chat_info_label.config(
-                    text=f"Chat: {chat_id} - Partecipanti: {', '.join(self.current_chat.participants)}"
-                )
-            except Exception as e:
-                messagebox.showerror("Errore", f"Impossibile caricare la chat: {e}")
+            self.open_chat(self.chat_ids[selection[0]])
+    
+    def open_chat(self, chat_id: str):
+        """Carica e mostra una chat (solo la pagina di messaggi più recente)"""
+        self.save_current_chat()
+        self._opening_chat = chat_id
+        self.status_var.set(f"Caricamento chat: {chat_id}...")
+        
+        def load():
+            chat = self.db.open_chat(chat_id, PAGE_SIZE, True)
+            self.db.mark_read(chat_id)
+            return chat
+        
+        self.run_db(
+            load,
+            on_done=self.show_chat,
+            on_error=lambda e: messagebox.showerror("Errore", f"Impossibile caricare la chat: {e}")
+        )
+    
+    def show_chat(self, chat: Chat):
+        # Se nel frattempo è stata scelta un'altra chat il risultato non serve più
+        if chat.chat_id != self._opening_chat:
+            return
+        
+        self.current_chat = chat
+        self.display_messages()
+        self.chat_info_label.config(
+            text=f"Chat: {chat.chat_id} - Partecipanti: {', '.join(chat.participants)}"
+        )
+        self.status_var.set(f"Chat caricata: {chat.chat_id}")
+        self.load_chats()
+    
+    def on_search_change(self, *args):
+        """Rilancia la ricerca poco dopo l'ultima battuta"""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(150, self.run_search)
+    
+    def run_search(self):
+        """Mostra i messaggi che corrispondono al testo cercato"""
+        self._search_job = None
+        query = self.search_var.get()
+        self.run_db(self.db.search, query, on_done=lambda results: self.show_search_results(query, results))
+    
+    def show_search_results(self, query: str, results: List[Dict[str, Any]]):
+        # Risultati di una ricerca superata da quella in corso
+        if query != self.search_var.get():
+            return
+        
+        self.search_results = results
+        self.search_listbox.delete(0, tk.END)
+        for result in self.search_results:
+            self.search_listbox.insert(
+                tk.END, f"{result['chat_id']} | {result['sender']}: {result['snippet']}"
+            )
+    
+    def on_search_select(self, event):
+        """Apre la chat del risultato selezionato"""
+        selection = self.search_listbox.curselection()
+        if selection:
+            self.open_chat(self.search_results[selection[0]]['chat_id'])
     
     def display_messages(self):
         """Mostra i messaggi della chat corrente"""
@@ -376,6 +3009,47 @@ class MessagingApp:
         self.messages_text.config(state=tk.DISABLED)
         self.messages_text.see(tk.END)
     
+    def on_messages_scroll(self, first, last):
+        """Aggiorna la scrollbar e, arrivati in cima, carica i messaggi più vecchi"""
+        self.messages_scrollbar.set(first, last)
+        if (float(first) <= 0.0 and not self._loading_older
+                and self.current_chat and self.current_chat.older_cursor is not None):
+            self._loading_older = True
+            self.root.after_idle(self.load_older_messages)
+    
+    def load_older_messages(self):
+        """Chiede al worker la pagina di messaggi precedente"""
+        chat = self.current_chat
+        if not chat or chat.older_cursor is None:
+            self._loading_older = False
+            return
+        
+        def failed(error):
+            self._loading_older = False
+            self.show_db_error(error)
+        
+        self.run_db(
+            self.db.load_chat_page, chat.chat_id, chat.older_cursor, PAGE_SIZE, True,
+            on_done=lambda page: self.show_older_messages(chat, *page),
+            on_error=failed
+        )
+    
+    def show_older_messages(self, chat: Chat, older: List[Message], cursor: Optional[Tuple[int, int]]):
+        """Inserisce in testa la pagina di messaggi precedente mantenendo la posizione"""
+        self._loading_older = False
+        if chat is not self.current_chat:
+            return
+        
+        chat.messages[:0] = older
+        chat.older_cursor = cursor
+        if not older:
+            return
+        
+        self.messages_text.config(state=tk.NORMAL)
+        self.messages_text.insert('1.0', ''.join(f"{message}\n" for message in older))
+        self.messages_text.config(state=tk.DISABLED)
+        self.messages_text.yview(f"{len(older) + 1}.0")
+    
     def send_message(self, event=None):
         """Invia un messaggio"""
         if not self.current_chat:
@@ -389,15 +3063,38 @@ class MessagingApp:
         message = Message(self.current_user, content)
         self.current_chat.add_message(message)
         
-        self.display_messages()
+        self.messages_text.config(state=tk.NORMAL)
+        self.messages_text.insert(tk.END, f"{message}\n")
+        self.messages_text.config(state=tk.DISABLED)
+        self.messages_text.see(tk.END)
         self.message_entry.delete(0, tk.END)
         self.save_current_chat()
     
     def save_current_chat(self):
-        """Salva la chat corrente"""
-        if self.current_chat:
-            self.db.save_chat(self.current_chat)
+        """Salva nel worker i messaggi nuovi della chat corrente"""
+        chat = self.current_chat
+        if not chat:
+            return
+        
+        messages = chat.take_unsaved()
+        if not messages:
+            return
+        
+        def save():
+            self.db.append_messages(chat.chat_id, messages)
+            # I messaggi scritti da qui sono già stati visti
+            self.db.mark_read(chat.chat_id)
+        
+        def saved(_):
             self.status_var.set(f"Chat salvata: {datetime.now().strftime('%H:%M:%S')}")
+            # La chat sale in cima alla lista
+            self.load_chats()
+        
+        def failed(error):
+            chat.restore_unsaved(messages)
+            self.show_db_error(error)
+        
+        self.run_db(save, on_done=saved, on_error=failed)
     
     def new_chat(self):
         """Crea una nuova chat"""
@@ -405,9 +3102,11 @@ class MessagingApp:
         if dialog.result:
             chat_id, participants = dialog.result
             new_chat = Chat(chat_id, participants)
-            self.db.save_chat(new_chat)
-            self.load_chats()
-            self.status_var.set(f"Nuova chat creata: {chat_id}")
+            self.run_db(self.db.save_chat, new_chat, on_done=lambda _: self.chat_created(chat_id))
+    
+    def chat_created(self, chat_id: str):
+        self.load_chats()
+        self.status_var.set(f"Nuova chat creata: {chat_id}")
     
     def delete_chat(self):
         """Elimina la chat selezionata"""
@@ -415,79 +3114,176 @@ class MessagingApp:
         if not selection:
             return
         
-        chat_id = self.chat_listbox.get(selection[0])
+        chat_id = self.chat_ids[selection[0]]
         if messagebox.askyesno("Conferma", f"Eliminare la chat '{chat_id}'?"):
-            with sqlite3.connect(self.db.db_path) as conn:
-                conn.execute('DELETE FROM chats WHERE chat_id = ?', (chat_id,))
-                conn.execute('DELETE FROM messages WHERE chat_id = ?', (chat_id,))
+            self.run_db(self.db.delete_chat, chat_id, on_done=lambda _: self.load_chats())
             
-            self.load_chats()
+            self._opening_chat = None
             self.current_chat = None
             self.display_messages()
             self.chat_info_label.config(text="Seleziona una chat")
             self.status_var.set(f"Chat eliminata: {chat_id}")
     
+    def export_all(self, label: str, export: Callable[[Iterable[Chat]], str], as_list: bool = False):
+        """Esporta tutte le chat dal worker, che le legge dal database una alla volta"""
+        def run():
+            if not self.db.get_chat_list():
+                return None
+            chats = self.db.get_all_chats() if as_list else self.db.iter_all_chats()
+            return export(chats)
+        
+        self._run_export(label, run)
+    
+    def stream_all(self, label: str, export: Callable[..., str], **options):
+        """Esporta tutte le chat in streaming, direttamente dal cursore del database"""
+        def run():
+            if not self.db.get_chat_list():
+                return None
+            return export(self.db.iter_export(), progress=self._export_progress(label), **options)
+        
+        self._run_export(label, run)
+    
+    def _export_progress(self, label: str) -> Callable[[int, int, int], None]:
+        def report(chats, messages, written):
+            self.call_in_ui(self.status_var.set,
+                            f"Esportazione {label}: {chats} chat, {messages} messaggi, {written / 1048576:.1f} MB...")
+        return report
+    
+    def export_incremental(self):
+        """Salva solo le modifiche dall'ultimo backup della catena (il primo è completo)"""
+        self._run_export("incrementale", lambda: self.backup_mgr.export_delta(
+            self.db, progress=self._export_progress("incrementale")))
+    
+    def _run_export(self, label: str, run: Callable[[], Optional[str]]):
+        """Esegue run nel worker e mostra il file creato (None = nessuna chat)"""
+        def done(filepath):
+            if filepath is None:
+                messagebox.showwarning("Attenzione", "Nessuna chat da esportare")
+            else:
+                messagebox.showinfo("Successo", f"Backup {label} creato:\n{filepath}")
+        
+        self.status_var.set(f"Esportazione {label} in corso...")
+        self.run_db(run, on_done=done)
+    
     def export_json(self):
         """Esporta tutte le chat in JSON"""
-        chats = self.db.get_all_chats()
-        if not chats:
-            messagebox.showwarning("Attenzione", "Nessuna chat da esportare")
-            return
-        
-        filepath = self.backup_mgr.export_json(chats)
-        messagebox.showinfo("Successo", f"Backup JSON creato:\n{filepath}")
+        self.stream_all("JSON", self.backup_mgr.stream_json)
+    
+    def export_json_compressed(self):
+        """Esporta tutte le chat in JSON compresso"""
+        self.stream_all(f"JSON {BACKUP_CODEC}", self.backup_mgr.stream_json,
+                        codec=BACKUP_CODEC, level=BACKUP_LEVEL)
     
     def export_pickle(self):
         """Esporta tutte le chat in Pickle"""
-        chats = self.db.get_all_chats()
-        if not chats:
-            messagebox.showwarning("Attenzione", "Nessuna chat da esportare")
-            return
-        
-        filepath = self.backup_mgr.export_pickle(chats)
-        messagebox.showinfo("Successo", f"Backup Pickle creato:\n{filepath}")
+        self.export_all("Pickle", self.backup_mgr.export_pickle, as_list=True)
     
     def export_txt(self):
         """Esporta tutte le chat in TXT"""
-        chats = self.db.get_all_chats()
-        if not chats:
-            messagebox.showwarning("Attenzione", "Nessuna chat da esportare")
+        self.stream_all("TXT", self.backup_mgr.stream_txt)
+    
+    def export_binary(self):
+        """Esporta tutte le chat nel formato binario"""
+        self.export_all("binario", self.backup_mgr.export_binary)
+    
+    def import_file(self, label: str, load: Callable[[str], Iterable[Chat]], title: str, filetypes):
+        """Importa dal worker, in blocco, le chat del backup scelto dall'utente"""
+        filepath = filedialog.askopenfilename(title=title, filetypes=filetypes)
+        if not filepath:
             return
         
-        filepath = self.backup_mgr.export_txt(chats)
-        messagebox.showinfo("Successo", f"Backup TXT creato:\n{filepath}")
+        def report(chats, messages):
+            self.call_in_ui(self.status_var.set, f"Importazione {label}: {chats} chat, {messages} messaggi...")
+        
+        def run():
+            return self.db.bulk_import(load(filepath), progress=report)
+        
+        def done(count):
+            self.load_chats()
+            messagebox.showinfo("Successo", f"Importate {count} chat da {label}")
+        
+        self.status_var.set(f"Importazione {label} in corso...")
+        self.run_db(
+            run, on_done=done,
+            on_error=lambda e: messagebox.showerror("Errore", f"Impossibile importare: {e}")
+        )
     
     def import_json(self):
         """Importa chat da file JSON"""
-        filepath = filedialog.askopenfilename(
-            title="Seleziona file JSON",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
-        )
-        if filepath:
-            try:
-                chats = self.backup_mgr.import_json(filepath)
-                for chat in chats:
-                    self.db.save_chat(chat)
-                self.load_chats()
-                messagebox.showinfo("Successo", f"Importate {len(chats)} chat da JSON")
-            except Exception as e:
-                messagebox.showerror("Errore", f"Impossibile importare: {e}")
+        self.import_file("JSON", self.backup_mgr.iter_json, "Seleziona file JSON",
+                         [("JSON files", "*.json *.json.gz *.json.bz2 *.json.xz"), ("All files", "*.*")])
     
     def import_pickle(self):
         """Importa chat da file Pickle"""
-        filepath = filedialog.askopenfilename(
-            title="Seleziona file Pickle",
-            filetypes=[("Pickle files", "*.pkl"), ("All files", "*.*")]
+        self.import_file("Pickle", self.backup_mgr.iter_pickle, "Seleziona file Pickle",
+                         [("Pickle files", "*.pkl *.pkl.gz *.pkl.bz2 *.pkl.xz"), ("All files", "*.*")])
+    
+    def import_binary(self):
+        """Importa chat da file binario"""
+        self.import_file("file binario", self.backup_mgr.iter_binary, "Seleziona file binario",
+                         [("Backup binari", "*.pcb"), ("All files", "*.*")])
+    
+    def export_snapshot(self):
+        """Salva uno snapshot nel repository deduplicato, poi elimina quelli oltre SNAPSHOT_KEEP"""
+        repository = self.backup_mgr.repository()
+        
+        def run():
+            with self.db.read_snapshot():
+                name = repository.backup(self.db.iter_export(), progress=self._export_progress("snapshot"))
+            repository.prune(SNAPSHOT_KEEP)
+            repository.gc()
+            return name
+        
+        def done(name):
+            stats = repository.stats()
+            messagebox.showinfo("Successo", f"Snapshot {name} salvato\n"
+                                            f"{stats['snapshots']} snapshot, {stats['bytes'] / 1048576:.1f} MB in totale")
+        
+        self.status_var.set("Snapshot in corso...")
+        self.run_db(run, on_done=done,
+                    on_error=lambda e: messagebox.showerror("Errore", f"Impossibile salvare lo snapshot: {e}"))
+    
+    def restore_snapshot(self):
+        """Ripristina uno snapshot del repository deduplicato"""
+        repository = self.backup_mgr.repository()
+        filepath = filedialog.askopenfilename(title="Seleziona lo snapshot", initialdir=repository.snapshots_dir,
+                                              filetypes=[("Snapshot", "*.json")])
+        if not filepath:
+            return
+        name = os.path.splitext(os.path.basename(filepath))[0]
+        
+        def report(chats, messages):
+            self.call_in_ui(self.status_var.set, f"Ripristino: {chats} chat, {messages} messaggi...")
+        
+        def done(count):
+            self.load_chats()
+            messagebox.showinfo("Successo", f"Ripristinate {count} chat dallo snapshot {name}")
+        
+        self.status_var.set("Ripristino in corso...")
+        self.run_db(
+            repository.restore, self.db, name, report, on_done=done,
+            on_error=lambda e: messagebox.showerror("Errore", f"Impossibile ripristinare: {e}")
+        )
+    
+    def restore_chain(self):
+        """Ripristina la catena di backup incrementali scelta (manifest JSON)"""
+        manifest = filedialog.askopenfilename(title="Seleziona il manifest della catena",
+                                              filetypes=[("Manifest", "chain*.json"), ("All files", "*.*")])
+        if not manifest:
+            return
+        
+        def report(chats, messages):
+            self.call_in_ui(self.status_var.set, f"Ripristino: {chats} chat, {messages} messaggi...")
+        
+        def done(count):
+            self.load_chats()
+            messagebox.showinfo("Successo", f"Ripristinati {count} backup della catena")
+        
+        self.status_var.set("Ripristino in corso...")
+        self.run_db(
+            self.backup_mgr.restore_chain, self.db, manifest, None, report, on_done=done,
+            on_error=lambda e: messagebox.showerror("Errore", f"Impossibile ripristinare: {e}")
         )
-        if filepath:
-            try:
-                chats = self.backup_mgr.import_pickle(filepath)
-                for chat in chats:
-                    self.db.save_chat(chat)
-                self.load_chats()
-                messagebox.showinfo("Successo", f"Importate {len(chats)} chat da Pickle")
-            except Exception as e:
-                messagebox.showerror("Errore", f"Impossibile importare: {e}")
     
     def show_backups(self):
         """Mostra la lista dei backup disponibili"""
@@ -499,6 +3295,30 @@ class MessagingApp:
         if self.current_chat:
             self.save_current_chat()
         self.root.after(30000, self.auto_save)  # Ogni 30 secondi
+    
+    def run_maintenance(self):
+        """Archivia i messaggi vecchi e restituisce lo spazio liberato, poi si riprogramma"""
+        def run():
+            # Solo la prima volta su un database esistente: il VACUUM completo gira nel worker
+            self.db.enable_incremental_vacuum()
+            archived = self.db.archive_messages(ARCHIVE_AFTER, compress=ARCHIVE_COMPRESS)
+            return archived, self.db.vacuum()
+        
+        def done(result):
+            archived, pages = result
+            if archived:
+                self.status_var.set(f"Archiviati {archived} messaggi, liberate {pages} pagine")
+        
+        self.run_db(run, on_done=done)
+        self.root.after(MAINTENANCE_MS, self.run_maintenance)
+    
+    def on_close(self):
+        """Salva la chat corrente, attende il worker e chiude le connessioni al database"""
+        self.save_current_chat()
+        self.root.after_cancel(self._poll_job)
+        self.db_worker.close()
+        self.db.close()
+        self.root.destroy()
 
 # ==================== DIALOGHI ====================
 
@@ -546,17 +3366,33 @@ class BackupListDialog:
     def __init__(self, parent, backups):
         self.dialog = tk.Toplevel(parent)
         self.dialog.title("Lista Backup")
-        self.dialog.geometry("500x300")
+        self.dialog.geometry("900x300")
         
-        tree = ttk.Treeview(self.dialog, columns=('Size', 'Modified'), show='headings')
+        columns = ('Format', 'Chats', 'Messages', 'Range', 'Size', 'Modified')
+        tree = ttk.Treeview(self.dialog, columns=columns, show='tree headings')
         tree.heading('#0', text='Filename')
+        tree.heading('Format', text='Formato')
+        tree.heading('Chats', text='Chat')
+        tree.heading('Messages', text='Messaggi')
+        tree.heading('Range', text='Periodo')
         tree.heading('Size', text='Dimensione')
         tree.heading('Modified', text='Modificato')
+        tree.column('#0', width=260)
+        for column in ('Chats', 'Messages'):
+            tree.column(column, width=70, anchor=tk.E)
         
         for backup in backups:
+            # Conteggi e periodo mancano per i file aggiunti da fuori
+            known = lambda value: '' if value is None else value
+            period = ''
+            if backup['first_timestamp'] is not None:
+                period = (f"{backup['first_timestamp'].strftime('%Y-%m-%d')} - "
+                          f"{backup['last_timestamp'].strftime('%Y-%m-%d')}")
+            fmt = backup['format'] + (f" ({backup['codec']})" if backup['codec'] else '')
             tree.insert('', 'end', text=backup['filename'],
-                       values=(f"{backup['size']} bytes", 
-                              backup['modified'].strftime('%Y-%m-%d %H:%M')))
+                       values=(fmt, known(backup['chats']), known(backup['messages']), period,
+                               f"{backup['size']} bytes",
+                               backup['modified'].strftime('%Y-%m-%d %H:%M')))
         
         tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
@@ -653,6 +653,10 @@ class MainWindow(QMainWindow):
 
         self.setCentralWidget(self.tab_widget)
 
+    def closeEvent(self, event):
+        self.chat_engine.flush()
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,27 @@
+import os
+import shutil
+import tempfile
+import unittest
+from ui.chat.journal import Journal
+
+
+def new_chat(chat_id, participants=None):
+    return {"chat_id": chat_id, "partcipants": participants if participants is not None else ["a", "b"], "messages": []}
+
+
+def new_message(content="ciao", sender="a", timestamp="2024-01-01 10:00:00"):
+    return {"sender": sender, "content": content, "timestamp": timestamp}
+
+
+class FolderTestCase(unittest.TestCase):
+    """Ogni test lavora in una cartella temporanea, eliminata alla fine"""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def new_journal(self):
+        return Journal(self.path("chat.json"), self.path("chat.journal"))
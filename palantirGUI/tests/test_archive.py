@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime, timedelta
+from RISORSE.chat import ChatDatabase, Chat, Message
+from tests.helpers import FolderTestCase
+
+
+class ArchiveTest(FolderTestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.db = ChatDatabase(self.path("chats.db"), archive_path=self.path("archive.db"))
+        self.addCleanup(self.db.close)
+
+        now = datetime.now()
+        chat = Chat("1", ["a", "b"])
+        chat.messages = [Message("a", f"messaggio {i}", now - timedelta(days=1000 - i, hours=12)) for i in range(1000)]
+        self.db.save_chat(chat)
+        # Un segmento compresso per ogni passaggio
+        for days in (900, 700, 500, 300, 100):
+            self.db.archive_messages(timedelta(days=days), compress=True)
+
+        self.decompressed = 0
+        segment_rows = ChatDatabase._segment_rows
+
+        def counting(conn, chat_id, first_id):
+            self.decompressed += 1
+            return segment_rows(conn, chat_id, first_id)
+
+        self.db._segment_rows = counting
+
+    def test_page_decompresses_only_needed_segments(self):
+        messages, before = self.db.load_chat_page("1", None, 50, include_archive=True)
+        self.assertEqual(messages[-1].content, "messaggio 999")
+        self.assertEqual(self.decompressed, 0)
+
+        contents = [message.content for message in messages]
+        while before is not None:
+            self.decompressed = 0
+            messages, before = self.db.load_chat_page("1", before, 50, include_archive=True)
+            self.assertLessEqual(self.decompressed, 2)
+            contents = [message.content for message in messages] + contents
+
+        self.assertEqual(contents, [f"messaggio {i}" for i in range(1000)])
+
+    def test_search_stops_at_older_segments(self):
+        results = self.db._search_archive("messaggio", None, 10)
+        self.assertEqual([result["snippet"] for result in results], [f"messaggio {i}" for i in range(900, 890, -1)])
+        self.assertEqual(self.decompressed, 1)
+
+    def test_export_reads_each_table_once(self):
+        now = datetime.now()
+        for chat_id in ("0", "2", "3"):
+            chat = Chat(chat_id, ["a"])
+            if chat_id != "0":
+                chat.messages = [Message("b", f"{chat_id}-{i}", now - timedelta(days=60 - i)) for i in range(60)]
+            self.db.save_chat(chat)
+        # Messaggi archiviati anche come righe singole, accanto ai segmenti
+        self.db.archive_messages(timedelta(days=30))
+
+        statements = []
+        self.db._connect().set_trace_callback(statements.append)
+        exported = [(chat_id, [message.content for message in messages])
+                    for chat_id, _, messages in self.db.iter_export()]
+        self.db._connect().set_trace_callback(None)
+
+        self.assertEqual(exported, [
+            (chat_id, [message.content for message in self.db.load_chat(chat_id, include_archive=True).messages])
+            for chat_id in ("0", "1", "2", "3")
+        ])
+        self.assertEqual(len(exported[1][1]), 1000)
+        self.assertEqual(len(statements), 4)
+
+    def test_incremental_vacuum_is_an_explicit_step(self):
+        conn = self.db._connect()
+        self.assertNotEqual(conn.execute("PRAGMA main.auto_vacuum").fetchone()[0], 2)
+        self.assertTrue(self.db.enable_incremental_vacuum())
+        self.assertFalse(self.db.enable_incremental_vacuum())
+        self.assertEqual(conn.execute("PRAGMA main.auto_vacuum").fetchone()[0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from unittest import mock
+from ui.chat.backend import StorageBackend, JsonBackend, SqliteBackend, migrate
+from ui.chat.store import ChatStore
+from tests.helpers import FolderTestCase, new_chat, new_message
+
+
+class StorageBackendTest(unittest.TestCase):
+    def test_incomplete_backend_fails_at_construction(self):
+        class Incomplete(StorageBackend):
+            def list_chats(self):
+                return []
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    def test_json_backend_is_complete(self):
+        self.assertIsInstance(JsonBackend(), StorageBackend)
+
+
+class MigrateTest(FolderTestCase):
+    def test_migrate_streams_chats_once(self):
+        store = ChatStore(self.new_journal(), interval=0)
+        store.replace({"backup_data": "", "chats": [new_chat("1"), new_chat("2"), new_chat("1")]})
+        for i in range(3):
+            store.add_message("1", new_message(f"messaggio {i}", timestamp=f"2024-01-01 10:00:0{i}"))
+        store.flush()
+
+        store = ChatStore(self.new_journal(), interval=0)
+        target = SqliteBackend(self.path("chats.db"))
+        self.addCleanup(target.db.close)
+        with mock.patch("ui.chat.backend.store", store):
+            self.assertEqual(migrate(JsonBackend(), target), 2)
+
+        # Le chat non restano nella cache dello store
+        self.assertEqual(store._chats, {})
+        self.assertIsNone(store._data)
+        self.assertEqual(sorted(chat["chat_id"] for chat in target.list_chats()), ["1", "2"])
+        self.assertEqual([message["content"] for message in target.load_chat("1")["messages"]],
+                         [f"messaggio {i}" for i in range(3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
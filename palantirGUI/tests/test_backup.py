@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from RISORSE.chat import BackupManager, ChatDatabase, Chat, Message, open_backup
+from tests.helpers import FolderTestCase
+
+
+class BackupTestCase(FolderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = self.new_db("chats.db", "archive.db")
+        self.backups = BackupManager(self.path("backups"))
+
+        start = datetime.now() - timedelta(days=800)
+        for chat_id in ("1", "2"):
+            chat = Chat(chat_id, ["a", "b"])
+            chat.messages = [Message("a", f"{chat_id}-{i}", start + timedelta(hours=i)) for i in range(10)]
+            self.db.save_chat(chat)
+
+    def new_db(self, name, archive_name=None):
+        db = ChatDatabase(self.path(name), archive_path=self.path(archive_name) if archive_name else None)
+        self.addCleanup(db.close)
+        return db
+
+    def read_delta(self, path):
+        with open_backup(path) as file:
+            return [json.loads(line) for line in file][1:]
+
+
+class BackupChainTest(BackupTestCase):
+    def test_archiving_between_backups_keeps_delta_small(self):
+        self.backups.start_chain(self.db)
+
+        self.db.archive_messages(timedelta(days=365), compress=True)
+        # Spostare i messaggi nell'archivio non cambia le chat
+        self.assertEqual(self.read_delta(self.backups.export_delta(self.db)), [])
+
+        self.db.append_messages("1", [Message("b", "nuovo", datetime.now())])
+        lines = self.read_delta(self.backups.export_delta(self.db))
+
+        self.assertEqual(lines[0], {"op": "append", "chat_id": "1", "participants": ["a", "b"]})
+        self.assertEqual([line["content"] for line in lines[1:]], ["nuovo"])
+
+    def test_restore_chain_rebuilds_database(self):
+        self.backups.start_chain(self.db)
+        self.db.append_messages("1", [Message("b", "nuovo", datetime.now())])
+        self.backups.export_delta(self.db)
+        self.db.delete_chat("2")
+        self.backups.export_delta(self.db)
+
+        restored = self.new_db("restored.db")
+        self.assertEqual(self.backups.restore_chain(restored), 3)
+        self.assertEqual(restored.get_chat_list(), ["1"])
+        self.assertEqual([message.content for message in restored.load_chat("1").messages],
+                         [f"1-{i}" for i in range(10)] + ["nuovo"])
+
+
+class BackupCatalogTest(BackupTestCase):
+    def test_chain_manifest_is_not_a_backup(self):
+        self.backups.start_chain(self.db)
+        self.db.append_messages("1", [Message("b", "nuovo", datetime.now())])
+        self.backups.export_delta(self.db)
+
+        formats = sorted(backup["format"] for backup in self.backups.list_backups())
+        self.assertEqual(formats, ["incrementale", "json"])
+
+    def test_checksum_is_computed_while_writing(self):
+        chats = self.db.get_all_chats()
+        with mock.patch("RISORSE.chat._file_checksum", side_effect=AssertionError("file riletto")):
+            self.backups.export_json(chats, "a.json")
+            self.backups.export_json(chats, "a.json.gz", codec="gzip")
+            self.backups.export_txt(chats, "a.txt", codec="xz")
+            self.backups.export_pickle(chats, "a.pkl")
+            self.backups.export_pickle(chats, "a.pkl.bz2", codec="bz2")
+            self.backups.start_chain(self.db)
+            self.backups.export_delta(self.db)
+
+        backups = self.backups.list_backups()
+        self.assertEqual(len(backups), 7)
+        for backup in backups:
+            with open(backup["path"], "rb") as f:
+                self.assertEqual(backup["checksum"], hashlib.sha256(f.read()).hexdigest(), backup["filename"])
+            self.assertEqual(backup["size"], os.path.getsize(backup["path"]))
+        self.assertEqual(len(self.backups.import_pickle(self.path("backups/a.pkl.bz2"))), 2)
+        self.assertEqual(len(self.backups.import_json(self.path("backups/a.json"))), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+from RISORSE.chat import ChatDatabase, Chat, Message
+from tests.helpers import FolderTestCase
+
+
+def new_chat(chat_id, contents):
+    chat = Chat(chat_id, ["a", "b"])
+    start = datetime(2024, 1, 1, 10, 0)
+    chat.messages = [Message("a", content, start + timedelta(minutes=i)) for i, content in enumerate(contents)]
+    return chat
+
+
+class BulkImportTest(FolderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = self.open_db()
+
+    def open_db(self):
+        db = ChatDatabase(self.path("chats.db"))
+        self.addCleanup(db.close)
+        return db
+
+    def triggers(self, db):
+        return {row[0] for row in db._connect().execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+
+    def summaries(self, db):
+        return {summary["chat_id"]: (summary["message_count"], summary["last_content"])
+                for summary in db.get_chat_summaries()}
+
+    def found(self, db, query):
+        return sorted(result["chat_id"] for result in db.search(query))
+
+    def test_import_into_empty_database(self):
+        triggers = self.triggers(self.db)
+        chats = (new_chat(str(i), [f"parola{i}", "fine"]) for i in range(5))
+
+        self.assertEqual(self.db.bulk_import(chats, batch_size=3), 5)
+
+        self.assertEqual(self.triggers(self.db), triggers)
+        self.assertEqual(self.summaries(self.db), {str(i): (2, "fine") for i in range(5)})
+        self.assertEqual(self.found(self.db, "parola3"), ["3"])
+        self.assertEqual(len(self.found(self.db, "fine")), 5)
+
+    def test_import_replaces_existing_chats(self):
+        self.db.save_chat(new_chat("1", ["vecchio", "vecchio"]))
+        self.db.save_chat(new_chat("2", ["resta"]))
+
+        self.db.bulk_import([new_chat("1", ["nuovo"])])
+
+        self.assertEqual([m.content for m in self.db.load_chat("1").messages], ["nuovo"])
+        self.assertEqual(self.summaries(self.db), {"1": (1, "nuovo"), "2": (1, "resta")})
+        self.assertEqual(self.found(self.db, "vecchio"), [])
+        self.assertEqual(self.found(self.db, "nuovo"), ["1"])
+
+    def test_small_import_keeps_triggers(self):
+        for i in range(3):
+            self.db.save_chat(new_chat(str(i), ["esistente"] * 10))
+        triggers = self.triggers(self.db)
+
+        def progress(chats, messages):
+            self.assertEqual(self.triggers(self.db), triggers)
+
+        self.db.bulk_import([new_chat("9", ["piccola"])], progress=progress)
+
+        self.assertEqual(self.found(self.db, "piccola"), ["9"])
+        self.assertEqual(self.summaries(self.db)["9"], (1, "piccola"))
+
+    def test_interrupted_import_is_completed_on_open(self):
+        triggers = self.triggers(self.db)
+        self.db.save_chat(new_chat("1", ["vecchio"]))
+        self.db.save_chat(new_chat("2", ["resta"]))
+
+        def chats():
+            yield new_chat("1", ["nuovo"])
+            raise KeyboardInterrupt
+
+        # Il processo si chiude prima che bulk_import possa ricreare indice e trigger
+        with mock.patch.object(ChatDatabase, "_finish_import"):
+            with self.assertRaises(KeyboardInterrupt):
+                self.db.bulk_import(chats(), batch_size=1, rebuild=True)
+        self.assertNotIn("messages_fts_insert", self.triggers(self.db))
+        self.db.close()
+
+        db = self.open_db()
+        self.assertEqual(self.triggers(db), triggers)
+        self.assertEqual([m.content for m in db.load_chat("1").messages], ["nuovo"])
+        self.assertEqual(self.summaries(db), {"1": (1, "nuovo"), "2": (1, "resta")})
+        self.assertEqual(self.found(db, "vecchio"), [])
+        self.assertEqual(self.found(db, "nuovo"), ["1"])
+
+
+class BulkImportArchiveTest(FolderTestCase):
+    def test_import_replaces_archived_messages(self):
+        db = ChatDatabase(self.path("chats.db"), archive_path=self.path("archive.db"))
+        self.addCleanup(db.close)
+        old = Chat("1", ["a"])
+        old.messages = [Message("a", f"vecchio {i}", datetime.now() - timedelta(days=800 - i)) for i in range(20)]
+        db.save_chat(old)
+        db.archive_messages(timedelta(days=790), compress=True)
+        db.archive_messages(timedelta(days=785))
+
+        db.bulk_import([new_chat("1", ["nuovo"])])
+
+        self.assertEqual([m.content for m in db.load_chat("1", include_archive=True).messages], ["nuovo"])
+        self.assertEqual(db.search("vecchio", include_archive=True), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import unittest
+from unittest import mock
+from tests.helpers import FolderTestCase, new_chat, new_message
+
+
+class JournalTest(FolderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.journal = self.new_journal()
+        self.journal.build_folder()
+
+    def test_compact_keeps_records(self):
+        self.journal.append_many([{"op": "add_chat", "chat": new_chat(str(i))} for i in range(3)])
+        self.journal.compact()
+
+        self.assertEqual(self.journal.count(), 0)
+        self.assertEqual([chat["chat_id"] for chat in self.journal.load()["chats"]], ["0", "1", "2"])
+
+    def test_compact_does_not_overwrite_replace(self):
+        self.journal.append_many([{"op": "add_chat", "chat": new_chat("vecchia")}])
+
+        # replace() arriva mentre la compattazione rilegge il journal fuori dal lock
+        records = self.journal.records
+
+        def records_then_replace(end=None):
+            yield from records(end)
+            self.journal.replace({"backup_data": "", "chats": [new_chat("nuova")]})
+
+        self.journal.records = records_then_replace
+        self.journal.compact()
+        self.journal.records = records
+
+        self.assertEqual([chat["chat_id"] for chat in self.journal.load()["chats"]], ["nuova"])
+        self.assertEqual([name for name in os.listdir(self.folder) if name.endswith(".tmp")], [])
+
+
+    def assert_single_chat(self, journal, chat_id, message_count):
+        self.assertEqual([chat["chat_id"] for chat in journal.load()["chats"]], [chat_id])
+        self.assertEqual([entry["message_count"] for entry in journal.list_chats()], [message_count])
+        self.assertEqual(len(journal.load_chat(chat_id)["messages"]), message_count)
+
+    def test_crash_after_compacted_snapshot_does_not_replay_journal(self):
+        self.journal.append_many([
+            {"op": "add_chat", "chat": new_chat("1")},
+            {"op": "add_message", "chat_id": "1", "message": new_message()}
+        ])
+
+        # Chiusura improvvisa tra l'installazione dello snapshot e lo svuotamento del journal
+        with mock.patch("ui.chat.journal.write_index", side_effect=OSError("crash")):
+            with self.assertRaises(OSError):
+                self.journal.compact()
+
+        journal = self.new_journal()
+        self.assert_single_chat(journal, "1", 1)
+
+        journal.append_many([{"op": "add_message", "chat_id": "1", "message": new_message("dopo")}])
+        self.assert_single_chat(self.new_journal(), "1", 2)
+
+    def test_crash_after_replace_snapshot_does_not_replay_journal(self):
+        self.journal.append_many([{"op": "add_chat", "chat": new_chat("vecchia")}])
+
+        with mock.patch("ui.chat.journal.write_index", side_effect=OSError("crash")):
+            with self.assertRaises(OSError):
+                self.journal.replace({"backup_data": "", "chats": [new_chat("nuova")]})
+
+        self.assert_single_chat(self.new_journal(), "nuova", 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
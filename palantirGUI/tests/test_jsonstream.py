@@ -0,0 +1,37 @@
+import io
+import json
+import unittest
+from ui.chat.jsonstream import JsonStream
+
+
+data = {
+    "backup_data": "2024-01-01",
+    "chats": [
+        {"chat_id": "1", "messages": [{"sender": "è", "content": "ciao " * 20, "count": 12345}]},
+        {"chat_id": "2", "messages": []},
+        1234567
+    ],
+    "dopo": [1, 2]
+}
+
+
+class JsonStreamTest(unittest.TestCase):
+    def test_text_and_binary_give_the_same_values(self):
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        for chunk_size in (1, 7, 1 << 16):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(JsonStream(io.StringIO(text), chunk_size).iter_array("chats")), data["chats"])
+                self.assertEqual(list(JsonStream(io.BytesIO(text.encode("utf-8")), chunk_size).iter_array("chats")), data["chats"])
+
+    def test_binary_offsets_are_bytes(self):
+        raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        for value, offset, length in JsonStream(io.BytesIO(raw), 5).spans("chats"):
+            self.assertEqual(json.loads(raw[offset:offset + length]), value)
+
+    def test_invalid_json(self):
+        with self.assertRaises(ValueError):
+            list(JsonStream(io.StringIO('{"chats": [1, 2'), 4).iter_array("chats"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+from ui.chat.shards import ShardStore, convert
+from tests.helpers import FolderTestCase, new_chat, new_message
+
+
+class ConvertTest(FolderTestCase):
+    def test_convert_replays_journal(self):
+        journal = self.new_journal()
+        journal.build_folder()
+        message = new_message()
+        journal.append_many([
+            {"op": "add_chat", "chat": new_chat("1")},
+            {"op": "add_chat", "chat": new_chat("2")},
+            {"op": "add_message", "chat_id": "1", "message": message},
+            {"op": "delete_chat", "chat_id": "2"},
+        ])
+
+        shards = ShardStore(self.path("chats"))
+        self.assertEqual(convert(journal, shards), 1)
+        self.assertEqual(shards.load_chat("1")["messages"], [message])
+        self.assertEqual([entry["message_count"] for entry in shards.list_chats()], [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import time
+import unittest
+from unittest import mock
+from ui.chat.shards import ShardStore
+from ui.chat.store import ChatStore
+from tests.helpers import FolderTestCase, new_chat, new_message
+
+
+class ChatStoreTest(FolderTestCase):
+    def new_store(self):
+        return ChatStore(self.new_journal(), interval=0)
+
+    def test_replace_then_add_is_written_once(self):
+        store = self.new_store()
+        store.replace({"backup_data": "", "chats": [new_chat("1")]})
+        store.add_message("1", new_message())
+        store.add_chat(new_chat("2"))
+        store.flush()
+
+        data = self.new_store().read()
+        self.assertEqual([chat["chat_id"] for chat in data["chats"]], ["1", "2"])
+        self.assertEqual(len(data["chats"][0]["messages"]), 1)
+
+    def test_message_after_add_chat_is_written_once(self):
+        store = self.new_store()
+        store.replace({"backup_data": "", "chats": [new_chat("1")]})
+        store.add_chat(new_chat("2"))
+        store.add_message("2", new_message())
+        store.flush()
+
+        data = self.new_store().read()
+        self.assertEqual(len(data["chats"][1]["messages"]), 1)
+
+    def test_scan_chats_does_not_fill_cache(self):
+        backends = {
+            "journal": self.new_journal,
+            "sharded": lambda: ShardStore(self.path("chats"))
+        }
+        for name, backend in backends.items():
+            with self.subTest(layout=name):
+                store = ChatStore(backend(), interval=0)
+                store.replace({"backup_data": "", "chats": [new_chat("1"), new_chat("2")]})
+                store.add_message("2", new_message())
+                store.flush()
+
+                store = ChatStore(backend(), interval=0)
+                chats = list(store.scan_chats())
+                self.assertEqual([chat["chat_id"] for chat in chats], ["1", "2"])
+                self.assertEqual(len(chats[1]["messages"]), 1)
+                self.assertIsNone(store._data)
+                self.assertEqual(store._chats, {})
+
+
+    def fail_once(self, journal):
+        append_many = journal.append_many
+        calls = []
+
+        def failing(records):
+            calls.append(records)
+            if len(calls) == 1:
+                raise OSError("disco pieno")
+            append_many(records)
+
+        journal.append_many = failing
+
+    def test_failed_flush_keeps_records_queued(self):
+        journal = self.new_journal()
+        self.fail_once(journal)
+        # Il thread in background aspetta: il primo flush è quello esplicito
+        store = ChatStore(journal, interval=60)
+        store.add_chat(new_chat("1"))
+
+        with self.assertRaises(OSError):
+            store.flush()
+        self.assertTrue(store.writer.pending())
+
+        store.add_message("1", new_message())
+        store.flush()
+
+        data = self.new_store().read()
+        self.assertEqual([chat["chat_id"] for chat in data["chats"]], ["1"])
+        self.assertEqual(len(data["chats"][0]["messages"]), 1)
+
+    def test_writer_survives_failed_background_flush(self):
+        journal = self.new_journal()
+        self.fail_once(journal)
+        store = ChatStore(journal, interval=0)
+
+        with mock.patch("ui.chat.writer.retry_interval", 0.01):
+            store.add_chat(new_chat("1"))
+            deadline = time.monotonic() + 5
+            while store.writer.pending() and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertTrue(store.writer.is_alive())
+        store.add_message("1", new_message())
+        store.flush()
+
+        data = self.new_store().read()
+        self.assertEqual(len(data["chats"][0]["messages"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,245 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from ui.chat.config import storage_backend, sqlite_path
+from ui.chat.read import Read
+from ui.chat.write import Write
+from ui.chat.store import store
+
+timestamp_format = "%Y-%m-%d %H:%M:%S"
+
+
+class StorageBackend(ABC):
+    """Interfaccia comune ai backend di salvataggio usati dalla scheda Chat.
+
+    Le chat viaggiano nel formato di backups/chat.json:
+    {"chat_id", "partcipants", "messages": [{"sender", "content", "timestamp"}]}
+    """
+
+    @abstractmethod
+    def list_chats(self):
+        """Restituisce [{"chat_id", "partcipants", "message_count", "unread_count"}]"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_chat(self, chat_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_chat(self, chat_id, participants=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def append_messages(self, chat_id, messages):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_chat(self, chat_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def search(self, query, chat_id=None, limit=50):
+        """Restituisce [{"chat_id", "sender", "timestamp", "snippet"}] dei messaggi che contengono query"""
+        raise NotImplementedError
+
+    def iter_chats(self):
+        """Scorre tutte le chat complete, ad esempio per una migrazione"""
+        for entry in self.list_chats():
+            chat = self.load_chat(entry["chat_id"])
+            if chat is not None:
+                yield chat
+
+    def mark_read(self, chat_id):
+        pass
+
+    def flush(self):
+        pass
+
+
+class JsonBackend(StorageBackend):
+    def list_chats(self):
+        return [
+            {
+                "chat_id": entry["chat_id"],
+                "partcipants": entry["partcipants"],
+                "message_count": entry["message_count"],
+                # Lo store JSON non tiene traccia dei messaggi letti
+                "unread_count": 0
+            }
+            for entry in Read().list_chats()
+        ]
+
+    def load_chat(self, chat_id):
+        chat = Read().read_chat(chat_id)
+        if chat is None:
+            return None
+
+        return self._to_chat(chat)
+
+    def _to_chat(self, chat):
+        return {
+            "chat_id": chat["chat_id"],
+            "partcipants": chat.get("partcipants", []),
+            # Il primo messaggio vuoto è il segnaposto creato da Write.add_new_chat
+            "messages": [message for message in chat["messages"] if message]
+        }
+
+    def iter_chats(self):
+        # Un solo passaggio sui file, senza riempire la cache dello store
+        seen = set()
+        for chat in store.scan_chats():
+            # I duplicati vengono letti una sola volta, come fa load_chat
+            if chat["chat_id"] in seen:
+                continue
+            seen.add(chat["chat_id"])
+            yield self._to_chat(chat)
+
+    def create_chat(self, chat_id, participants=None):
+        Write(chat_id).add_new_chat(participants)
+
+    def append_messages(self, chat_id, messages):
+        for message in messages:
+            store.add_message(chat_id, message)
+
+    def delete_chat(self, chat_id):
+        Write(chat_id).delete_chat()
+
+    def search(self, query, chat_id=None, limit=50):
+        # Lo store JSON non ha un indice testuale: si scorrono i messaggi
+        terms = query.lower().split()
+        if not terms:
+            return []
+
+        if chat_id is not None:
+            chat = self.load_chat(chat_id)
+            chats = [chat] if chat is not None else []
+        else:
+            # Le chat vengono lette una alla volta senza finire nella cache dello store
+            chats = store.scan_chats()
+
+        results = []
+        for chat in chats:
+            for message in chat["messages"]:
+                # Il primo messaggio vuoto è il segnaposto creato da Write.add_new_chat
+                if not message:
+                    continue
+
+                content = message["content"].lower()
+                if all(term in content for term in terms):
+                    results.append({
+                        "chat_id": chat["chat_id"],
+                        "sender": message["sender"],
+                        "timestamp": message["timestamp"],
+                        "snippet": message["content"]
+                    })
+                    if len(results) >= limit:
+                        return results
+
+        return results
+
+    def flush(self):
+        store.flush()
+
+
+class SqliteBackend(StorageBackend):
+    def __init__(self, db_path=sqlite_path):
+        # Import ritardato: RISORSE/chat.py serve solo se si sceglie questo backend
+        from RISORSE.chat import ChatDatabase, Chat, Message
+
+        self.db = ChatDatabase(db_path)
+        self._Chat = Chat
+        self._Message = Message
+
+    def _to_message(self, message):
+        return self._Message(
+            message["sender"],
+            message["content"],
+            datetime.fromisoformat(message["timestamp"])
+        )
+
+    def _to_chat(self, chat):
+        model = self._Chat(chat["chat_id"], chat.get("partcipants", []))
+        model.messages = [self._to_message(message) for message in chat["messages"] if message]
+        return model
+
+    def list_chats(self):
+        # Dalla chat con l'attività più recente, letto da chat_summary senza scorrere i messaggi
+        return [
+            {
+                "chat_id": summary["chat_id"],
+                "partcipants": summary["participants"],
+                "message_count": summary["message_count"],
+                "unread_count": summary["unread_count"]
+            }
+            for summary in self.db.get_chat_summaries()
+        ]
+
+    def load_chat(self, chat_id):
+        try:
+            chat = self.db.load_chat(chat_id)
+        except ValueError:
+            return None
+
+        return {
+            "chat_id": chat.chat_id,
+            "partcipants": chat.participants,
+            "messages": [
+                {
+                    "sender": message.sender,
+                    "content": message.content,
+                    "timestamp": message.timestamp.strftime(timestamp_format)
+                }
+                for message in chat.messages
+            ]
+        }
+
+    def create_chat(self, chat_id, participants=None):
+        self.db.save_chat(self._Chat(chat_id, list(participants or [])))
+
+    def append_messages(self, chat_id, messages):
+        self.db.append_messages(chat_id, [self._to_message(message) for message in messages])
+
+    def delete_chat(self, chat_id):
+        self.db.delete_chat(chat_id)
+
+    def search(self, query, chat_id=None, limit=50):
+        return [
+            {
+                "chat_id": result["chat_id"],
+                "sender": result["sender"],
+                "timestamp": result["timestamp"].strftime(timestamp_format),
+                "snippet": result["snippet"]
+            }
+            for result in self.db.search(query, chat_id=chat_id, limit=limit)
+        ]
+
+    def mark_read(self, chat_id):
+        self.db.mark_read(chat_id)
+
+    def import_chats(self, chats, batch_size=50000):
+        """Importa le chat in streaming, una transazione ogni batch_size messaggi circa"""
+        return self.db.bulk_import((self._to_chat(chat) for chat in chats), batch_size)
+
+
+def create_backend(name=storage_backend):
+    if name == "json":
+        return JsonBackend()
+    if name == "sqlite":
+        return SqliteBackend()
+
+    raise ValueError(f"Backend di salvataggio sconosciuto: {name}")
+
+
+def migrate(source=None, target=None, batch_size=50000):
+    """Copia tutte le chat da source (JSON) a target (SQLite) in un solo passaggio,
+    una transazione ogni batch_size messaggi circa"""
+    source = source or JsonBackend()
+    target = target or SqliteBackend()
+
+    count = target.import_chats(source.iter_chats(), batch_size)
+    target.flush()
+
+    return count
+
+
+if __name__ == "__main__":
+    print(f"Chat migrate su SQLite: {migrate()}")
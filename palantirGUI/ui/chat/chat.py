@@ -1,14 +1,24 @@
-from PyQt6.QtWidgets import QGraphicsView, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QGroupBox, QSizePolicy, QLabel, QWidget, QToolBar
+from PyQt6.QtWidgets import QGraphicsView, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit, QGroupBox, QSizePolicy, QLabel, QWidget, QToolBar, QTextEdit, QListWidget, QListWidgetItem
 from PyQt6.QtGui import QIcon
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 import json
-from ui.chat.read import Read
-from ui.chat.write import Write
+from datetime import datetime
+from ui.chat.backend import create_backend, timestamp_format
+from ui.chat.worker import BackendWorker
+
+# Millisecondi senza battute prima di avviare la ricerca
+search_delay = 200
 
 
 class Chat(QGraphicsView):
     def __init__(self):
         super().__init__()
+        self.backend = create_backend()
+        # Le chiamate al backend girano nel worker, mai nel thread della GUI
+        self.worker = BackendWorker(self.backend)
+        self.current_user = "Utente1"
+        self.current_chat_id = None
+        self.opening_chat_id = None
         self.setup_ui()
          
 
@@ -17,6 +27,21 @@ class Chat(QGraphicsView):
         horizontal_layout = QHBoxLayout()
 
         left_vertical_layout = QVBoxLayout()
+
+        self.search_entry = QLineEdit()
+        self.search_entry.setPlaceholderText("Cerca nei messaggi...")
+        # Si cerca solo quando l'utente smette di scrivere, non a ogni tasto
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(search_delay)
+        self.search_timer.timeout.connect(self.search)
+        self.search_entry.textChanged.connect(lambda text: self.search_timer.start())
+        left_vertical_layout.addWidget(self.search_entry)
+
+        self.search_results = QListWidget()
+        self.search_results.setMaximumHeight(150)
+        self.search_results.itemClicked.connect(self.open_search_result)
+        left_vertical_layout.addWidget(self.search_results)
         
         self.rooms_box = self.create_box("Rooms")
         left_vertical_layout.addWidget(self.rooms_box)
@@ -26,6 +51,7 @@ class Chat(QGraphicsView):
         left_vertical_layout.addWidget(add_chat)
         
         del_chat = QPushButton("Elimina Chat")
+        del_chat.clicked.connect(self.delete_chat)
         left_vertical_layout.addWidget(del_chat)
 
 
@@ -33,14 +59,21 @@ class Chat(QGraphicsView):
 
         chat_box = self.create_box("Chat")
         right_vertical_layout.addWidget(chat_box)
+
+        chat_box_layout = QVBoxLayout(chat_box)
+        self.messages_view = QTextEdit()
+        self.messages_view.setReadOnly(True)
+        chat_box_layout.addWidget(self.messages_view)
         
 
         right_bottom_horizontal_layout = QHBoxLayout()
 
-        message = QLineEdit()
-        right_bottom_horizontal_layout.addWidget(message)
+        self.message_entry = QLineEdit()
+        self.message_entry.returnPressed.connect(self.send_message)
+        right_bottom_horizontal_layout.addWidget(self.message_entry)
 
         send_button = QPushButton("Invia")
+        send_button.clicked.connect(self.send_message)
         right_bottom_horizontal_layout.addWidget(send_button)
 
         right_vertical_layout.addLayout(right_bottom_horizontal_layout)
@@ -65,7 +98,7 @@ class Chat(QGraphicsView):
     def new_chat(self):
         self.newChat = None
         if self.newChat is None:
-            self.newChat = NewChat()
+            self.newChat = NewChat(self.worker, self.load_chats)
         self.newChat.show()
 
 
@@ -77,20 +110,101 @@ class Chat(QGraphicsView):
 
         """)
 
-        chat_ids = Read().read()["chats"]
-        chats_buttons = []
-        chats_layout = QVBoxLayout()
-        for chat in chat_ids:
-            button = QPushButton(chat["chat_id"])
-            chats_layout.addWidget(button)
-            chats_buttons.append(button)
+        self.chats_layout = QVBoxLayout()
+        self.rooms_box.setLayout(self.chats_layout)
+
+        self.load_chats()
+
+    def load_chats(self):
+        self.worker.submit(self.backend.list_chats, on_done=self.show_chats)
+
+    def show_chats(self, chats):
+        while self.chats_layout.count():
+            self.chats_layout.takeAt(0).widget().deleteLater()
+
+        for chat in chats:
+            label = chat["chat_id"]
+            if chat["unread_count"]:
+                label += f" ({chat['unread_count']})"
+            button = QPushButton(label)
+            button.clicked.connect(lambda checked, chat_id=chat["chat_id"]: self.open_chat(chat_id))
+            self.chats_layout.addWidget(button)
+
+    def flush(self):
+        self.worker.flush()
+        self.backend.flush()
+
+    def open_chat(self, chat_id):
+        self.opening_chat_id = chat_id
+        self.worker.submit(self.backend.load_chat, chat_id, on_done=lambda chat: self.show_chat(chat_id, chat))
+        self.worker.submit(self.backend.mark_read, chat_id, on_done=lambda _: self.load_chats())
+
+    def show_chat(self, chat_id, chat):
+        # Nel frattempo è stata scelta un'altra chat
+        if chat_id != self.opening_chat_id:
+            return
+
+        self.messages_view.clear()
+        if chat is None:
+            self.current_chat_id = None
+            return
+
+        self.current_chat_id = chat_id
+        for message in chat["messages"]:
+            self.show_message(message)
+
+    def search(self):
+        text = self.search_entry.text()
+        self.worker.submit(self.backend.search, text, None, 50, on_done=lambda results: self.show_search_results(text, results))
+
+    def show_search_results(self, text, results):
+        # Risultati di una ricerca già superata da quella in corso
+        if text != self.search_entry.text():
+            return
 
-        self.rooms_box.setLayout(chats_layout)
+        self.search_results.clear()
+        for result in results:
+            item = QListWidgetItem(f"{result['chat_id']} | {result['sender']}: {result['snippet']}")
+            item.setData(Qt.ItemDataRole.UserRole, result["chat_id"])
+            self.search_results.addItem(item)
+
+    def open_search_result(self, item):
+        self.open_chat(item.data(Qt.ItemDataRole.UserRole))
+
+    def show_message(self, message):
+        self.messages_view.append(f"[{message['timestamp']}] {message['sender']}: {message['content']}")
+
+    def send_message(self):
+        content = self.message_entry.text().strip()
+        if self.current_chat_id is None or not content:
+            return
+
+        message = {
+            "sender": self.current_user,
+            "content": content,
+            "timestamp": datetime.now().strftime(timestamp_format)
+        }
+        self.worker.submit(self.backend.append_messages, self.current_chat_id, [message])
+        self.worker.submit(self.backend.mark_read, self.current_chat_id, on_done=lambda _: self.load_chats())
+
+        self.show_message(message)
+        self.message_entry.clear()
+
+    def delete_chat(self):
+        if self.current_chat_id is None:
+            return
+
+        self.worker.submit(self.backend.delete_chat, self.current_chat_id, on_done=lambda _: self.load_chats())
+        self.current_chat_id = None
+        self.opening_chat_id = None
+        self.messages_view.clear()
 
 
 class NewChat(QWidget):
-    def __init__(self):
+    def __init__(self, worker, on_created=None):
         super().__init__()
+        self.worker = worker
+        self.on_created = on_created
         self.setWindowTitle("Nuova Chat")
         self.setWindowIcon(QIcon("sources/logo.png"))
         self.setup_ui()
@@ -131,12 +245,17 @@ class NewChat(QWidget):
 
 
     def create_new_chat(self):
-        add_new_chat_json(self.IDEntry.text())
-        
+        chat_id = self.IDEntry.text().strip()
+        if not chat_id:
+            return
 
-    def cancel_button(self):
-        self.destroy()
+        user = self.USEREntry.text().strip()
+        self.worker.submit(
+            self.worker.backend.create_chat, chat_id, [user] if user else [],
+            on_done=lambda _: self.on_created() if self.on_created is not None else None
+        )
+        self.close()
 
 
-def add_new_chat_json(chat_id):
-    Write(chat_id).add_new_chat()
\ No newline at end of file
+    def cancel_button(self):
+        self.destroy()
@@ -0,0 +1,8 @@
+# Layout dei file in backups/:
+#   "journal" -> chat.json + chat.journal (un unico snapshot per tutte le chat)
+#   "sharded" -> chats/manifest.json + un file per chat
+storage_layout = "journal"
+
+# Backend usato dalla scheda Chat: "json" (store in backups/) oppure "sqlite" (ChatDatabase)
+storage_backend = "json"
+sqlite_path = "./backups/chats.db"
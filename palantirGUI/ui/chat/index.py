@@ -0,0 +1,112 @@
+import os
+import json
+from ui.chat.jsonstream import JsonStream
+
+index_suffix = ".index"
+
+# Dimensione iniziale dei blocchi letti durante la scansione dello snapshot
+chunk_size = 1 << 16
+
+
+def chat_entry(chat, offset=None, length=None):
+    return {
+        "chat_id": chat["chat_id"],
+        "partcipants": chat.get("partcipants", []),
+        "message_count": sum(1 for message in chat.get("messages", []) if message),
+        "offset": offset,
+        "length": length
+    }
+
+
+def dump_snapshot(data, file):
+    """Scrive lo snapshot con una chat per riga e restituisce l'indice degli offset"""
+    entries = []
+    chats = data.get("chats", [])
+
+    position = file.write(b"{\n")
+    for key, value in data.items():
+        if key != "chats":
+            line = f'    {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n'
+            position += file.write(line.encode("utf-8"))
+
+    position += file.write(b'    "chats": [\n')
+    for i, chat in enumerate(chats):
+        line = json.dumps(chat, ensure_ascii=False).encode("utf-8")
+        position += file.write(b"        ")
+        entries.append(chat_entry(chat, position, len(line)))
+        position += file.write(line)
+        position += file.write(b",\n" if i < len(chats) - 1 else b"\n")
+    file.write(b"    ]\n}")
+
+    return entries
+
+
+def scan_snapshot(path):
+    """Costruisce l'indice leggendo lo snapshot in streaming, una chat alla volta"""
+    entries = []
+
+    with open(path, "rb") as file:
+        for chat, offset, length in JsonStream(file, chunk_size).spans("chats"):
+            entries.append(chat_entry(chat, offset, length))
+
+    return entries
+
+
+def read_header(path):
+    """Chiavi dello snapshot che precedono l'array "chats" (dump_snapshot le scrive in testa)"""
+    header = {}
+
+    with open(path, "rb") as file:
+        stream = JsonStream(file, 1 << 12)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return header
+
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if key == "chats":
+                return header
+
+            header[key] = stream.value()
+            if stream.expect(",}") == "}":
+                return header
+
+
+def snapshot_signature(path):
+    stats = os.stat(path)
+    return [stats.st_size, stats.st_mtime_ns]
+
+
+def write_index(path, entries):
+    index = {
+        "snapshot": snapshot_signature(path),
+        "chats": entries
+    }
+
+    tmp_path = f"{path}{index_suffix}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(index, file, ensure_ascii=False)
+    os.replace(tmp_path, f"{path}{index_suffix}")
+
+
+def load_index(path):
+    """Restituisce l'indice dello snapshot, ricostruendolo se manca o non è aggiornato"""
+    try:
+        with open(f"{path}{index_suffix}", "r", encoding="utf-8") as file:
+            index = json.load(file)
+        if index["snapshot"] == snapshot_signature(path):
+            return index["chats"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    entries = scan_snapshot(path)
+    write_index(path, entries)
+
+    return entries
+
+
+def read_chat(path, entry):
+    with open(path, "rb") as file:
+        file.seek(entry["offset"])
+        return json.loads(file.read(entry["length"]))
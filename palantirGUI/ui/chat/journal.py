@@ -0,0 +1,269 @@
+import os
+import json
+import threading
+from ui.chat.index import chat_entry, dump_snapshot, write_index, load_index, read_chat, read_header
+
+backups_folder_path = "./backups"
+backups_name = "chat.json"
+journal_name = "chat.journal"
+
+# Numero di record nel journal oltre il quale parte la compattazione
+compact_threshold = 500
+
+_lock = threading.RLock()
+
+
+def _tmp_path(path):
+    # Un file temporaneo per thread: compattazione e replace() non si sovrascrivono a vicenda
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def apply_record(data, record):
+    op = record.get("op")
+
+    if op == "add_chat":
+        data["chats"].append(record["chat"])
+
+    elif op == "add_message":
+        for chat in data["chats"]:
+            if chat["chat_id"] == record["chat_id"]:
+                chat["messages"].append(record["message"])
+                break
+
+    elif op == "delete_chat":
+        data["chats"] = [chat for chat in data["chats"] if chat["chat_id"] != record["chat_id"]]
+
+    return data
+
+
+class Journal():
+    def __init__(self, snapshot_path=f"{backups_folder_path}/{backups_name}", journal_path=f"{backups_folder_path}/{journal_name}"):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self._count = None
+        self._compacting = False
+        # Incrementato da replace(): una compattazione partita prima non deve sovrascrivere il nuovo snapshot
+        self._generation = 0
+        # Ultimo numero di sequenza assegnato a un record del journal. Lo snapshot salva in
+        # "journal_seq" l'ultimo record che contiene già: se il processo si chiude dopo aver
+        # installato lo snapshot ma prima di accorciare il journal, quei record non vengono
+        # riapplicati una seconda volta
+        self._seq = None
+        # Richiamato (sotto lock) quando la compattazione sostituisce i file su disco
+        self.on_compacted = None
+
+    def build_folder(self):
+        folder = os.path.dirname(self.snapshot_path)
+        if folder and not os.path.exists(folder):
+            os.mkdir(folder)
+
+        if not os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "w") as file:
+                data = {
+                    "backup_data": "",
+                    "chats": [
+
+                    ]
+                }
+                json.dump(data, file, indent=4, ensure_ascii=False)
+
+    def watched_paths(self):
+        return [self.snapshot_path, self.journal_path]
+
+    def count(self):
+        with _lock:
+            if self._count is None:
+                self._count = 0
+                if os.path.exists(self.journal_path):
+                    with open(self.journal_path, "rb") as file:
+                        self._count = sum(1 for _ in file)
+
+            return self._count
+
+    def append(self, record):
+        self.append_many([record])
+
+    def _last_seq(self):
+        with _lock:
+            if self._seq is None:
+                self._seq = read_header(self.snapshot_path).get("journal_seq", 0)
+                for record in self.records():
+                    self._seq = max(self._seq, record.get("seq", 0))
+
+            return self._seq
+
+    def append_many(self, records):
+        with _lock:
+            seq = self._last_seq()
+            lines = "".join(
+                json.dumps(dict(record, seq=seq + i), ensure_ascii=False) + "\n"
+                for i, record in enumerate(records, 1)
+            )
+            self._seq = seq + len(records)
+
+            count = self.count()
+            with open(self.journal_path, "a", encoding="utf-8") as file:
+                file.write(lines)
+                file.flush()
+                os.fsync(file.fileno())
+            self._count = count + len(records)
+
+        self.maybe_compact()
+
+    def records(self, end=None):
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path, "rb") as file:
+            for line in file:
+                if end is not None:
+                    if end <= 0:
+                        break
+                    end -= len(line)
+
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Record troncato da una chiusura improvvisa: si ignora
+                    continue
+
+    def pending_records(self, applied, end=None):
+        """Record del journal successivi a `applied`, l'ultimo già compreso nello snapshot"""
+        for record in self.records(end):
+            # I record senza seq (journal scritti prima della numerazione) non sono mai nello snapshot
+            if record.get("seq", applied + 1) > applied:
+                yield record
+
+    def _read_snapshot(self):
+        """Restituisce (dati, ultimo record del journal compreso nello snapshot)"""
+        with open(self.snapshot_path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+
+        return data, data.pop("journal_seq", 0)
+
+    def load(self):
+        with _lock:
+            data, applied = self._read_snapshot()
+            for record in self.pending_records(applied):
+                apply_record(data, record)
+
+            return data
+
+    def iter_chats(self):
+        # Un solo passaggio sul journal; il risultato non viene conservato
+        return iter(self.load()["chats"])
+
+    def list_chats(self):
+        with _lock:
+            entries = [dict(entry) for entry in load_index(self.snapshot_path)]
+            by_id = {}
+            for entry in entries:
+                by_id.setdefault(entry["chat_id"], entry)
+
+            for record in self.pending_records(read_header(self.snapshot_path).get("journal_seq", 0)):
+                if record.get("op") == "add_chat":
+                    entry = chat_entry(record["chat"])
+                    entries.append(entry)
+                    by_id.setdefault(entry["chat_id"], entry)
+                elif record.get("op") == "add_message" and record["chat_id"] in by_id:
+                    by_id[record["chat_id"]]["message_count"] += 1
+                elif record.get("op") == "delete_chat":
+                    entries = [entry for entry in entries if entry["chat_id"] != record["chat_id"]]
+                    by_id.pop(record["chat_id"], None)
+
+            return entries
+
+    def load_chat(self, chat_id):
+        with _lock:
+            chat = None
+            for entry in load_index(self.snapshot_path):
+                if entry["chat_id"] == chat_id:
+                    chat = read_chat(self.snapshot_path, entry)
+                    break
+
+            for record in self.pending_records(read_header(self.snapshot_path).get("journal_seq", 0)):
+                if chat is None and record.get("op") == "add_chat" and record["chat"]["chat_id"] == chat_id:
+                    chat = record["chat"]
+                elif chat is not None and record.get("op") == "add_message" and record["chat_id"] == chat_id:
+                    chat["messages"].append(record["message"])
+                elif record.get("op") == "delete_chat" and record["chat_id"] == chat_id:
+                    chat = None
+
+            return chat
+
+    def replace(self, data):
+        with _lock:
+            # Il nuovo snapshot sostituisce tutti i record scritti finora, anche se il
+            # journal non fa in tempo a essere svuotato
+            self._write_snapshot(dict(data, journal_seq=self._last_seq()))
+            open(self.journal_path, "w").close()
+            self._count = 0
+            self._generation += 1
+
+    def maybe_compact(self):
+        with _lock:
+            if self._compacting or self.count() < compact_threshold:
+                return
+            self._compacting = True
+
+        threading.Thread(target=self.compact, daemon=True).start()
+
+    def compact(self):
+        try:
+            with _lock:
+                if not os.path.exists(self.journal_path):
+                    return
+                end = os.path.getsize(self.journal_path)
+                generation = self._generation
+                data, applied = self._read_snapshot()
+
+            # Il replay avviene fuori dal lock: gli append continuano in coda al journal
+            for record in self.pending_records(applied, end):
+                apply_record(data, record)
+                applied = record.get("seq", applied)
+            data["journal_seq"] = applied
+
+            tmp_path = _tmp_path(self.snapshot_path)
+            entries = self._dump(data, tmp_path)
+
+            with _lock:
+                if generation != self._generation:
+                    # Nel frattempo replace() ha installato un nuovo snapshot e svuotato il journal
+                    os.remove(tmp_path)
+                    return
+
+                with open(self.journal_path, "rb") as file:
+                    file.seek(end)
+                    tail = file.read()
+
+                os.replace(tmp_path, self.snapshot_path)
+                write_index(self.snapshot_path, entries)
+
+                journal_tmp_path = _tmp_path(self.journal_path)
+                with open(journal_tmp_path, "wb") as file:
+                    file.write(tail)
+                os.replace(journal_tmp_path, self.journal_path)
+
+                self._count = tail.count(b"\n")
+
+                if self.on_compacted is not None:
+                    self.on_compacted()
+        finally:
+            self._compacting = False
+
+    def _write_snapshot(self, data):
+        tmp_path = _tmp_path(self.snapshot_path)
+        entries = self._dump(data, tmp_path)
+        os.replace(tmp_path, self.snapshot_path)
+        write_index(self.snapshot_path, entries)
+
+    def _dump(self, data, path):
+        with open(path, "wb") as file:
+            entries = dump_snapshot(data, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+        return entries
+
+
+journal = Journal()
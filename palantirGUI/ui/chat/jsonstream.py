@@ -0,0 +1,121 @@
+import re
+import json
+import codecs
+
+# Nessuna dipendenza da Qt: lo usano sia lo store della scheda Chat sia RISORSE/chat.py
+
+_whitespace = re.compile(r"\s*")
+
+
+class JsonStream():
+    """Legge un documento JSON a blocchi, un valore alla volta.
+
+    Serve a scorrere l'array delle chat di uno snapshot o di un backup senza
+    tenere in memoria l'intero file. Il file può essere aperto in testo o in
+    binario (UTF-8); in binario gli offset restituiti sono in byte, quindi
+    validi per rileggere un singolo valore con seek().
+    """
+
+    def __init__(self, file, chunk_size=1 << 16):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        # Creato alla prima lettura, solo se il file restituisce bytes
+        self.utf8 = None
+        self.text = ""
+        self.pos = 0
+        # Posizione nel file di self.text[self.pos]
+        self.offset = 0
+        self.eof = False
+
+    def _fill(self, size):
+        # Il testo già consumato si scarta, così il buffer resta piccolo
+        self.text = self.text[self.pos:]
+        self.pos = 0
+
+        chunk = self.file.read(size)
+        if not chunk:
+            self.eof = True
+        if isinstance(chunk, bytes):
+            if self.utf8 is None:
+                self.utf8 = codecs.getincrementaldecoder("utf-8")()
+            chunk = self.utf8.decode(chunk, final=self.eof)
+        self.text += chunk
+
+    def _advance(self, end):
+        if self.utf8 is not None:
+            self.offset += len(self.text[self.pos:end].encode("utf-8"))
+        else:
+            self.offset += end - self.pos
+        self.pos = end
+
+    def peek(self):
+        while True:
+            self._advance(_whitespace.match(self.text, self.pos).end())
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if self.eof:
+                raise ValueError("JSON non valido: fine del file inattesa")
+            self._fill(self.chunk_size)
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"JSON non valido: atteso uno tra {chars!r} all'offset {self.offset}, trovato {char!r}")
+        self._advance(self.pos + 1)
+        return char
+
+    def span(self):
+        """Legge il prossimo valore; restituisce (valore, offset, lunghezza)"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                # Crescita geometrica: ogni valore viene riletto al massimo O(log n) volte
+                self._fill(max(self.chunk_size, len(self.text) - self.pos))
+                continue
+
+            if end == len(self.text) and not self.eof:
+                # Un numero a fine blocco potrebbe continuare nel blocco successivo
+                self._fill(self.chunk_size)
+                continue
+
+            offset = self.offset
+            self._advance(end)
+            return value, offset, self.offset - offset
+
+    def value(self):
+        return self.span()[0]
+
+    def spans(self, key):
+        """Scorre gli elementi dell'array `key` dell'oggetto al primo livello come (valore, offset, lunghezza)"""
+        self.expect("{")
+        if self.peek() == "}":
+            return
+
+        while True:
+            name = self.value()
+            self.expect(":")
+
+            if name != key:
+                self.value()
+            else:
+                self.expect("[")
+                if self.peek() == "]":
+                    self.expect("]")
+                else:
+                    while True:
+                        yield self.span()
+                        if self.expect(",]") == "]":
+                            break
+
+            if self.expect(",}") == "}":
+                return
+
+    def iter_array(self, key):
+        """Scorre gli elementi dell'array `key` dell'oggetto al primo livello"""
+        for value, _, _ in self.spans(key):
+            yield value
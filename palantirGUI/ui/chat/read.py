@@ -1,32 +1,21 @@
-import os
-import json
+from ui.chat.store import store
 
-backups_folder_path = "./backups"
-backups_name = "chat.json"
 
 class Read():
     def __init__(self):
         self.buildFolder()
 
     def buildFolder(self):
-        if not os.path.exists(backups_folder_path):
-            os.mkdir(backups_folder_path)
-        
-        if not os.path.exists(f"{backups_folder_path}/{backups_name}"):
-            with open(f"{backups_folder_path}/{backups_name}", "w") as file:
-                data = {
-                    "backup_data": "",
-                    "chats": [
-             
-                    ]
-                }
-                json.dump(data, file, indent=4, ensure_ascii=False)
+        store.build_folder()
 
     def read(self):
-        with open(f"{backups_folder_path}/{backups_name}", "r") as file:
-            data = json.load(file)
+        return store.read()
 
-            return data
+    def list_chats(self):
+        return store.list_chats()
+
+    def read_chat(self, chat_id):
+        return store.load_chat(chat_id)
 
 
 # print(Read().read())
\ No newline at end of file
@@ -0,0 +1,185 @@
+import os
+import json
+from ui.chat.journal import Journal, backups_folder_path, _lock
+
+shards_folder_path = f"{backups_folder_path}/chats"
+manifest_name = "manifest.json"
+
+
+def write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def shard_entry(chat, file):
+    return {
+        "chat_id": chat["chat_id"],
+        "partcipants": chat.get("partcipants", []),
+        "message_count": sum(1 for message in chat.get("messages", []) if message),
+        "file": file
+    }
+
+
+class ShardStore():
+    """Layout a shard: un manifest con i metadati e un file JSON per ogni chat"""
+
+    def __init__(self, folder_path=shards_folder_path):
+        self.folder_path = folder_path
+        self.manifest_path = f"{folder_path}/{manifest_name}"
+        self.on_compacted = None
+
+    def build_folder(self):
+        os.makedirs(self.folder_path, exist_ok=True)
+
+        if not os.path.exists(self.manifest_path):
+            write_json(self.manifest_path, self._empty_manifest())
+
+    def watched_paths(self):
+        return [self.manifest_path]
+
+    def _empty_manifest(self):
+        return {
+            "backup_data": "",
+            "next_shard": 0,
+            "chats": []
+        }
+
+    def _read_manifest(self):
+        with open(self.manifest_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _read_shard(self, entry):
+        with open(f"{self.folder_path}/{entry['file']}", "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _new_shard(self, manifest, chat):
+        file = f"{manifest['next_shard']:08d}.json"
+        manifest["next_shard"] += 1
+
+        write_json(f"{self.folder_path}/{file}", chat)
+        entry = shard_entry(chat, file)
+        manifest["chats"].append(entry)
+
+        return entry
+
+    def load(self):
+        with _lock:
+            manifest = self._read_manifest()
+            return {
+                "backup_data": manifest.get("backup_data", ""),
+                "chats": [self._read_shard(entry) for entry in manifest["chats"]]
+            }
+
+    def list_chats(self):
+        with _lock:
+            return self._read_manifest()["chats"]
+
+    def iter_chats(self):
+        with _lock:
+            entries = self._read_manifest()["chats"]
+
+        # Un file alla volta: in memoria resta solo la chat corrente
+        for entry in entries:
+            with _lock:
+                try:
+                    chat = self._read_shard(entry)
+                except FileNotFoundError:
+                    # Chat eliminata nel frattempo
+                    continue
+            yield chat
+
+    def load_chat(self, chat_id):
+        with _lock:
+            for entry in self._read_manifest()["chats"]:
+                if entry["chat_id"] == chat_id:
+                    return self._read_shard(entry)
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        with _lock:
+            manifest = self._read_manifest()
+            by_id = {}
+            for entry in manifest["chats"]:
+                by_id.setdefault(entry["chat_id"], entry)
+
+            # Ogni shard toccato dal gruppo di modifiche viene riscritto una sola volta
+            dirty = {}
+            removed = []
+            for record in records:
+                op = record.get("op")
+
+                if op == "add_chat":
+                    entry = self._new_shard(manifest, record["chat"])
+                    by_id.setdefault(entry["chat_id"], entry)
+
+                elif op == "add_message" and record["chat_id"] in by_id:
+                    entry = by_id[record["chat_id"]]
+                    if entry["file"] not in dirty:
+                        dirty[entry["file"]] = self._read_shard(entry)
+                    dirty[entry["file"]]["messages"].append(record["message"])
+                    entry["message_count"] += 1
+
+                elif op == "delete_chat":
+                    for entry in manifest["chats"]:
+                        if entry["chat_id"] == record["chat_id"]:
+                            dirty.pop(entry["file"], None)
+                            removed.append(entry["file"])
+                    manifest["chats"] = [entry for entry in manifest["chats"] if entry["chat_id"] != record["chat_id"]]
+                    by_id.pop(record["chat_id"], None)
+
+            for file, chat in dirty.items():
+                write_json(f"{self.folder_path}/{file}", chat)
+            write_json(self.manifest_path, manifest)
+
+            # Gli shard eliminati si rimuovono solo dopo che il manifest non li cita più
+            for file in removed:
+                os.remove(f"{self.folder_path}/{file}")
+
+    def replace(self, data):
+        with _lock:
+            old_files = set(os.listdir(self.folder_path)) - {manifest_name}
+
+            manifest = self._empty_manifest()
+            manifest["backup_data"] = data.get("backup_data", "")
+            manifest["next_shard"] = self._read_manifest().get("next_shard", 0)
+
+            for chat in data["chats"]:
+                self._new_shard(manifest, chat)
+            write_json(self.manifest_path, manifest)
+
+            for file in old_files - {entry["file"] for entry in manifest["chats"]}:
+                os.remove(f"{self.folder_path}/{file}")
+
+
+def convert(journal=None, shards=None):
+    """Converte il vecchio chat.json (+ journal) nel layout a shard, una chat alla volta"""
+    journal = journal or Journal()
+    shards = shards or ShardStore()
+    shards.build_folder()
+
+    with _lock:
+        # Snapshot e journal vengono riletti una volta sola, non una per chat
+        data = journal.load()
+        manifest = shards._empty_manifest()
+        manifest["backup_data"] = data.get("backup_data", "")
+        seen = set()
+        for chat in data["chats"]:
+            # I duplicati vengono letti una sola volta, come fa load_chat
+            if chat["chat_id"] in seen:
+                continue
+            seen.add(chat["chat_id"])
+            shards._new_shard(manifest, chat)
+
+        write_json(shards.manifest_path, manifest)
+
+    return len(manifest["chats"])
+
+
+if __name__ == "__main__":
+    print(f"Chat convertite: {convert()}")
@@ -0,0 +1,236 @@
+import os
+import copy
+import atexit
+from ui.chat.config import storage_layout
+from ui.chat.journal import journal, apply_record, _lock
+from ui.chat.shards import ShardStore
+from ui.chat.index import chat_entry
+from ui.chat.writer import BackgroundWriter, flush_interval
+
+
+class ChatStore():
+    """Stato delle chat condiviso da tutto il processo, riletto da disco solo se i file cambiano"""
+
+    def __init__(self, backend, interval=flush_interval):
+        self.backend = backend
+        self.backend.on_compacted = self._refresh_signature
+
+        self.writer = BackgroundWriter(backend, interval)
+        self.writer.on_flushed = self._on_flushed
+        atexit.register(self.flush)
+
+        self.hits = 0
+        self.misses = 0
+
+        self._folder_ready = False
+        self._signature = None
+        self._entries = None
+        self._chats = {}
+        self._data = None
+
+    def build_folder(self):
+        if self._folder_ready:
+            return
+
+        with _lock:
+            self.backend.build_folder()
+            self._folder_ready = True
+
+    def _disk_signature(self):
+        signature = []
+        for path in self.backend.watched_paths():
+            try:
+                stats = os.stat(path)
+                signature.append((stats.st_size, stats.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+
+        return signature
+
+    def _refresh_signature(self):
+        self._signature = self._disk_signature()
+
+    def _on_flushed(self):
+        with _lock:
+            self._refresh_signature()
+
+    def _validate(self):
+        """Svuota la cache se i file del backend sono stati modificati da altri"""
+        if self.writer.pending():
+            # Finché ci sono scritture in coda lo stato in memoria è il più recente
+            self.hits += 1
+            return
+
+        signature = self._disk_signature()
+        if signature == self._signature:
+            self.hits += 1
+            return
+
+        self.misses += 1
+        self._signature = signature
+        self._entries = None
+        self._chats = {}
+        self._data = None
+
+    def _cached(self, get, load):
+        """Restituisce get() dalla cache; se manca, svuota la coda di scrittura e rilegge da disco"""
+        with _lock:
+            self._validate()
+            value = get()
+            if value is not None:
+                return value
+
+        while True:
+            # Il flush va fatto senza _lock: il writer ne ha bisogno per scrivere su disco
+            self.writer.flush()
+            with _lock:
+                value = get()
+                if value is not None:
+                    return value
+                if self.writer.pending():
+                    continue
+
+                load()
+                return get()
+
+    def read(self):
+        self.build_folder()
+
+        def load():
+            self._data = self.backend.load()
+            # Da qui in poi le chat vengono servite direttamente da self._data
+            self._chats = {}
+
+        return self._cached(lambda: self._data, load)
+
+    def list_chats(self):
+        self.build_folder()
+
+        def load():
+            self._entries = self.backend.list_chats()
+
+        entries = self._cached(lambda: self._entries, load)
+        with _lock:
+            return [dict(entry) for entry in entries]
+
+    def load_chat(self, chat_id):
+        self.build_folder()
+
+        def get():
+            if self._data is not None:
+                return self._find(chat_id)
+            return self._chats.get(chat_id)
+
+        def load():
+            self._chats[chat_id] = self.backend.load_chat(chat_id)
+
+        return self._cached(get, load)
+
+    def scan_chats(self):
+        """Scorre tutte le chat senza metterle in cache, ad esempio per una ricerca"""
+        self.build_folder()
+        with _lock:
+            self._validate()
+            chats = list(self._data["chats"]) if self._data is not None else None
+
+        if chats is not None:
+            yield from chats
+            return
+
+        # Le modifiche in coda devono essere su disco prima di rileggere
+        self.writer.flush()
+        yield from self.backend.iter_chats()
+
+    def add_chat(self, chat):
+        self.build_folder()
+        with _lock:
+            self._validate()
+            self._submit({"op": "add_chat", "chat": chat})
+
+            if self._entries is not None:
+                self._entries.append(chat_entry(chat))
+            if self._data is not None:
+                # Copia per la cache: i messaggi aggiunti dopo non devono finire anche nel record in coda
+                self._data["chats"].append(copy.deepcopy(chat))
+            if self._chats.get(chat["chat_id"]) is None:
+                self._chats.pop(chat["chat_id"], None)
+
+    def add_message(self, chat_id, message):
+        self.build_folder()
+        with _lock:
+            self._validate()
+            record = {"op": "add_message", "chat_id": chat_id, "message": message}
+            self._submit(record)
+
+            if self._entries is not None:
+                for entry in self._entries:
+                    if entry["chat_id"] == chat_id:
+                        entry["message_count"] += 1
+                        break
+            if self._data is not None:
+                apply_record(self._data, record)
+            elif self._chats.get(chat_id) is not None:
+                self._chats[chat_id]["messages"].append(message)
+
+    def delete_chat(self, chat_id):
+        self.build_folder()
+        with _lock:
+            self._validate()
+            record = {"op": "delete_chat", "chat_id": chat_id}
+            self._submit(record)
+
+            if self._entries is not None:
+                self._entries = [entry for entry in self._entries if entry["chat_id"] != chat_id]
+            if self._data is not None:
+                apply_record(self._data, record)
+            self._chats.pop(chat_id, None)
+
+    def replace(self, data):
+        self.build_folder()
+        with _lock:
+            self._start_writer()
+            self.writer.replace(data)
+
+            self._entries = None
+            self._chats = {}
+            self._data = data
+
+    def flush(self):
+        """Scrive subito su disco tutte le modifiche ancora in coda"""
+        self.writer.flush()
+
+    def _submit(self, record):
+        self._start_writer()
+        self.writer.append(record)
+
+    def _start_writer(self):
+        # Un thread si avvia una volta sola; se è già terminato (chiusura) le
+        # modifiche restano in coda per il flush esplicito
+        if self.writer.ident is None:
+            self.writer.start()
+
+    def _find(self, chat_id):
+        if self._data is None:
+            return None
+
+        for chat in self._data["chats"]:
+            if chat["chat_id"] == chat_id:
+                return chat
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+def create_backend(layout=storage_layout):
+    if layout == "sharded":
+        return ShardStore()
+    if layout == "journal":
+        return journal
+
+    raise ValueError(f"Layout di salvataggio sconosciuto: {layout}")
+
+
+store = ChatStore(create_backend())
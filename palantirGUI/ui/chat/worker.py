@@ -0,0 +1,68 @@
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+
+class BackendWorker(QObject):
+    """Esegue le chiamate al backend in un thread dedicato, una alla volta e in ordine.
+
+    I risultati tornano al thread della GUI con un segnale in coda: on_done e
+    on_error vengono sempre richiamati dal loop di eventi di Qt.
+    """
+
+    finished = pyqtSignal(object, object, object)
+
+    def __init__(self, backend):
+        super().__init__()
+        self.backend = backend
+
+        self._queue = queue.Queue()
+        self.finished.connect(self._deliver, Qt.ConnectionType.QueuedConnection)
+
+        self._thread = threading.Thread(target=self._run, name="chat-backend", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, on_done=None, on_error=None):
+        future = Future()
+        self._queue.put((future, func, args, on_done, on_error))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            future, func, args, on_done, on_error = item
+            try:
+                future.set_result(func(*args))
+            except Exception as error:
+                future.set_exception(error)
+
+            self.finished.emit(future, on_done, on_error)
+
+    def _deliver(self, future, on_done, on_error):
+        error = future.exception()
+        if error is not None:
+            if on_error is None:
+                # Un'eccezione che esce da uno slot fa terminare PyQt6:
+                # senza on_error l'errore viene solo registrato
+                logger.error("Richiesta al backend fallita", exc_info=error)
+            else:
+                on_error(error)
+        elif on_done is not None:
+            on_done(future.result())
+
+    def flush(self):
+        """Attende che tutte le richieste in coda siano state eseguite"""
+        if self._thread.is_alive():
+            self.submit(lambda: None).result()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
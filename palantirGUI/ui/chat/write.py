@@ -1,10 +1,5 @@
-import os
-import json
 from datetime import datetime
-from ui.chat.read import Read
-
-backups_folder_path = "./backups"
-backups_name = "chat.json"
+from ui.chat.store import store
 
 class Write():
     def __init__(self, chat_id=""):
@@ -12,42 +7,35 @@ class Write():
         self.buildFolder()
 
     def buildFolder(self):
-        if not os.path.exists(backups_folder_path):
-            os.mkdir(backups_folder_path)
-        
-        if not os.path.exists(f"{backups_folder_path}/{backups_name}"):
-            with open(f"{backups_folder_path}/{backups_name}", "w") as file:
-                data = {
-                    "backup_data": "",
-                    "chats": [
-  
-                    ]
-                }
-                json.dump(data, file, indent=4, ensure_ascii=False)
+        store.build_folder()
 
     def write(self, data):
-        with open(f"{backups_folder_path}/{backups_name}", "w") as file: 
-            json.dump(data, file, indent=4, ensure_ascii=False)
-        print(data)
+        store.replace(data)
 
-    def add_new_chat(self):
-        old_data = Read().read()
-        
+    def add_new_chat(self, participants=None):
         new_data = {
             "chat_id": f"{self._chat_id_}",
-            "partcipants": [
-
-            ],
+            "partcipants": list(participants or []),
             "messages": [
                 {
     
                 }
             ]
         }
-        
-        old_data["chats"].append(new_data)
 
-        self.write(old_data)
+        store.add_chat(new_data)
+
+    def add_message(self, sender, content):
+        message = {
+            "sender": sender,
+            "content": content,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+        store.add_message(self._chat_id_, message)
+
+    def delete_chat(self):
+        store.delete_chat(self._chat_id_)
 
 # backup_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
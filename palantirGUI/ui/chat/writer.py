@@ -0,0 +1,110 @@
+import copy
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Finestra (in secondi) entro cui le modifiche vengono raggruppate in un unico flush
+flush_interval = 0.25
+# Attesa (in secondi) prima di riprovare una scrittura fallita (disco pieno, file bloccato...)
+retry_interval = 5
+
+
+class BackgroundWriter(threading.Thread):
+    """Scrive le modifiche sul backend (journal o shard) fuori dal thread della GUI"""
+
+    def __init__(self, backend, interval=flush_interval):
+        super().__init__(daemon=True)
+        self.backend = backend
+        self.interval = interval
+        # Richiamato dopo ogni flush, dal thread che lo ha eseguito
+        self.on_flushed = None
+
+        self._condition = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._records = []
+        self._snapshot = None
+        self._flushing = False
+        self._closed = False
+
+    def append(self, record):
+        with self._condition:
+            self._records.append(record)
+            self._condition.notify()
+
+    def replace(self, data):
+        # Copia privata: chi chiama continua a modificare data (es. ChatStore._data)
+        # e quelle modifiche arrivano comunque come record nel journal
+        snapshot = copy.deepcopy(data)
+        with self._condition:
+            # Lo snapshot sostituisce tutte le modifiche ancora in coda
+            self._snapshot = snapshot
+            self._records = []
+            self._condition.notify()
+
+    def pending(self):
+        with self._condition:
+            return self._flushing or bool(self._records) or self._snapshot is not None
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._closed and not (self._records or self._snapshot is not None):
+                    self._condition.wait()
+                if self._closed:
+                    return
+
+                self._wait(self.interval)
+
+            try:
+                self.flush()
+            except Exception:
+                # Già registrato da flush() e le modifiche sono di nuovo in coda:
+                # il thread resta vivo e riprova più tardi
+                with self._condition:
+                    self._wait(retry_interval)
+
+    def _wait(self, seconds):
+        deadline = time.monotonic() + seconds
+        while not self._closed and time.monotonic() < deadline:
+            self._condition.wait(deadline - time.monotonic())
+
+    def flush(self):
+        with self._io_lock:
+            with self._condition:
+                snapshot, records = self._snapshot, self._records
+                self._snapshot, self._records = None, []
+                if snapshot is None and not records:
+                    return
+                self._flushing = True
+
+            try:
+                if snapshot is not None:
+                    self.backend.replace(snapshot)
+                    snapshot = None
+                if records:
+                    self.backend.append_many(records)
+            except Exception:
+                with self._condition:
+                    # Quello che non è arrivato su disco torna in coda, davanti alle modifiche
+                    # più recenti; un replace() arrivato nel frattempo le sostituisce comunque
+                    if self._snapshot is None:
+                        self._snapshot = snapshot
+                        self._records = records + self._records
+                    self._flushing = False
+                logger.error("Scrittura delle chat non riuscita, nuovo tentativo più tardi", exc_info=True)
+                raise
+
+            with self._condition:
+                self._flushing = False
+
+        if self.on_flushed is not None:
+            self.on_flushed()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+        self.flush()